@@ -0,0 +1,192 @@
+"""
+Benchmark de recall y latencia del índice vectorial (HNSW).
+
+Genera vectores sintéticos normalizados y agrupados (como los embeddings de
+chunks de un mismo tipo de documento), calcula los k vecinos exactos por
+fuerza bruta y mide, para cada combinación de M, ef de construcción y ef de
+búsqueda, el recall@k y la latencia por consulta (p50/p95).
+
+El barrido usa hnswlib, la implementación HNSW que ChromaDB usa por debajo,
+porque ef de búsqueda solo se puede fijar al crear una colección de ChromaDB.
+Con --chroma se mide además la consulta completa en ChromaDB (índice más
+lectura de documentos y metadatos en SQLite) con los parámetros configurados.
+
+Uso:
+    python benchmarks/bench_ann.py --tamanos 10000,100000 --salida ann.json
+    python benchmarks/bench_ann.py --tamanos 1000000 --dimensiones 256 --m 16,32 --ef-busqueda 50,100,200
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Any, Tuple
+
+import numpy as np
+
+DIRECTORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(DIRECTORIO_BENCHMARKS)
+sys.path.append(os.path.join(os.path.dirname(DIRECTORIO_BENCHMARKS), 'src'))
+
+from bench_pipeline import obtenerCommit
+
+TAMANO_LOTE = 10_000
+
+def generarVectores(n: int, dimensiones: int, centros: np.ndarray, semilla: int) -> np.ndarray:
+    """Vectores unitarios alrededor de centros aleatorios (float32)."""
+    aleatorio = np.random.default_rng(semilla)
+    vectores = np.empty((n, dimensiones), dtype=np.float32)
+    for inicio in range(0, n, TAMANO_LOTE):
+        fin = min(inicio + TAMANO_LOTE, n)
+        asignados = centros[aleatorio.integers(0, len(centros), fin - inicio)]
+        lote = asignados + aleatorio.normal(0, 0.6 / np.sqrt(dimensiones), (fin - inicio, dimensiones))
+        vectores[inicio:fin] = lote / np.linalg.norm(lote, axis=1, keepdims=True)
+    return vectores
+
+def vecinosExactos(datos: np.ndarray, consultas: np.ndarray, k: int) -> np.ndarray:
+    """Top-k por producto interno (igual a coseno en vectores unitarios), por bloques."""
+    mejores_sim = np.full((len(consultas), k), -np.inf, dtype=np.float32)
+    mejores_ids = np.zeros((len(consultas), k), dtype=np.int64)
+    for inicio in range(0, len(datos), 100_000):
+        similitudes = consultas @ datos[inicio:inicio + 100_000].T
+        sim = np.concatenate([mejores_sim, similitudes], axis=1)
+        ids = np.concatenate([mejores_ids, np.arange(inicio, inicio + similitudes.shape[1])[None, :].repeat(len(consultas), 0)], axis=1)
+        orden = np.argpartition(-sim, k - 1, axis=1)[:, :k]
+        mejores_sim = np.take_along_axis(sim, orden, axis=1)
+        mejores_ids = np.take_along_axis(ids, orden, axis=1)
+    return mejores_ids
+
+def calcularRecall(encontrados: List[List[int]], exactos: np.ndarray) -> float:
+    """Fracción de los k vecinos exactos que devolvió el índice."""
+    aciertos = sum(len(set(e) & set(x.tolist())) for e, x in zip(encontrados, exactos))
+    return aciertos / exactos.size
+
+def resumirLatencias(latencias: List[float]) -> Dict[str, float]:
+    valores = sorted(latencias)
+    return {
+        'p50_ms': round(valores[len(valores) // 2] * 1000, 3),
+        'p95_ms': round(valores[min(len(valores) - 1, int(len(valores) * 0.95))] * 1000, 3),
+        'media_ms': round(sum(valores) / len(valores) * 1000, 3)
+    }
+
+def medirHnswlib(datos: np.ndarray, consultas: np.ndarray, exactos: np.ndarray, k: int, espacio: str,
+                 m: int, ef_construccion: int, valores_ef: List[int]) -> Tuple[float, List[Dict[str, Any]]]:
+    """Construye un índice y barre ef de búsqueda; retorna el tiempo de construcción y las mediciones."""
+    import hnswlib
+
+    indice = hnswlib.Index(space=espacio, dim=datos.shape[1])
+    inicio = time.perf_counter()
+    indice.init_index(max_elements=len(datos), ef_construction=ef_construccion, M=m)
+    for desde in range(0, len(datos), TAMANO_LOTE):
+        indice.add_items(datos[desde:desde + TAMANO_LOTE], np.arange(desde, min(desde + TAMANO_LOTE, len(datos))))
+    construccion_s = time.perf_counter() - inicio
+
+    mediciones = []
+    for ef in valores_ef:
+        indice.set_ef(max(ef, k))
+        encontrados, latencias = [], []
+        for consulta in consultas:
+            t = time.perf_counter()
+            etiquetas, _ = indice.knn_query(consulta, k=k)
+            latencias.append(time.perf_counter() - t)
+            encontrados.append(etiquetas[0].tolist())
+        mediciones.append({'ef_busqueda': ef, f'recall@{k}': round(calcularRecall(encontrados, exactos), 4), **resumirLatencias(latencias)})
+    return construccion_s, mediciones
+
+def medirChroma(datos: np.ndarray, consultas: np.ndarray, exactos: np.ndarray, k: int) -> Dict[str, Any]:
+    """Consulta completa en ChromaDB con los parámetros de índice de la configuración."""
+    os.environ.setdefault('CHROMA_DB_PATH', tempfile.mkdtemp(prefix='pyme_ann_'))
+    from rag.vectorStore import crearBaseDeConocimiento, obtenerClienteChroma, parametrosIndice
+
+    coleccion = crearBaseDeConocimiento(f'bench_ann_{len(datos)}')
+    lote = obtenerClienteChroma().max_batch_size
+    inicio = time.perf_counter()
+    for desde in range(0, len(datos), lote):
+        fin = min(desde + lote, len(datos))
+        coleccion.add(
+            ids=[str(i) for i in range(desde, fin)],
+            embeddings=datos[desde:fin].tolist(),
+            documents=[f"chunk {i}" for i in range(desde, fin)]
+        )
+    insercion_s = time.perf_counter() - inicio
+
+    encontrados, latencias = [], []
+    for consulta in consultas:
+        t = time.perf_counter()
+        resultado = coleccion.query(query_embeddings=[consulta.tolist()], n_results=k, include=['documents', 'metadatas', 'distances'])
+        latencias.append(time.perf_counter() - t)
+        encontrados.append([int(i) for i in resultado['ids'][0]])
+
+    return {
+        'parametros': parametrosIndice(),
+        'insercion_s': round(insercion_s, 2),
+        f'recall@{k}': round(calcularRecall(encontrados, exactos), 4),
+        **resumirLatencias(latencias)
+    }
+
+def enteros(valor: str) -> List[int]:
+    return [int(v) for v in valor.split(',') if v]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de recall@k y latencia del índice HNSW')
+    parser.add_argument('--salida', default='bench_ann.json')
+    parser.add_argument('--tamanos', type=enteros, default=[10_000, 100_000, 1_000_000], help='Número de chunks, separados por comas')
+    parser.add_argument('--dimensiones', type=int, default=256, help='Dimensión de los vectores (1536 en producción; 1M x 1536 ocupa ~6 GB)')
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5, help='Vecinos por consulta (n_resultados de la búsqueda)')
+    parser.add_argument('--espacio', default='cosine', choices=['cosine', 'l2', 'ip'])
+    parser.add_argument('--m', type=enteros, default=[16])
+    parser.add_argument('--ef-construccion', type=enteros, default=[100])
+    parser.add_argument('--ef-busqueda', type=enteros, default=[10, 50, 100, 200])
+    parser.add_argument('--chroma', action='store_true', help='Medir también la consulta completa en ChromaDB')
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+
+    aleatorio = np.random.default_rng(args.semilla)
+    centros = aleatorio.normal(0, 1, (max(args.tamanos) // 200 + 1, args.dimensiones)).astype(np.float32)
+    centros /= np.linalg.norm(centros, axis=1, keepdims=True)
+
+    resultados = []
+    for tamano in args.tamanos:
+        datos = generarVectores(tamano, args.dimensiones, centros, args.semilla + 1)
+        consultas = generarVectores(args.consultas, args.dimensiones, centros, args.semilla + 2)
+        exactos = vecinosExactos(datos, consultas, args.k)
+
+        for m in args.m:
+            for ef_construccion in args.ef_construccion:
+                construccion_s, mediciones = medirHnswlib(datos, consultas, exactos, args.k, args.espacio, m, ef_construccion, args.ef_busqueda)
+                resultados.append({
+                    'chunks': tamano, 'm': m, 'ef_construccion': ef_construccion,
+                    'construccion_s': round(construccion_s, 2), 'mediciones': mediciones
+                })
+                for medicion in mediciones:
+                    print(f"{tamano:>9} M={m:<3} efC={ef_construccion:<4} ef={medicion['ef_busqueda']:<4} "
+                          f"recall@{args.k}={medicion[f'recall@{args.k}']:.4f} p50={medicion['p50_ms']:.3f}ms p95={medicion['p95_ms']:.3f}ms")
+
+        if args.chroma:
+            chroma = medirChroma(datos, consultas, exactos, args.k)
+            resultados.append({'chunks': tamano, 'chroma': chroma})
+            print(f"{tamano:>9} chroma {chroma['parametros']} recall@{args.k}={chroma[f'recall@{args.k}']:.4f} "
+                  f"p50={chroma['p50_ms']:.3f}ms p95={chroma['p95_ms']:.3f}ms")
+
+        del datos
+
+    resultado = {
+        'commit': obtenerCommit(),
+        'fecha': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'dimensiones': args.dimensiones,
+        'consultas': args.consultas,
+        'k': args.k,
+        'espacio': args.espacio,
+        'resultados': resultados
+    }
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {args.salida}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+Benchmark offline del pipeline: extracción, chunking, ingesta, recuperación,
+turnos de chat y /analyze completo, con modelos falsos determinísticos.
+
+Uso:
+    python benchmarks/bench_pipeline.py --salida bench.json
+    python benchmarks/bench_pipeline.py --latencia-llm-ms 800 --comparar bench_anterior.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import statistics
+from datetime import datetime
+from typing import Callable, Dict, List, Any
+
+DIRECTORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(DIRECTORIO_BENCHMARKS), 'src'))
+sys.path.append(DIRECTORIO_BENCHMARKS)
+
+CONSULTAS = [
+    "¿Cuál es el nivel de endeudamiento?",
+    "¿Cómo está la liquidez corriente de la empresa?",
+    "¿Qué contingencias tributarias existen?",
+]
+
+def medir(funcion: Callable[[int], Any], repeticiones: int) -> Dict[str, float]:
+    """Ejecuta la función varias veces y resume las latencias en milisegundos."""
+    tiempos = []
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(i)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    tiempos.sort()
+    return {
+        'n': repeticiones,
+        'media_ms': round(statistics.mean(tiempos), 3),
+        'p50_ms': round(tiempos[len(tiempos) // 2], 3),
+        'p95_ms': round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 3),
+        'min_ms': round(tiempos[0], 3),
+        'max_ms': round(tiempos[-1], 3),
+        'por_segundo': round(1000 / statistics.mean(tiempos), 3) if statistics.mean(tiempos) else None
+    }
+
+def obtenerCommit() -> str:
+    """Retorna el hash corto del commit actual, si está disponible."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=DIRECTORIO_BENCHMARKS, text=True).strip()
+    except Exception:
+        return 'desconocido'
+
+def verificarExtraccion(carpeta: str) -> None:
+    """
+    Comprueba que el scoring local lee las partidas escritas en los PDFs
+    sintéticos, con etiquetas en singular y en plural; un benchmark sobre
+    cifras mal extraídas mediría el camino equivocado.
+    """
+    from synthetic import generarEstadoFinanciero
+    from rag.pdfProcessor import extraerTextoDePDF
+    from rag.scoringLocal import extraerPartidasFinancieras
+
+    for plural in (False, True):
+        ruta = os.path.join(carpeta, f"verificacion_{'plural' if plural else 'singular'}.pdf")
+        esperadas = generarEstadoFinanciero(ruta, 2, semilla=7, plural=plural)
+        extraidas = extraerPartidasFinancieras(extraerTextoDePDF(ruta))
+        diferencias = {k: (v, extraidas.get(k)) for k, v in esperadas.items() if extraidas.get(k) != v}
+        if diferencias:
+            raise AssertionError(f"Partidas mal extraídas (plural={plural}): {diferencias}")
+
+def ejecutarBenchmark(carpeta: str, repeticiones: int) -> Dict[str, Any]:
+    """Mide cada etapa del pipeline para cada tamaño de PDF sintético."""
+    from synthetic import generarConjuntoDePdfs, generarEstadoFinanciero, TAMANOS_PDF
+    from rag.pdfProcessor import extraerTextoDePDF, dividirTextoEnChunks
+    from rag.vectorStore import crearBaseDeConocimiento, cargarDocumentosEnBaseDeConocimiento, buscarEnBaseDeConocimiento
+    from rag.chat import SesionDeChat
+    from main import create_app
+
+    verificarExtraccion(os.path.join(carpeta, 'pdfs'))
+    pdfs = generarConjuntoDePdfs(os.path.join(carpeta, 'pdfs'))
+    app = create_app()
+    app.config['UPLOAD_FOLDER'] = os.path.join(carpeta, 'uploads')
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    cliente = app.test_client()
+
+    resultados = {}
+    for tamano, ruta in pdfs.items():
+        texto = extraerTextoDePDF(ruta)
+        documentos = [{'contenido': texto, 'metadatos': {'tipo': 'estado_financiero', 'archivo': os.path.basename(ruta)}}]
+        nombre_coleccion = f"bench_{tamano}"
+        coleccion = crearBaseDeConocimiento(nombre_coleccion)
+        cargarDocumentosEnBaseDeConocimiento(coleccion, documentos)
+        sesion = SesionDeChat(nombre_coleccion)
+
+        with open(ruta, 'rb') as f:
+            contenido_pdf = f.read()
+
+        # PDFs distintos por repetición para que /analyze no responda desde el almacén de artefactos
+        variantes = []
+        for i in range(repeticiones):
+            ruta_variante = os.path.join(carpeta, 'pdfs', f"{tamano}_{i}.pdf")
+            generarEstadoFinanciero(ruta_variante, TAMANOS_PDF[tamano], semilla=1000 + i)
+            with open(ruta_variante, 'rb') as f:
+                variantes.append(f.read())
+
+        def analizar(i: int, contenido: bytes = None):
+            from io import BytesIO
+            respuesta = cliente.post('/api/analyze', data={'pdf': (BytesIO(contenido or variantes[i]), os.path.basename(ruta))})
+            assert respuesta.status_code == 200, respuesta.data
+
+        resultados[tamano] = {
+            'caracteres': len(texto),
+            'chunks': len(dividirTextoEnChunks(texto)),
+            'extraccion': medir(lambda i: extraerTextoDePDF(ruta), repeticiones),
+            'chunking': medir(lambda i: dividirTextoEnChunks(texto), repeticiones),
+            'ingesta': medir(lambda i: cargarDocumentosEnBaseDeConocimiento(crearBaseDeConocimiento(f"{nombre_coleccion}_ingesta_{i}"), documentos), repeticiones),
+            'recuperacion': medir(lambda i: buscarEnBaseDeConocimiento(coleccion, CONSULTAS[i % len(CONSULTAS)]), repeticiones),
+            'chat': medir(lambda i: sesion.generar_respuesta(CONSULTAS[i % len(CONSULTAS)]), repeticiones),
+            'analyze': medir(analizar, repeticiones),
+            'analyze_repetido': medir(lambda i: analizar(i, contenido_pdf), repeticiones)
+        }
+        print(f"{tamano}: {json.dumps({k: v['media_ms'] for k, v in resultados[tamano].items() if isinstance(v, dict)})}")
+
+    return resultados
+
+def compararResultados(actual: Dict[str, Any], anterior: Dict[str, Any]) -> List[str]:
+    """Genera líneas de comparación de la latencia media entre dos ejecuciones."""
+    lineas = [f"Comparación {anterior.get('commit')} -> {actual.get('commit')} (media ms)"]
+    for tamano, etapas in actual['resultados'].items():
+        for etapa, stats in etapas.items():
+            previo = anterior.get('resultados', {}).get(tamano, {}).get(etapa)
+            if not isinstance(stats, dict) or not isinstance(previo, dict):
+                continue
+            cambio = (stats['media_ms'] - previo['media_ms']) / previo['media_ms'] * 100 if previo['media_ms'] else 0
+            lineas.append(f"  {tamano:8} {etapa:12} {previo['media_ms']:10.2f} -> {stats['media_ms']:10.2f} ({cambio:+.1f}%)")
+    return lineas
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark offline del pipeline RAG')
+    parser.add_argument('--salida', default='bench_pipeline.json', help='Archivo JSON de resultados')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--latencia-llm-ms', type=float, default=0.0, help='Latencia simulada por llamada al chat')
+    parser.add_argument('--latencia-embedding-ms', type=float, default=0.0, help='Latencia simulada por llamada de embeddings')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior para comparar')
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(prefix='pyme_bench_')
+
+    # La configuración se lee al importar rag.config, así que va antes de cualquier import
+    os.environ['LLM_BACKEND'] = 'fake'
+    os.environ['FAKE_LLM_LATENCIA_MS'] = str(args.latencia_llm_ms)
+    os.environ['FAKE_EMBEDDING_LATENCIA_MS'] = str(args.latencia_embedding_ms)
+    os.environ['CHROMA_DB_PATH'] = os.path.join(carpeta, 'chromadb')
+    os.environ['ARTEFACTOS_PATH'] = os.path.join(carpeta, 'txt')
+    os.environ.setdefault('LOG_NIVEL', 'WARNING')
+
+    resultado = {
+        'commit': obtenerCommit(),
+        'fecha': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'configuracion': {
+            'repeticiones': args.repeticiones,
+            'latencia_llm_ms': args.latencia_llm_ms,
+            'latencia_embedding_ms': args.latencia_embedding_ms
+        },
+        'resultados': ejecutarBenchmark(carpeta, args.repeticiones)
+    }
+
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            print('\n'.join(compararResultados(resultado, json.load(f))))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark del tiempo de arranque en frío de la app.
+
+Cada repetición corre en un proceso nuevo y mide: importar main, create_app,
+el primer health check, la primera petición que necesita dependencias
+pesadas (/api/chat) y, opcionalmente, el precalentamiento. También reporta
+qué dependencias pesadas quedaron cargadas tras el health check.
+
+Uso:
+    python benchmarks/bench_startup.py --salida startup.json
+    python benchmarks/bench_startup.py --precalentar --comparar startup_anterior.json
+"""
+import os
+import sys
+import json
+import argparse
+import platform
+import tempfile
+import subprocess
+import statistics
+from datetime import datetime
+from typing import Dict, List, Any
+
+DIRECTORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+DIRECTORIO_SRC = os.path.join(os.path.dirname(DIRECTORIO_BENCHMARKS), 'src')
+sys.path.append(DIRECTORIO_BENCHMARKS)
+
+from bench_pipeline import obtenerCommit
+
+MODULOS_PESADOS = ('chromadb', 'langchain_openai', 'langchain_core', 'openai', 'fitz', 'bs4', 'requests', 'numpy')
+
+# Programa que corre en el proceso hijo; imprime un JSON con los tiempos
+_PROGRAMA = """
+import sys, json, time
+inicio = time.perf_counter()
+from main import create_app
+t_import = time.perf_counter()
+app = create_app()
+t_app = time.perf_counter()
+cliente = app.test_client()
+assert cliente.get('/').status_code == 200
+t_health = time.perf_counter()
+cargados = [m for m in MODULOS if m in sys.modules]
+cliente.post('/api/chat', json={'chatInput': 'hola', 'sessionId': 'arranque'})
+t_chat = time.perf_counter()
+print(json.dumps({
+    'import_ms': (t_import - inicio) * 1000,
+    'create_app_ms': (t_app - t_import) * 1000,
+    'health_check_ms': (t_health - t_app) * 1000,
+    'listo_ms': (t_health - inicio) * 1000,
+    'primer_chat_ms': (t_chat - t_health) * 1000,
+    'modulos_pesados_tras_health': cargados
+}))
+"""
+
+def medirArranque(entorno: Dict[str, str]) -> Dict[str, Any]:
+    """Ejecuta una medición en un proceso Python nuevo."""
+    programa = f"MODULOS = {MODULOS_PESADOS!r}\n" + _PROGRAMA
+    salida = subprocess.run(
+        [sys.executable, '-c', programa],
+        cwd=DIRECTORIO_SRC, env=entorno, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+def resumir(mediciones: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Resume cada tiempo con media, mediana y máximo."""
+    resumen = {}
+    for clave in mediciones[0]:
+        if not clave.endswith('_ms'):
+            continue
+        valores = sorted(m[clave] for m in mediciones)
+        resumen[clave] = {
+            'media_ms': round(statistics.mean(valores), 3),
+            'p50_ms': round(valores[len(valores) // 2], 3),
+            'max_ms': round(valores[-1], 3)
+        }
+    resumen['modulos_pesados_tras_health'] = mediciones[-1]['modulos_pesados_tras_health']
+    return resumen
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de arranque en frío')
+    parser.add_argument('--salida', default='bench_startup.json')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--precalentar', action='store_true', help='Medir también con PRECALENTAR_AL_INICIAR=true')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior para comparar')
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(prefix='pyme_arranque_')
+    base = {
+        **os.environ,
+        'LLM_BACKEND': 'fake',
+        'CHROMA_DB_PATH': os.path.join(carpeta, 'chromadb'),
+        'LOG_NIVEL': 'WARNING'
+    }
+
+    variantes = {'perezoso': {**base, 'PRECALENTAR_AL_INICIAR': 'false'}}
+    if args.precalentar:
+        variantes['precalentado'] = {**base, 'PRECALENTAR_AL_INICIAR': 'true'}
+
+    resultados = {}
+    for nombre, entorno in variantes.items():
+        resultados[nombre] = resumir([medirArranque(entorno) for _ in range(args.repeticiones)])
+        tiempos = {k: v['media_ms'] for k, v in resultados[nombre].items() if isinstance(v, dict)}
+        print(f"{nombre}: {json.dumps(tiempos)}")
+        print(f"  cargados tras health check: {resultados[nombre]['modulos_pesados_tras_health']}")
+
+    resultado = {
+        'commit': obtenerCommit(),
+        'fecha': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'repeticiones': args.repeticiones,
+        'resultados': resultados
+    }
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            anterior = json.load(f)
+        print(f"Comparación {anterior.get('commit')} -> {resultado['commit']} (media ms)")
+        for variante, etapas in resultados.items():
+            for etapa, stats in etapas.items():
+                previo = anterior.get('resultados', {}).get(variante, {}).get(etapa)
+                if isinstance(stats, dict) and isinstance(previo, dict) and previo['media_ms']:
+                    cambio = (stats['media_ms'] - previo['media_ms']) / previo['media_ms'] * 100
+                    print(f"  {variante:12} {etapa:16} {previo['media_ms']:10.2f} -> {stats['media_ms']:10.2f} ({cambio:+.1f}%)")
+
+if __name__ == '__main__':
+    main()
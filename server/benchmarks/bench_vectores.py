@@ -0,0 +1,165 @@
+"""
+Benchmark de backends de la base vectorial: ChromaDB contra la matriz NumPy
+mapeada en memoria (float16 e int8).
+
+Para cada backend y tamaño de colección se construye la colección en un
+proceso y se consulta desde otro proceso nuevo, como haría un worker que la
+abre ya creada. Se reporta el tiempo de carga, la latencia de consulta
+(p50/p95), el recall@k contra la búsqueda exacta en float32 y la memoria
+residente que agrega abrir y consultar la colección.
+
+Uso:
+    python benchmarks/bench_vectores.py --tamanos 1000,5000,20000 --salida vectores.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from typing import Dict, List, Any
+
+DIRECTORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+DIRECTORIO_SRC = os.path.join(os.path.dirname(DIRECTORIO_BENCHMARKS), 'src')
+sys.path.append(DIRECTORIO_BENCHMARKS)
+sys.path.append(DIRECTORIO_SRC)
+
+from bench_pipeline import obtenerCommit
+from bench_ann import generarVectores, vecinosExactos, calcularRecall, resumirLatencias
+
+BACKENDS = {
+    'chroma': {'VECTORES_BACKEND': 'chroma'},
+    'numpy_float16': {'VECTORES_BACKEND': 'numpy', 'VECTORES_NUMPY_TIPO': 'float16'},
+    'numpy_int8': {'VECTORES_BACKEND': 'numpy', 'VECTORES_NUMPY_TIPO': 'int8'}
+}
+
+def memoriaResidenteMb() -> float:
+    """VmRSS del proceso actual en MB (Linux)."""
+    with open('/proc/self/status') as f:
+        for linea in f:
+            if linea.startswith('VmRSS:'):
+                return int(linea.split()[1]) / 1024
+    return 0.0
+
+def datosSinteticos(tamano: int, dimensiones: int, consultas: int, semilla: int):
+    import numpy as np
+
+    aleatorio = np.random.default_rng(semilla)
+    centros = aleatorio.normal(0, 1, (tamano // 200 + 1, dimensiones)).astype(np.float32)
+    centros /= np.linalg.norm(centros, axis=1, keepdims=True)
+    return (generarVectores(tamano, dimensiones, centros, semilla + 1),
+            generarVectores(consultas, dimensiones, centros, semilla + 2))
+
+def construir(args) -> Dict[str, Any]:
+    """Proceso hijo: crea la colección y carga los vectores."""
+    from rag.vectorStore import crearBaseDeConocimiento
+
+    datos, _ = datosSinteticos(args.tamano, args.dimensiones, args.consultas, args.semilla)
+    coleccion = crearBaseDeConocimiento('bench_vectores', dimensiones=args.dimensiones)
+    inicio = time.perf_counter()
+    for desde in range(0, len(datos), 1000):
+        lote = datos[desde:desde + 1000]
+        coleccion.upsert(
+            ids=[f"chunk_{i}" for i in range(desde, desde + len(lote))],
+            embeddings=lote.tolist(),
+            documents=[f"chunk {i}" for i in range(desde, desde + len(lote))],
+            metadatas=[{'chunk_index': i} for i in range(desde, desde + len(lote))]
+        )
+    return {'carga_s': round(time.perf_counter() - inicio, 3)}
+
+def consultar(args) -> Dict[str, Any]:
+    """Proceso hijo: abre la colección existente y mide consultas y memoria."""
+    import numpy as np
+    from rag.vectorStore import obtenerBaseDeConocimiento
+
+    datos, consultas = datosSinteticos(args.tamano, args.dimensiones, args.consultas, args.semilla)
+    exactos = vecinosExactos(datos, consultas, args.k)
+    lista_consultas = consultas.tolist()
+    del datos
+
+    memoria_inicial = memoriaResidenteMb()
+    inicio = time.perf_counter()
+    coleccion = obtenerBaseDeConocimiento('bench_vectores')
+    coleccion.query(query_embeddings=[lista_consultas[0]], n_results=args.k)
+    primera_consulta_ms = (time.perf_counter() - inicio) * 1000
+
+    encontrados, latencias = [], []
+    for consulta in lista_consultas:
+        t = time.perf_counter()
+        resultado = coleccion.query(query_embeddings=[consulta], n_results=args.k, include=['documents', 'metadatas', 'distances'])
+        latencias.append(time.perf_counter() - t)
+        encontrados.append([int(chunk_id.split('_')[1]) for chunk_id in resultado['ids'][0]])
+
+    return {
+        'apertura_y_primera_consulta_ms': round(primera_consulta_ms, 3),
+        f'recall@{args.k}': round(calcularRecall(encontrados, np.asarray(exactos)), 4),
+        'memoria_residente_mb': round(memoriaResidenteMb() - memoria_inicial, 1),
+        **resumirLatencias(latencias)
+    }
+
+def ejecutarHijo(modo: str, entorno: Dict[str, str], args, tamano: int) -> Dict[str, Any]:
+    comando = [
+        sys.executable, os.path.abspath(__file__), '--modo', modo, '--tamano', str(tamano),
+        '--dimensiones', str(args.dimensiones), '--consultas', str(args.consultas), '--k', str(args.k), '--semilla', str(args.semilla)
+    ]
+    salida = subprocess.run(comando, env=entorno, capture_output=True, text=True, check=True).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+def enteros(valor: str) -> List[int]:
+    return [int(v) for v in valor.split(',') if v]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de backends vectoriales (ChromaDB y NumPy)')
+    parser.add_argument('--salida', default='bench_vectores.json')
+    parser.add_argument('--tamanos', type=enteros, default=[1000, 5000, 20000], help='Chunks por colección, separados por comas')
+    parser.add_argument('--dimensiones', type=int, default=1536)
+    parser.add_argument('--consultas', type=int, default=100)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--backends', default=','.join(BACKENDS))
+    parser.add_argument('--modo', choices=['construir', 'consultar'], help=argparse.SUPPRESS)
+    parser.add_argument('--tamano', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.modo:
+        funcion = construir if args.modo == 'construir' else consultar
+        print(json.dumps(funcion(args)))
+        return
+
+    resultados = []
+    for tamano in args.tamanos:
+        for backend in args.backends.split(','):
+            carpeta = tempfile.mkdtemp(prefix='pyme_vectores_')
+            entorno = {
+                **os.environ, **BACKENDS[backend],
+                'CHROMA_DB_PATH': os.path.join(carpeta, 'chromadb'),
+                'LLM_BACKEND': 'fake',
+                'LOG_NIVEL': 'WARNING',
+                'VECTORES_MANTENIMIENTO_INTERVALO_S': '0'
+            }
+            medicion = {'chunks': tamano, 'backend': backend,
+                        **ejecutarHijo('construir', entorno, args, tamano),
+                        **ejecutarHijo('consultar', entorno, args, tamano)}
+            resultados.append(medicion)
+            print(f"{tamano:>7} {backend:14} carga={medicion['carga_s']:.2f}s p50={medicion['p50_ms']:.3f}ms "
+                  f"p95={medicion['p95_ms']:.3f}ms recall@{args.k}={medicion[f'recall@{args.k}']:.4f} "
+                  f"rss=+{medicion['memoria_residente_mb']}MB")
+
+    resultado = {
+        'commit': obtenerCommit(),
+        'fecha': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'dimensiones': args.dimensiones,
+        'consultas': args.consultas,
+        'k': args.k,
+        'resultados': resultados
+    }
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {args.salida}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+"""
+Generador de carga concurrente contra create_app() con el mock local de OpenAI.
+
+Levanta la app con N procesos x M hilos (modelo pre-fork, como gunicorn
+gthread), ejecuta una mezcla realista de /analyze, /chat, /simulate y
+/scrape-social con usuarios virtuales crecientes, y reporta p50/p95/p99,
+tasa de errores, throughput y punto de saturación de cada configuración.
+
+Uso:
+    python benchmarks/load_test.py --configuraciones 1x8,4x8 --usuarios 10,50,100 --duracion 20
+    python benchmarks/load_test.py --latencia-llm-ms 800 --tasa-429 0.02 --salida carga.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+from io import BytesIO
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Tuple
+
+import requests
+from werkzeug.serving import BaseWSGIServer
+
+DIRECTORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(DIRECTORIO_BENCHMARKS), 'src'))
+sys.path.append(DIRECTORIO_BENCHMARKS)
+
+from mock_openai import ConfiguracionMock, iniciarServidorMock
+from synthetic import generarEstadoFinanciero
+
+# Mezcla de tráfico por defecto (pesos relativos)
+MEZCLA_POR_DEFECTO = {'chat': 0.6, 'simulate': 0.2, 'analyze': 0.1, 'scrape-social': 0.1}
+
+PREGUNTAS = [
+    "¿Cuál es el nivel de endeudamiento?",
+    "¿Cómo está la liquidez de la empresa?",
+    "¿Qué riesgos ves para un crédito de 30.000?",
+    "Resume la rentabilidad del último ejercicio",
+]
+
+class ServidorConPool(BaseWSGIServer):
+    """Servidor WSGI que atiende peticiones con un número fijo de hilos."""
+
+    multithread = True
+
+    def __init__(self, host: str, port: int, app, hilos: int, fd: int = None):
+        super().__init__(host, port, app, fd=fd)
+        self.pool = ThreadPoolExecutor(max_workers=hilos)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._atender, request, client_address)
+
+    def _atender(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+def lanzarApp(app, procesos: int, hilos: int) -> Tuple[int, List[int]]:
+    """
+    Levanta la app con procesos pre-forkeados que comparten el socket.
+
+    Returns:
+        Tuple[int, List[int]]: Puerto de escucha y PIDs de los workers
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(1024)
+    puerto = sock.getsockname()[1]
+
+    pids = []
+    for _ in range(procesos):
+        pid = os.fork()
+        if pid == 0:
+            servidor = ServidorConPool('127.0.0.1', puerto, app, hilos, fd=sock.fileno())
+            try:
+                servidor.serve_forever()
+            finally:
+                os._exit(0)
+        pids.append(pid)
+
+    sock.close()
+
+    # Esperar a que algún worker responda
+    for _ in range(100):
+        try:
+            if requests.get(f"http://127.0.0.1:{puerto}/", timeout=1).status_code == 200:
+                break
+        except requests.RequestException:
+            time.sleep(0.1)
+
+    return puerto, pids
+
+def detenerApp(pids: List[int]):
+    """Termina los workers de la app."""
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in pids:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+
+def usuarioVirtual(indice: int, base_url: str, url_social: str, pdf: bytes, mezcla: Dict[str, float],
+                   fin: float, muestras: List[Tuple[str, float, int]]):
+    """Ejecuta peticiones en bucle cerrado hasta el tiempo límite."""
+    aleatorio = random.Random(indice)
+    sesion = requests.Session()
+    session_id = f"carga-{indice}"
+    endpoints = list(mezcla)
+    pesos = [mezcla[e] for e in endpoints]
+
+    while time.time() < fin:
+        endpoint = aleatorio.choices(endpoints, pesos)[0]
+        inicio = time.perf_counter()
+        try:
+            if endpoint == 'chat':
+                r = sesion.post(f"{base_url}/api/chat", json={'chatInput': aleatorio.choice(PREGUNTAS), 'sessionId': session_id}, timeout=120)
+            elif endpoint == 'simulate':
+                r = sesion.post(f"{base_url}/api/simulate", json={
+                    'partidas': {'activo_corriente': 150000, 'pasivo_corriente': 100000, 'patrimonio': 120000,
+                                 'pasivo_total': 250000, 'ventas': 800000, 'utilidad_neta': 20000},
+                    'narrar': aleatorio.random() < 0.5
+                }, timeout=120)
+            elif endpoint == 'analyze':
+                r = sesion.post(f"{base_url}/api/analyze", files={'pdf': (f"estados_{indice}.pdf", BytesIO(pdf))}, timeout=300)
+            else:
+                r = sesion.post(f"{base_url}/api/scrape-social", json={'social_url': url_social}, timeout=60)
+            estado = r.status_code
+        except requests.RequestException:
+            estado = 0
+
+        muestras.append((endpoint, (time.perf_counter() - inicio) * 1000, estado))
+
+def _percentil(valores: List[float], p: float) -> float:
+    """Percentil por rango más cercano."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))], 2)
+
+def resumirMuestras(muestras: List[Tuple[str, float, int]], duracion: float) -> Dict[str, Any]:
+    """Agrupa latencias, errores y throughput por endpoint y en total."""
+    grupos = {'total': muestras}
+    for muestra in muestras:
+        grupos.setdefault(muestra[0], []).append(muestra)
+
+    resumen = {}
+    for nombre, grupo in grupos.items():
+        latencias = [m[1] for m in grupo]
+        errores = sum(1 for m in grupo if m[2] == 0 or m[2] >= 500)
+        resumen[nombre] = {
+            'peticiones': len(grupo),
+            'rps': round(len(grupo) / duracion, 2),
+            'p50_ms': _percentil(latencias, 50),
+            'p95_ms': _percentil(latencias, 95),
+            'p99_ms': _percentil(latencias, 99),
+            'tasa_error': round(errores / len(grupo), 4) if grupo else 0.0
+        }
+    return resumen
+
+def ejecutarNivel(puerto: int, usuarios: int, duracion: float, url_social: str, pdf: bytes, mezcla: Dict[str, float]) -> Dict[str, Any]:
+    """Ejecuta un nivel de concurrencia y retorna su resumen."""
+    muestras = []
+    fin = time.time() + duracion
+    hilos = [
+        threading.Thread(target=usuarioVirtual, args=(i, f"http://127.0.0.1:{puerto}", url_social, pdf, mezcla, fin, muestras))
+        for i in range(usuarios)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    return resumirMuestras(muestras, duracion)
+
+def detectarSaturacion(niveles: Dict[int, Dict[str, Any]], slo_p95_ms: float, max_error: float) -> Dict[str, Any]:
+    """Identifica el throughput máximo y el primer nivel que incumple el SLO."""
+    mejor = max(niveles, key=lambda u: niveles[u]['total']['rps'])
+    incumple = next((u for u in sorted(niveles)
+                     if niveles[u]['total']['p95_ms'] > slo_p95_ms or niveles[u]['total']['tasa_error'] > max_error), None)
+    return {
+        'usuarios_throughput_maximo': mejor,
+        'rps_maximo': niveles[mejor]['total']['rps'],
+        'primer_nivel_fuera_de_slo': incumple
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga de la API con OpenAI simulado')
+    parser.add_argument('--configuraciones', default='1x8,2x8', help='Lista de procesos x hilos, p. ej. 1x8,4x16')
+    parser.add_argument('--usuarios', default='10,50,100', help='Niveles de usuarios concurrentes')
+    parser.add_argument('--duracion', type=float, default=20.0, help='Segundos por nivel')
+    parser.add_argument('--latencia-llm-ms', type=float, default=600.0)
+    parser.add_argument('--jitter-ms', type=float, default=200.0)
+    parser.add_argument('--tasa-429', type=float, default=0.0)
+    parser.add_argument('--tasa-5xx', type=float, default=0.0)
+    parser.add_argument('--mezcla', help='JSON con pesos por endpoint, p. ej. {"chat": 0.7, "analyze": 0.3}')
+    parser.add_argument('--slo-p95-ms', type=float, default=5000.0)
+    parser.add_argument('--max-error', type=float, default=0.01)
+    parser.add_argument('--salida', default='load_test.json')
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(prefix='pyme_carga_')
+    mock = iniciarServidorMock(0, ConfiguracionMock(args.latencia_llm_ms, args.jitter_ms, args.tasa_429, args.tasa_5xx))
+    url_mock = f"http://127.0.0.1:{mock.server_address[1]}"
+
+    # La configuración se lee al importar rag.config, así que va antes de importar la app
+    os.environ['LLM_BACKEND'] = 'openai'
+    os.environ['OPENAI_API_KEY'] = 'mock'
+    os.environ['OPENAI_BASE_URL'] = f"{url_mock}/v1"
+    os.environ['CHROMA_DB_PATH'] = os.path.join(carpeta, 'chromadb')
+    os.environ['ARTEFACTOS_PATH'] = os.path.join(carpeta, 'txt')
+    os.environ.setdefault('LOG_NIVEL', 'WARNING')
+    from main import create_app
+
+    ruta_pdf = os.path.join(carpeta, 'estado.pdf')
+    generarEstadoFinanciero(ruta_pdf, 5)
+    with open(ruta_pdf, 'rb') as f:
+        pdf = f.read()
+
+    mezcla = json.loads(args.mezcla) if args.mezcla else MEZCLA_POR_DEFECTO
+    resultados = {}
+
+    for configuracion in args.configuraciones.split(','):
+        procesos, hilos = (int(x) for x in configuracion.lower().split('x'))
+        app = create_app()
+        app.config['UPLOAD_FOLDER'] = os.path.join(carpeta, 'uploads')
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        puerto, pids = lanzarApp(app, procesos, hilos)
+
+        niveles = {}
+        try:
+            for usuarios in (int(u) for u in args.usuarios.split(',')):
+                niveles[usuarios] = ejecutarNivel(puerto, usuarios, args.duracion, f"{url_mock}/pagina", pdf, mezcla)
+                total = niveles[usuarios]['total']
+                print(f"{configuracion} usuarios={usuarios}: {total['rps']} rps, p95={total['p95_ms']} ms, "
+                      f"p99={total['p99_ms']} ms, errores={total['tasa_error'] * 100:.1f}%")
+        finally:
+            detenerApp(pids)
+
+        resultados[configuracion] = {
+            'niveles': niveles,
+            'saturacion': detectarSaturacion(niveles, args.slo_p95_ms, args.max_error)
+        }
+
+    salida = {
+        'fecha': datetime.now().isoformat(),
+        'parametros': vars(args),
+        'mock': mock.config.contadores,
+        'resultados': resultados
+    }
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(salida, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {args.salida}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+Servidor HTTP local que imita los endpoints de chat y embeddings de OpenAI.
+
+Permite inyectar latencia, errores 429 (con Retry-After) y 5xx, y soporta
+respuestas en streaming. La app se apunta a él con OPENAI_BASE_URL.
+
+Uso:
+    python benchmarks/mock_openai.py --puerto 8089 --latencia-ms 600 --tasa-429 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=mock python src/main.py
+"""
+import os
+import sys
+import json
+import time
+import base64
+import random
+import struct
+import zlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from rag.fakeBackends import EmbeddingsFalsos, _instanciaDeEsquema, _estimarTokens
+
+PAGINA_SOCIAL = """<html><head><title>Comercial Ejemplo</title>
+<meta name="description" content="Tienda de productos de calidad"></head>
+<body><p>Excelente servicio, muy recomendado.</p><p>Contacto: ventas@ejemplo.com 099-123-4567</p>
+<div class="review">Buen producto</div><div class="review">Profesional y rápido</div></body></html>"""
+
+class ConfiguracionMock:
+    """Parámetros de comportamiento del servidor simulado."""
+
+    def __init__(self, latencia_ms: float = 0.0, jitter_ms: float = 0.0, tasa_429: float = 0.0,
+                 tasa_5xx: float = 0.0, retry_after_s: float = 1.0, ms_por_token: float = 0.0):
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self.tasa_429 = tasa_429
+        self.tasa_5xx = tasa_5xx
+        self.retry_after_s = retry_after_s
+        self.ms_por_token = ms_por_token
+        self.contadores = {'chat': 0, 'embeddings': 0, '429': 0, '5xx': 0}
+        self.lock = threading.Lock()
+        self.prefijos = set()
+
+    def contar(self, clave: str):
+        with self.lock:
+            self.contadores[clave] += 1
+
+    def tokensEnCache(self, modelo: str, prompt: str) -> int:
+        """
+        Imita el prompt caching de OpenAI: se reutiliza el prefijo más largo ya
+        visto, en bloques de 128 tokens a partir de 1024 (4 caracteres por token).
+        """
+        cacheados = 0
+        with self.lock:
+            for fin in range(4096, len(prompt) + 1, 512):
+                clave = (modelo, zlib.crc32(prompt[:fin].encode('utf-8')))
+                if clave in self.prefijos:
+                    cacheados = fin // 4
+                self.prefijos.add(clave)
+        return cacheados
+
+def _crearManejador(config: ConfiguracionMock):
+    """Crea la clase de manejador HTTP ligada a una configuración."""
+
+    class ManejadorOpenAI(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, formato, *args):
+            pass
+
+        def _responderJson(self, estado: int, cuerpo: Dict[str, Any], cabeceras: Optional[Dict[str, str]] = None):
+            datos = json.dumps(cuerpo).encode('utf-8')
+            self.send_response(estado)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(datos)))
+            for clave, valor in (cabeceras or {}).items():
+                self.send_header(clave, valor)
+            self.end_headers()
+            self.wfile.write(datos)
+
+        def _esperar(self):
+            retardo = config.latencia_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+            if retardo > 0:
+                time.sleep(retardo / 1000)
+
+        def _errorInyectado(self) -> bool:
+            sorteo = random.random()
+            if sorteo < config.tasa_429:
+                config.contar('429')
+                self._responderJson(429, {'error': {'message': 'Rate limit reached (mock)', 'type': 'rate_limit_error'}},
+                                    {'Retry-After': f"{config.retry_after_s:g}"})
+                return True
+            if sorteo < config.tasa_429 + config.tasa_5xx:
+                config.contar('5xx')
+                self._responderJson(503, {'error': {'message': 'Service unavailable (mock)', 'type': 'server_error'}})
+                return True
+            return False
+
+        def do_GET(self):
+            # Página HTML para /scrape-social
+            datos = PAGINA_SOCIAL.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+
+        def do_POST(self):
+            longitud = int(self.headers.get('Content-Length', 0))
+            cuerpo = json.loads(self.rfile.read(longitud) or b'{}')
+
+            if self._errorInyectado():
+                return
+
+            if self.path.endswith('/chat/completions'):
+                config.contar('chat')
+                self._chat(cuerpo)
+            elif self.path.endswith('/embeddings'):
+                config.contar('embeddings')
+                self._esperar()
+                self._embeddings(cuerpo)
+            else:
+                self._responderJson(404, {'error': {'message': f'Ruta no soportada: {self.path}'}})
+
+        def _contenidoChat(self, cuerpo: Dict[str, Any]) -> str:
+            prompt = '\n'.join(str(m.get('content', '')) for m in cuerpo.get('messages', []))
+            semilla = zlib.crc32(prompt.encode('utf-8'))
+            formato = cuerpo.get('response_format') or {}
+            if formato.get('type') == 'json_schema':
+                return json.dumps(_instanciaDeEsquema(formato['json_schema']['schema'], semilla), ensure_ascii=False)
+            if formato.get('type') == 'json_object':
+                return json.dumps({'respuesta': 'simulada'})
+            return f"Respuesta simulada del mock ({len(prompt)} caracteres de prompt)."
+
+        def _chat(self, cuerpo: Dict[str, Any]):
+            prompt = '\n'.join(str(m.get('content', '')) for m in cuerpo.get('messages', []))
+            contenido = self._contenidoChat(cuerpo)
+            uso = {'prompt_tokens': _estimarTokens(prompt), 'completion_tokens': _estimarTokens(contenido)}
+            uso['total_tokens'] = uso['prompt_tokens'] + uso['completion_tokens']
+            uso['prompt_tokens_details'] = {'cached_tokens': config.tokensEnCache(cuerpo.get('model', 'mock'), prompt)}
+            base = {'id': f"chatcmpl-mock{random.randint(0, 10**9)}", 'created': int(time.time()), 'model': cuerpo.get('model', 'mock')}
+
+            if not cuerpo.get('stream'):
+                self._esperar()
+                time.sleep(config.ms_por_token * uso['completion_tokens'] / 1000)
+                self._responderJson(200, {
+                    **base,
+                    'object': 'chat.completion',
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': contenido}, 'finish_reason': 'stop'}],
+                    'usage': uso
+                })
+                return
+
+            # Streaming: primer token tras la latencia, luego fragmentos espaciados
+            self._esperar()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+
+            fragmentos = [contenido[i:i + 16] for i in range(0, len(contenido), 16)]
+            for i, fragmento in enumerate(fragmentos):
+                delta = {'content': fragmento} if i else {'role': 'assistant', 'content': fragmento}
+                evento = {**base, 'object': 'chat.completion.chunk', 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]}
+                self.wfile.write(f"data: {json.dumps(evento)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(config.ms_por_token * 4 / 1000)
+
+            final = {**base, 'object': 'chat.completion.chunk', 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}
+            self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        def _embeddings(self, cuerpo: Dict[str, Any]):
+            entradas = cuerpo.get('input', [])
+            if isinstance(entradas, (str, int)) or (entradas and isinstance(entradas[0], int)):
+                entradas = [entradas]
+
+            generador = EmbeddingsFalsos(dimensiones=int(cuerpo.get('dimensions') or 1536))
+            datos = []
+            tokens = 0
+            for i, entrada in enumerate(entradas):
+                # langchain envía listas de tokens; se vectorizan como texto
+                texto = entrada if isinstance(entrada, str) else ' '.join(str(t) for t in entrada)
+                tokens += len(entrada) if isinstance(entrada, list) else _estimarTokens(texto)
+                vector = generador._vectorizar(texto)
+                if cuerpo.get('encoding_format') == 'base64':
+                    vector = base64.b64encode(struct.pack(f'<{len(vector)}f', *vector)).decode('ascii')
+                datos.append({'object': 'embedding', 'index': i, 'embedding': vector})
+
+            self._responderJson(200, {
+                'object': 'list',
+                'data': datos,
+                'model': cuerpo.get('model', 'mock'),
+                'usage': {'prompt_tokens': tokens, 'total_tokens': tokens}
+            })
+
+    return ManejadorOpenAI
+
+def iniciarServidorMock(puerto: int = 0, config: Optional[ConfiguracionMock] = None) -> ThreadingHTTPServer:
+    """
+    Inicia el servidor simulado en un hilo de fondo.
+
+    Args:
+        puerto (int): Puerto a escuchar (0 = puerto libre)
+        config (ConfiguracionMock): Comportamiento a simular
+
+    Returns:
+        ThreadingHTTPServer: Servidor en ejecución (server_address tiene el puerto real)
+    """
+    config = config or ConfiguracionMock()
+    servidor = ThreadingHTTPServer(('127.0.0.1', puerto), _crearManejador(config))
+    servidor.daemon_threads = True
+    servidor.config = config
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor simulado de la API de OpenAI')
+    parser.add_argument('--puerto', type=int, default=8089)
+    parser.add_argument('--latencia-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--ms-por-token', type=float, default=0.0, help='Tiempo de generación por token de salida')
+    parser.add_argument('--tasa-429', type=float, default=0.0, help='Probabilidad de responder 429')
+    parser.add_argument('--tasa-5xx', type=float, default=0.0, help='Probabilidad de responder 503')
+    parser.add_argument('--retry-after-s', type=float, default=1.0)
+    args = parser.parse_args()
+
+    config = ConfiguracionMock(args.latencia_ms, args.jitter_ms, args.tasa_429, args.tasa_5xx, args.retry_after_s, args.ms_por_token)
+    servidor = ThreadingHTTPServer(('127.0.0.1', args.puerto), _crearManejador(config))
+    servidor.daemon_threads = True
+    print(f"Mock de OpenAI escuchando en http://127.0.0.1:{args.puerto}/v1")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print(f"Contadores: {config.contadores}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import os
+import random
+import fitz  # PyMuPDF
+from typing import Dict, Optional
+
+# Tamaños de documento (páginas) usados por los benchmarks
+TAMANOS_PDF = {
+    'pequeno': 2,
+    'mediano': 10,
+    'grande': 50
+}
+
+_PALABRAS_NOTAS = (
+    "la empresa mantiene obligaciones con instituciones financieras cuyo vencimiento "
+    "se concentra en el corto plazo las cuentas por cobrar a clientes presentan una "
+    "rotación promedio de sesenta días y la provisión para incobrables se calcula "
+    "según la antigüedad de la cartera los inventarios se valoran al costo promedio "
+    "ponderado y no exceden su valor neto de realización durante el ejercicio no se "
+    "registraron contingencias tributarias relevantes ante el servicio de rentas internas"
+).split()
+
+def generarEstadoFinanciero(ruta: str, paginas: int, semilla: int = 0, plural: Optional[bool] = None) -> Dict[str, float]:
+    """
+    Genera un PDF sintético con balance, estado de resultados y notas.
+
+    Args:
+        ruta (str): Ruta de salida del PDF
+        paginas (int): Número total de páginas (mínimo 2)
+        semilla (int): Semilla para cifras y texto reproducibles
+        plural (bool): Etiquetas en plural ('Total activos corrientes'); por defecto alterna según la semilla
+
+    Returns:
+        Dict[str, float]: Partidas escritas en el documento
+    """
+    aleatorio = random.Random(semilla)
+    activo_corriente = aleatorio.randint(50, 500) * 1000
+    pasivo_corriente = int(activo_corriente / aleatorio.uniform(0.6, 2.5))
+    activo_total = activo_corriente * 2 + aleatorio.randint(10, 200) * 1000
+    patrimonio = int(activo_total * aleatorio.uniform(0.2, 0.6))
+    pasivo_total = activo_total - patrimonio
+    ventas = int(activo_total * aleatorio.uniform(0.8, 3.0))
+    utilidad_neta = int(ventas * aleatorio.uniform(-0.05, 0.15))
+
+    partidas = {
+        'activo_corriente': activo_corriente,
+        'pasivo_corriente': pasivo_corriente,
+        'activo_total': activo_total,
+        'pasivo_total': pasivo_total,
+        'patrimonio': patrimonio,
+        'ventas': ventas,
+        'utilidad_neta': utilidad_neta
+    }
+
+    def monto(valor: float) -> str:
+        return f"{valor:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+    # Los balances reales usan ambas formas; la plural incluye también los subtotales no corrientes
+    plural = semilla % 2 == 1 if plural is None else plural
+    if plural:
+        lineas_partidas = [
+            f"Total activos corrientes {monto(activo_corriente)}",
+            f"Total activos no corrientes {monto(activo_total - activo_corriente)}",
+            f"Total activos {monto(activo_total)}",
+            f"Total pasivos corrientes {monto(pasivo_corriente)}",
+            f"Total pasivos {monto(pasivo_total)}",
+            f"Total patrimonio {monto(patrimonio)}",
+            f"Total pasivos y patrimonio {monto(activo_total)}",
+        ]
+    else:
+        lineas_partidas = [
+            f"Total activo corriente {monto(activo_corriente)}",
+            f"Total activo {monto(activo_total)}",
+            f"Total pasivo corriente {monto(pasivo_corriente)}",
+            f"Total pasivo {monto(pasivo_total)}",
+            f"Total patrimonio {monto(patrimonio)}",
+        ]
+
+    doc = fitz.open()
+
+    balance = doc.new_page()
+    lineas_balance = [
+        f"EMPRESA SINTÉTICA {semilla} S.A.",
+        "ESTADO DE SITUACIÓN FINANCIERA AL 31 DE DICIEMBRE",
+        *lineas_partidas,
+    ]
+    balance.insert_textbox(fitz.Rect(50, 50, 550, 800), '\n'.join(lineas_balance), fontsize=11)
+
+    resultados = doc.new_page()
+    lineas_resultados = [
+        "ESTADO DE RESULTADOS INTEGRALES",
+        f"Ventas netas {monto(ventas)}",
+        f"Costo de ventas {monto(ventas * 0.6)}",
+        f"Utilidad neta del ejercicio {monto(utilidad_neta)}",
+    ]
+    resultados.insert_textbox(fitz.Rect(50, 50, 550, 800), '\n'.join(lineas_resultados), fontsize=11)
+
+    for numero in range(max(paginas - 2, 0)):
+        notas = doc.new_page()
+        parrafos = []
+        for _ in range(6):
+            parrafos.append(' '.join(aleatorio.choice(_PALABRAS_NOTAS) for _ in range(70)).capitalize() + '.')
+        notas.insert_textbox(fitz.Rect(50, 50, 550, 800), f"NOTA {numero + 1}\n" + '\n\n'.join(parrafos), fontsize=9)
+
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    doc.save(ruta)
+    doc.close()
+    return partidas
+
+def generarConjuntoDePdfs(carpeta: str, semilla: int = 0) -> Dict[str, str]:
+    """
+    Genera un PDF por cada tamaño de TAMANOS_PDF.
+
+    Args:
+        carpeta (str): Carpeta de salida
+        semilla (int): Semilla base
+
+    Returns:
+        Dict[str, str]: tamaño -> ruta del PDF
+    """
+    rutas = {}
+    for i, (tamano, paginas) in enumerate(TAMANOS_PDF.items()):
+        ruta = os.path.join(carpeta, f"estado_{tamano}.pdf")
+        generarEstadoFinanciero(ruta, paginas, semilla + i)
+        rutas[tamano] = ruta
+    return rutas
@@ -2,19 +2,97 @@ import os
 import json
 import uuid
 import hashlib
+import time
+import shutil
+import threading
+import contextvars
+from contextlib import ExitStack
 from datetime import datetime
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, g
 from werkzeug.utils import secure_filename
-from rag.pdfProcessor import extraerTextoDePDF
-from rag.vectorStore import crearBaseDeConocimiento, cargarDocumentosEnBaseDeConocimiento
+from rag.pdfProcessor import extraerPaginasDePDF, unirPaginas, dividirTextoEnSpans, recibirPdf, retenerPdf
+from rag.artifactStore import cargarArtefacto, guardarArtefacto, claveScoring
+from rag.config import PDF_RETENER_SUBIDAS, ANALISIS_MAX_DOCUMENTOS
+from rag.vectorStore import (
+    crearBaseDeConocimiento, cargarDocumentosEnBaseDeConocimiento, idDeDocumento,
+    eliminarDocumentos, eliminarDocumentosDeEmpresa, compactarBaseDeConocimiento
+)
+from rag.documentCatalog import listarDocumentos, estadoColeccion
 from rag.chat import crearSesionDeChat, enviarMensajeAlChat
-from rag.utils import scrapingRedSocial, validarRUC, generarScoring
+from rag.utils import scrapingRedSocial, validarRUC, generarScoring, formatearResultadoAnalisis
+from rag.batchProcessor import extraerArchivoComprimido, procesarLoteDeEmpresas, reservarLote
+from rag.metrics import describirMetrica, observarHistograma, medirEtapa, exportarMetricasPrometheus
+from rag.logs import obtenerLogger, establecerRequestId, restablecerRequestId
+from rag.tokenUsage import iniciarConsumoPeticion, obtenerConsumoPeticion, obtenerConsumoSesion, asignarSesion, imputarConsumo
+from rag.llmScheduler import establecerPrioridad
+from rag.profiler import PERFILADO_ACTIVO, motivoDePerfilado, PerfilDePeticion
 
 api_blueprint = Blueprint('api', __name__)
+logger = obtenerLogger('api')
+
+describirMetrica('http_duracion_segundos', 'Latencia de las peticiones HTTP por endpoint, método y estado')
+
+# Clase de prioridad de las llamadas al LLM por endpoint (el resto usa 'analisis')
+CLASE_LLM_POR_ENDPOINT = {'chat': 'interactivo', 'analyze_batch': 'lote'}
 
 # Simular base de datos en memoria para usuarios
 usuarios_db = {}
 sesiones_db = {}
+lotes_db = {}
+
+@api_blueprint.before_request
+def iniciarPeticion():
+    # El request ID del cliente se respeta para correlacionar con sus logs
+    request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    g.token_request_id = establecerRequestId(request_id)
+    g.request_id = request_id
+    g.inicio_peticion = time.perf_counter()
+    
+    # El consumo de tokens se imputa al endpoint y, si se indica, a la sesión
+    datos = request.get_json(silent=True) if request.is_json else None
+    session_id = request.headers.get('X-Session-ID') or (datos or {}).get('sessionId') or request.form.get('sessionId')
+    endpoint = request.endpoint.split('.')[-1] if request.endpoint else 'desconocido'
+    iniciarConsumoPeticion(endpoint, session_id)
+    
+    # El chat se atiende antes que los análisis y estos antes que los lotes; el tenant reparte dentro de cada clase
+    establecerPrioridad(CLASE_LLM_POR_ENDPOINT.get(endpoint, 'analisis'), request.headers.get('X-Tenant-ID'))
+    
+    # Perfilado a pedido (cabecera de administrador) o por muestreo; sin configurar no se evalúa nada más
+    if PERFILADO_ACTIVO:
+        motivo = motivoDePerfilado(request.headers.get('X-Perfilar'))
+        if motivo:
+            g.perfil = PerfilDePeticion(request_id, endpoint, motivo)
+
+@api_blueprint.after_request
+def finalizarPeticion(response):
+    duracion = time.perf_counter() - g.get('inicio_peticion', time.perf_counter())
+    endpoint = request.endpoint.split('.')[-1] if request.endpoint else 'desconocido'
+    observarHistograma('http_duracion_segundos', duracion, endpoint=endpoint, metodo=request.method, estado=response.status_code)
+    response.headers['X-Request-ID'] = g.get('request_id', '')
+    if g.get('perfil') is not None:
+        g.perfil.estado = response.status_code
+        response.headers['X-Perfil'] = g.request_id
+    consumo = obtenerConsumoPeticion()
+    if consumo['llamadas']:
+        response.headers['X-LLM-Tokens'] = str(consumo['tokens_total'])
+        response.headers['X-LLM-Costo-USD'] = f"{consumo['costo_usd']:.6f}"
+    logger.info("Petición atendida", extra={'campos': {
+        'endpoint': endpoint, 'metodo': request.method, 'estado': response.status_code,
+        'duracion_ms': round(duracion * 1000, 3)
+    }})
+    return response
+
+@api_blueprint.teardown_request
+def finalizarPerfilado(error=None):
+    # En teardown para cerrar el perfil también si la petición falló
+    perfil = g.pop('perfil', None)
+    if perfil is not None:
+        perfil.finalizar(getattr(perfil, 'estado', None if error is None else 500))
+    
+    # Los hilos del servidor se reutilizan: el request ID no debe quedar en el contexto del hilo
+    token = g.pop('token_request_id', None)
+    if token is not None:
+        restablecerRequestId(token)
 
 @api_blueprint.route('/register', methods=['POST'])
 def register():
@@ -122,14 +200,6 @@ def analyze():
         if pdf_file.filename == '':
             return jsonify({'error': 'No se seleccionó archivo'}), 400
         
-        # Guardar archivo PDF
-        filename = secure_filename(pdf_file.filename)
-        upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        pdf_file.save(upload_path)
-        
-        # Extraer texto del PDF
-        texto_pdf = extraerTextoDePDF(upload_path)
-        
         # Obtener datos sociales si se proporcionaron
         datos_sociales = request.form.get('datos_sociales', '{}')
         try:
@@ -137,44 +207,239 @@ def analyze():
         except:
             datos_sociales = {}
         
+        # Empresa dueña del documento (para borrarlo por empresa desde el catálogo)
+        empresa_id = request.form.get('empresa_id') or datos_sociales.get('ruc')
+        
+        # Varios PDFs en el campo 'pdf': expediente de varios documentos y ejercicios
+        archivos = [archivo for archivo in request.files.getlist('pdf') if archivo.filename]
+        if len(archivos) > 1:
+            return analizarExpediente(archivos, datos_sociales, empresa_id)
+        
+        # Leer el PDF en memoria (o en un temporal propio si es grande)
+        filename = secure_filename(pdf_file.filename)
+        clave_scoring = claveScoring(datos_sociales)
+        with recibirPdf(pdf_file.stream) as pdf:
+            hash_pdf = pdf.hash
+            
+            # Solo con retención configurada se persiste, con el hash como nombre
+            if PDF_RETENER_SUBIDAS:
+                retenerPdf(pdf, current_app.config['UPLOAD_FOLDER'])
+            
+            artefacto = cargarArtefacto(hash_pdf)
+            # Mismo PDF, mismos datos y misma versión del pipeline: el scoring guardado se reutiliza
+            scoring_guardado = None
+            if artefacto and (artefacto.get('scoring') or {}).get('clave') == clave_scoring:
+                scoring_guardado = artefacto['scoring']['resultado']
+            
+            paginas = artefacto['paginas'] if artefacto else extraerPaginasDePDF(pdf.origen)
+        
+        texto_pdf = unirPaginas(paginas)
+        spans = artefacto['spans'] if artefacto else dividirTextoEnSpans(texto_pdf)
+        
         # Crear base de conocimiento
         base_conocimiento = crearBaseDeConocimiento()
         
         # Cargar documentos en la base de conocimiento
         documentos = [
-            {'contenido': texto_pdf, 'metadatos': {'tipo': 'estado_financiero', 'archivo': filename}},
+            {
+                'contenido': texto_pdf,
+                'chunks': [texto_pdf[inicio:fin] for inicio, fin in spans],
+                'metadatos': {'tipo': 'estado_financiero', 'archivo': filename, 'sha256': hash_pdf, 'empresa_id': empresa_id}
+            },
         ]
         
         if datos_sociales:
             documentos.append({
                 'contenido': json.dumps(datos_sociales),
-                'metadatos': {'tipo': 'datos_sociales', 'url': datos_sociales.get('url', '')}
+                'metadatos': {'tipo': 'datos_sociales', 'url': datos_sociales.get('url', ''), 'empresa_id': empresa_id}
             })
         
-        cargarDocumentosEnBaseDeConocimiento(base_conocimiento, documentos)
+        # También con el scoring guardado: el documento pudo borrarse, vencer o subirse para otra
+        # empresa; si ya está en la colección solo se renueva su retención
+        with medirEtapa('ingesta'):
+            cargarDocumentosEnBaseDeConocimiento(base_conocimiento, documentos)
+        documento_ids = [idDeDocumento(doc['contenido'], doc['metadatos']) for doc in documentos]
+        
+        if scoring_guardado is not None:
+            return jsonify({
+                **formatearResultadoAnalisis(scoring_guardado),
+                'sha256': hash_pdf,
+                'documentoIds': documento_ids,
+                'cache': 'resultado',
+                'consumo': obtenerConsumoPeticion()
+            }), 200
         
         # Generar scoring usando IA
-        scoring_data = generarScoring(texto_pdf, datos_sociales)
+        with medirEtapa('scoring'):
+            scoring_data = generarScoring(texto_pdf, datos_sociales)
+        
+        # Un scoring de respaldo (LLM caído) no se guarda para no servirlo desde el almacén
+        es_respaldo = scoring_data.get('scoring', {}).get('metodo') == 'respaldo'
+        guardarArtefacto(hash_pdf, paginas, spans, (1000, 200),
+                         None if es_respaldo else scoring_data, clave_scoring)
         
         return jsonify({
-            'secciones': {
-                'financiera': scoring_data.get('analisis_financiero', []),
-                'digital': scoring_data.get('analisis_digital', []),
-                'referencias': scoring_data.get('analisis_referencias', [])
-            },
-            'riesgos': scoring_data.get('riesgos', []),
-            'scoring': scoring_data.get('scoring', {'nivel': 'medio', 'umbral': 30000})
+            **formatearResultadoAnalisis(scoring_data),
+            'sha256': hash_pdf,
+            'documentoIds': documento_ids,
+            'cache': 'texto' if artefacto else 'ninguno',
+            'consumo': obtenerConsumoPeticion()
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def analizarExpediente(archivos, datos_sociales, empresa_id):
+    """
+    Analiza varios documentos de una empresa (balances, resultados y declaraciones de varios ejercicios).
+    
+    Los documentos se extraen e ingestan en paralelo, cada uno con su tipo y
+    ejercicio en los metadatos de sus chunks, y un solo scoring evalúa el
+    resumen compacto de las cifras por ejercicio. El campo opcional
+    'documentos' (JSON, en el orden de los PDFs) declara tipo y periodo de
+    cada archivo; lo no declarado se detecta.
+    """
+    from rag.multiDocument import procesarDocumentosEnParalelo, consolidarPeriodos, construirResumenMultiperiodo, partidasMasRecientes
+    
+    if len(archivos) > ANALISIS_MAX_DOCUMENTOS:
+        return jsonify({'error': f'Máximo {ANALISIS_MAX_DOCUMENTOS} documentos por análisis'}), 400
+    
+    try:
+        declarados = json.loads(request.form.get('documentos', '[]'))
+        if not isinstance(declarados, list):
+            declarados = []
+    except:
+        declarados = []
+    
+    with ExitStack() as pila:
+        entradas = []
+        for i, archivo in enumerate(archivos):
+            pdf = pila.enter_context(recibirPdf(archivo.stream))
+            if PDF_RETENER_SUBIDAS:
+                retenerPdf(pdf, current_app.config['UPLOAD_FOLDER'])
+            declarado = declarados[i] if i < len(declarados) and isinstance(declarados[i], dict) else {}
+            entradas.append({'pdf': pdf, 'archivo': secure_filename(archivo.filename),
+                             'tipo': declarado.get('tipo'), 'periodo': declarado.get('periodo')})
+        
+        base_conocimiento = crearBaseDeConocimiento()
+        with medirEtapa('ingesta'):
+            documentos = procesarDocumentosEnParalelo(entradas, empresa_id, base_conocimiento)
+    
+    validos = [d for d in documentos if 'error' not in d]
+    if not validos:
+        return jsonify({'error': 'No se pudo procesar ningún documento', 'documentos': documentos}), 422
+    
+    documento_ids = [d['documentoId'] for d in validos]
+    if datos_sociales:
+        social = {
+            'contenido': json.dumps(datos_sociales),
+            'metadatos': {'tipo': 'datos_sociales', 'url': datos_sociales.get('url', ''), 'empresa_id': empresa_id}
+        }
+        with medirEtapa('ingesta'):
+            cargarDocumentosEnBaseDeConocimiento(base_conocimiento, [social])
+        documento_ids.append(idDeDocumento(social['contenido'], social['metadatos']))
+    
+    # Un solo scoring sobre el resumen de todos los ejercicios; las reglas locales usan el último
+    periodos = consolidarPeriodos(validos)
+    resumen = construirResumenMultiperiodo(validos, periodos)
+    with medirEtapa('scoring'):
+        scoring_data = generarScoring(resumen, datos_sociales, partidas=partidasMasRecientes(periodos))
+    
+    return jsonify({
+        **formatearResultadoAnalisis(scoring_data),
+        'documentos': [{clave: valor for clave, valor in d.items() if clave != 'partidas'} for d in documentos],
+        'periodos': periodos,
+        'documentoIds': documento_ids,
+        'consumo': obtenerConsumoPeticion()
+    }), 200
+
+@api_blueprint.route('/analyze-batch', methods=['POST'])
+def analyze_batch():
+    try:
+        job_id = request.form.get('job_id') or str(uuid.uuid4())
+        job_id = secure_filename(job_id)
+        carpeta_lote = os.path.join(current_app.config['BATCH_FOLDER'], job_id)
+        ruta_zip = os.path.join(carpeta_lote, 'portafolio.zip')
+
+        # La reserva se toma antes de tocar la carpeta y dura lo que dure el lote
+        candado = reservarLote(carpeta_lote)
+        if candado is None:
+            return jsonify({'error': 'El lote ya está en proceso', 'job_id': job_id}), 409
+
+        lanzado = False
+        try:
+            # Un lote nuevo requiere el ZIP; uno existente se reanuda desde su checkpoint
+            if 'archivo' in request.files and request.files['archivo'].filename:
+                request.files['archivo'].save(ruta_zip)
+                # Un ZIP nuevo reemplaza los archivos extraídos del anterior
+                shutil.rmtree(os.path.join(carpeta_lote, 'archivos'), ignore_errors=True)
+            elif not os.path.exists(ruta_zip):
+                return jsonify({'error': 'Archivo ZIP del portafolio es requerido'}), 400
+
+            entradas = extraerArchivoComprimido(ruta_zip, os.path.join(carpeta_lote, 'archivos'))
+            if not entradas:
+                return jsonify({'error': 'El ZIP no contiene PDFs'}), 400
+
+            ingestar = request.form.get('ingestar', 'false').lower() == 'true'
+            ruta_salida = os.path.join(carpeta_lote, 'resultados.jsonl')
+            lote = {'estado': 'en_proceso', 'resumen': {'total': len(entradas)}, 'error': None}
+            lotes_db[job_id] = lote
+
+            def ejecutar():
+                try:
+                    lote['resumen'] = procesarLoteDeEmpresas(
+                        entradas,
+                        ruta_salida,
+                        ingestar=ingestar,
+                        progreso=lambda resumen: lote.update({'resumen': resumen})
+                    )
+                    lote['estado'] = 'completado'
+                except Exception as e:
+                    lote['estado'] = 'error'
+                    lote['error'] = str(e)
+                finally:
+                    candado.close()
+
+            # El hilo hereda una copia del contexto para conservar el request ID
+            threading.Thread(target=contextvars.copy_context().run, args=(ejecutar,), daemon=True).start()
+            lanzado = True
+        finally:
+            if not lanzado:
+                candado.close()
+
+        return jsonify({'job_id': job_id, 'estado': lote['estado'], 'total': len(entradas)}), 202
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_blueprint.route('/analyze-batch/<job_id>', methods=['GET'])
+def analyze_batch_status(job_id):
+    lote = lotes_db.get(secure_filename(job_id))
+    if not lote:
+        return jsonify({'error': 'Lote no encontrado'}), 404
+
+    return jsonify({'job_id': job_id, **lote}), 200
+
+@api_blueprint.route('/analyze-batch/<job_id>/results', methods=['GET'])
+def analyze_batch_results(job_id):
+    ruta_salida = os.path.join(current_app.config['BATCH_FOLDER'], secure_filename(job_id), 'resultados.jsonl')
+    if not os.path.exists(ruta_salida):
+        return jsonify({'error': 'Lote sin resultados'}), 404
+
+    def transmitir():
+        with open(ruta_salida, 'r', encoding='utf-8') as f:
+            for linea in f:
+                yield linea
+
+    return Response(transmitir(), mimetype='application/x-ndjson')
+
 @api_blueprint.route('/chat', methods=['POST'])
 def chat():
     try:
         data = request.get_json()
         chat_input = data.get('chatInput', '')
         session_id = data.get('sessionId', str(uuid.uuid4()))
+        asignarSesion(session_id)
         
         if not chat_input:
             return jsonify({'error': 'Mensaje es requerido'}), 400
@@ -190,20 +455,106 @@ def chat():
         
         return jsonify({
             'salida': respuesta,
-            'sessionId': session_id
+            'sessionId': session_id,
+            'consumo': obtenerConsumoPeticion(),
+            'contexto': sesion.estadisticas_contexto
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def simularEscenariosLocales(data):
+    """
+    Evalúa escenarios what-if con el motor vectorizado y narra los mejores con una sola llamada al LLM.
+    
+    Returns:
+        Tuple: (cuerpo de la respuesta, código HTTP); 422 si las cifras base no alcanzan para puntuar
+            y 400 si la grilla o la muestra pedidas no son válidas
+    """
+    from rag.scoringLocal import extraerPartidasFinancieras, calcularRatios, nivelDeRiesgo
+    from rag.simulationEngine import construirGrilla, muestrearMonteCarlo, simularEscenarios, MIN_RATIOS_SIMULACION
+    
+    partidas = data.get('partidas') or extraerPartidasFinancieras(data.get('texto_financiero', ''))
+    try:
+        ratios = calcularRatios(partidas)
+    except (AttributeError, TypeError, ValueError) as e:
+        return {'error': f'Partidas inválidas: {str(e)}'}, 400
+    if len(ratios) < MIN_RATIOS_SIMULACION:
+        return {
+            'error': f'Las cifras base permiten calcular {len(ratios)} ratios (mínimo {MIN_RATIOS_SIMULACION}); '
+                     'no se puede puntuar la situación actual',
+            'partidas': partidas
+        }, 422
+    
+    try:
+        if 'montecarlo' in data:
+            montecarlo = data['montecarlo']
+            variaciones = muestrearMonteCarlo(
+                montecarlo.get('factores', {}),
+                int(montecarlo.get('n', 1000)),
+                montecarlo.get('semilla')
+            )
+        else:
+            variaciones = construirGrilla(data.get('grilla', {'ventas': [0.05, 0.30, 6], 'pasivo': [-0.10, -0.40, 4]}))
+        
+        with medirEtapa('simulacion'):
+            resultado = simularEscenarios(
+                partidas,
+                variaciones,
+                margen_contribucion=float(data.get('margen_contribucion', 0.30))
+            )
+    except (TypeError, ValueError, IndexError) as e:
+        # Grilla vacía o mal formada, n fuera de rango, parámetros no numéricos
+        return {'error': str(e)}, 400
+    
+    mejor = resultado['mejores'][0]
+    recomendaciones = [
+        f"{factor}: {variacion * 100:+.0f}%" for factor, variacion in mejor['variaciones'].items() if variacion
+    ]
+    
+    if data.get('narrar', True):
+        try:
+            from rag.config import obtenerLlm
+            
+            llm = obtenerLlm(max_tokens=500)
+            prompt = f"""
+            Eres un analista de crédito de PYMEs. La puntuación actual es {resultado['puntuacion_base']}/100.
+            
+            Mejores escenarios simulados: {json.dumps(resultado['mejores'], ensure_ascii=False)}
+            Sensibilidad (puntos por +10% en cada factor): {json.dumps(resultado['sensibilidades'])}
+            
+            Explica en un párrafo breve qué acciones mejoran más el scoring y por qué.
+            """
+            with imputarConsumo('narracion_simulacion'):
+                resultado['narrativa'] = llm.invoke(prompt).content
+        except Exception as e:
+            logger.warning(f"Error al narrar la simulación: {str(e)}")
+    
+    # Campos del formato original de /simulate
+    resultado.update({
+        'scoring_mejorado': round(mejor['puntuacion']),
+        'nivel_riesgo': nivelDeRiesgo(mejor['puntuacion']),
+        'umbral_credito': mejor['umbral'],
+        'recomendaciones': recomendaciones
+    })
+    return resultado, 200
+
 @api_blueprint.route('/simulate', methods=['POST'])
 def simulate():
     try:
         data = request.get_json()
         escenario_datos = data.get('escenario_datos', {})
         
+        # Con cifras base se evalúa localmente la grilla o muestra de escenarios
+        if 'partidas' in data or 'texto_financiero' in data:
+            cuerpo, codigo = simularEscenariosLocales(data)
+            if codigo == 200:
+                cuerpo['consumo'] = obtenerConsumoPeticion()
+            return jsonify(cuerpo), codigo
+        
         # Simular escenarios de mejora con IA
         from rag.config import obtenerLlm
+        from rag.structuredOutput import invocarLlmJson, ESQUEMA_SIMULACION
         
         llm = obtenerLlm()
         
@@ -222,12 +573,9 @@ def simulate():
         - recomendaciones: lista de sugerencias
         """
         
-        respuesta = llm.invoke(prompt)
+        resultado = invocarLlmJson(llm, prompt, ESQUEMA_SIMULACION, 'simulacion')
         
-        try:
-            # Intentar parsear como JSON
-            resultado = json.loads(respuesta.content)
-        except:
+        if resultado is None:
             # Si no es JSON válido, crear respuesta estructurada
             resultado = {
                 'scoring_mejorado': 75,
@@ -240,7 +588,68 @@ def simulate():
                 ]
             }
         
-        return jsonify(resultado), 200
+        return jsonify({**resultado, 'consumo': obtenerConsumoPeticion()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_blueprint.route('/usage/<session_id>', methods=['GET'])
+def usage(session_id):
+    consumo = obtenerConsumoSesion(session_id)
+    if consumo is None:
+        return jsonify({'error': 'Sesión sin consumo registrado'}), 404
+    
+    return jsonify({'sessionId': session_id, **consumo}), 200
+
+@api_blueprint.route('/documents', methods=['GET'])
+def list_documents():
+    try:
+        empresa_id = request.args.get('empresa_id')
+        limite = int(request.args.get('limit', 100))
+        documentos = listarDocumentos("pyme_financial_docs", empresa_id=empresa_id, limite=limite)
+        
+        return jsonify({
+            'documentos': [
+                {clave: valor for clave, valor in documento.items() if clave != 'chunk_ids'}
+                for documento in documentos
+            ],
+            'coleccion': estadoColeccion("pyme_financial_docs")
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_blueprint.route('/documents/<documento_id>', methods=['DELETE'])
+def delete_document(documento_id):
+    try:
+        eliminados = eliminarDocumentos([documento_id])
+        if not eliminados['documentos']:
+            return jsonify({'error': 'Documento no encontrado'}), 404
+        
+        return jsonify({'success': True, **eliminados}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_blueprint.route('/companies/<empresa_id>/documents', methods=['DELETE'])
+def delete_company_documents(empresa_id):
+    try:
+        return jsonify({'success': True, **eliminarDocumentosDeEmpresa(empresa_id)}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_blueprint.route('/documents/compact', methods=['POST'])
+def compact_documents():
+    try:
+        data = request.get_json(silent=True) or {}
+        resumen = compactarBaseDeConocimiento(forzar=bool(data.get('forzar', False)))
+        
+        return jsonify({'success': True, 'compactacion': resumen}), 200
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@api_blueprint.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(exportarMetricasPrometheus(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,46 @@
+import os
+import sys
+import json
+import argparse
+from dotenv import load_dotenv
+
+# Agregar el directorio src al path para imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Cargar variables de entorno
+load_dotenv()
+
+from rag.config import BATCH_PROCESOS, BATCH_CONCURRENCIA_LLM, LOG_NIVEL, LOG_FORMATO
+from rag.logs import configurarLogs
+from rag.batchProcessor import leerManifiesto, extraerArchivoComprimido, procesarLoteDeEmpresas
+
+def main():
+    parser = argparse.ArgumentParser(description='Scoring por lotes de un portafolio de PYMEs')
+    origen = parser.add_mutually_exclusive_group(required=True)
+    origen.add_argument('--manifest', help='Manifiesto CSV/JSONL/JSON con columnas empresa_id, pdf, social_url')
+    origen.add_argument('--archivo', help='ZIP con los PDFs (y opcionalmente un manifest.csv)')
+    parser.add_argument('--salida', required=True, help='Archivo JSONL de resultados; se reanuda si ya existe')
+    parser.add_argument('--procesos', type=int, default=BATCH_PROCESOS, help='Procesos para extracción de PDFs')
+    parser.add_argument('--concurrencia-llm', type=int, default=BATCH_CONCURRENCIA_LLM, help='Llamadas simultáneas al LLM')
+    parser.add_argument('--ingestar', action='store_true', help='Cargar cada empresa en la base de conocimiento')
+    args = parser.parse_args()
+    configurarLogs(LOG_NIVEL, LOG_FORMATO)
+
+    if args.manifest:
+        entradas = leerManifiesto(args.manifest)
+    else:
+        # Extraer junto a la salida para que un reinicio reutilice los archivos
+        destino = os.path.splitext(os.path.abspath(args.salida))[0] + '_archivos'
+        entradas = extraerArchivoComprimido(args.archivo, destino)
+
+    resumen = procesarLoteDeEmpresas(
+        entradas,
+        args.salida,
+        procesos=args.procesos,
+        concurrencia_llm=args.concurrencia_llm,
+        ingestar=args.ingestar
+    )
+    print(json.dumps(resumen, indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
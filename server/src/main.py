@@ -1,6 +1,6 @@
 import os
 import sys
-from flask import Flask
+from flask import Flask, Request
 from flask_cors import CORS
 from dotenv import load_dotenv
 
@@ -12,9 +12,23 @@ load_dotenv()
 
 # Importar el blueprint de la API
 from api import api_blueprint
+from rag.config import LOG_NIVEL, LOG_FORMATO, PRECALENTAR_AL_INICIAR, VECTORES_MANTENIMIENTO_INTERVALO_S, BATCH_MAX_BYTES
+from rag.logs import configurarLogs
+
+# Límites de tamaño por endpoint que reemplazan a MAX_CONTENT_LENGTH
+LIMITES_POR_ENDPOINT = {'api.analyze_batch': BATCH_MAX_BYTES}
+
+class PeticionConLimites(Request):
+    """Petición cuyo límite de tamaño depende del endpoint (el ZIP de un portafolio supera los 16 MB)."""
+    
+    @property
+    def max_content_length(self):
+        return LIMITES_POR_ENDPOINT.get(self.endpoint, super().max_content_length)
 
 def create_app():
     app = Flask(__name__)
+    app.request_class = PeticionConLimites
+    configurarLogs(LOG_NIVEL, LOG_FORMATO)
     
     # Configurar CORS
     CORS(app, origins=["http://localhost:3000", "http://localhost:5173"])
@@ -22,16 +36,28 @@ def create_app():
     # Configurar la aplicación
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
     app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'uploads')
+    app.config['BATCH_FOLDER'] = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'batch')
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
     
     # Crear directorios necesarios
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['BATCH_FOLDER'], exist_ok=True)
     os.makedirs(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'chromadb'), exist_ok=True)
     os.makedirs(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'txt'), exist_ok=True)
     
     # Registrar blueprints
     app.register_blueprint(api_blueprint, url_prefix='/api')
     
+    # Las dependencias pesadas se cargan en el primer uso salvo que se pida precalentar
+    if PRECALENTAR_AL_INICIAR:
+        from rag.warmup import precalentar
+        precalentar()
+    
+    # Compactación de la base vectorial en segundo plano (y retención, si hay una política configurada)
+    if VECTORES_MANTENIMIENTO_INTERVALO_S > 0:
+        from rag.vectorStore import iniciarMantenimiento
+        iniciarMantenimiento(VECTORES_MANTENIMIENTO_INTERVALO_S)
+    
     @app.route('/')
     def health_check():
         return {'status': 'Backend PYME Credit AI funcionando correctamente'}
@@ -0,0 +1,34 @@
+import os
+import sys
+import json
+import argparse
+from dotenv import load_dotenv
+
+# Agregar el directorio src al path para imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Cargar variables de entorno
+load_dotenv()
+
+from rag.config import LOG_NIVEL, LOG_FORMATO
+from rag.logs import configurarLogs
+from rag.vectorStore import migrarEmbeddings
+
+def main():
+    parser = argparse.ArgumentParser(description='Migra la base de conocimiento a otra dimensión o modelo de embeddings sin detener el servicio')
+    parser.add_argument('--dimensiones', type=int, required=True, help='Dimensión de destino (p. ej. 512)')
+    parser.add_argument('--modo', choices=['truncar', 'reembeber'], default='truncar',
+                        help='truncar: acorta y renormaliza los vectores guardados; reembeber: vuelve a vectorizar los textos')
+    parser.add_argument('--modelo', help='Modelo de destino en modo reembeber (por defecto el de la colección)')
+    parser.add_argument('--coleccion', default='pyme_financial_docs')
+    args = parser.parse_args()
+    configurarLogs(LOG_NIVEL, LOG_FORMATO)
+
+    resumen = migrarEmbeddings(args.dimensiones, args.coleccion, modo=args.modo, modelo=args.modelo)
+    if resumen is None:
+        print(json.dumps({'error': 'La migración no se completó; revisa los logs'}, ensure_ascii=False))
+        sys.exit(1)
+    print(json.dumps(resumen, indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Any, Optional, Tuple
+from .config import CHAT_CACHE_SIMILITUD, CHAT_CACHE_MAX_ENTRADAS, CHAT_CACHE_TTL_S
+from .logs import obtenerLogger
+from .metrics import describirMetrica, observarHistograma, registrarCache
+
+# numpy se importa al guardar o buscar la primera respuesta
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = obtenerLogger('answerCache')
+
+describirMetrica('chat_cache_similitud', 'Similitud de la entrada más cercana del cache de respuestas en cada búsqueda')
+
+BUCKETS_SIMILITUD = (0.5, 0.7, 0.8, 0.85, 0.9, 0.93, 0.95, 0.97, 0.99, 1.0)
+
+class _Entrada:
+    def __init__(self, embedding: 'np.ndarray', contexto: Tuple[str, ...], consulta: str, respuesta: str):
+        self.embedding = embedding
+        self.contexto = contexto
+        self.consulta = consulta
+        self.respuesta = respuesta
+        self.creada = time.time()
+
+class CacheDeRespuestas:
+    """
+    Cache semántico de respuestas del chat, en memoria del proceso.
+
+    Las entradas se agrupan por alcance: la colección, su modelo de embeddings
+    y la huella de los documentos de las empresas que aparecen en el contexto
+    (ver huellaDeEmpresas). Ingestar o borrar un documento de esas empresas
+    cambia la huella, así que sus respuestas dejan de encontrarse sin
+    invalidación explícita, también entre procesos. Dentro del alcance, una
+    pregunta acierta si su embedding supera el umbral de similitud con el de
+    una entrada recuperada con los mismos chunks de contexto.
+    """
+
+    def __init__(self, similitud: float = CHAT_CACHE_SIMILITUD, max_entradas: int = CHAT_CACHE_MAX_ENTRADAS,
+                 ttl_s: float = CHAT_CACHE_TTL_S):
+        self.similitud = similitud
+        self.max_entradas = max_entradas
+        self.ttl_s = ttl_s
+        self._alcances: "OrderedDict[str, List[_Entrada]]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalizar(embedding: List[float]) -> 'np.ndarray':
+        import numpy as np
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        norma = np.linalg.norm(vector)
+        return vector / norma if norma else vector
+
+    def buscar(self, alcance: str, embedding: List[float], contexto: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Busca una respuesta para una pregunta similar con el mismo contexto.
+
+        Args:
+            alcance (str): Alcance de la pregunta (colección, modelo, documentos de las empresas e historial reciente)
+            embedding (List[float]): Embedding de la pregunta
+            contexto (List[str]): IDs de los chunks usados como contexto
+
+        Returns:
+            Optional[Dict]: {'respuesta', 'consulta', 'similitud'} o None si no hay acierto
+        """
+        consulta = self._normalizar(embedding)
+        contexto = tuple(sorted(contexto))
+        mejor, similitud_mejor = None, -1.0
+        with self._lock:
+            entradas = self._alcances.get(alcance)
+            if entradas:
+                ahora = time.time()
+                vigentes = [e for e in entradas if ahora - e.creada < self.ttl_s]
+                self._total -= len(entradas) - len(vigentes)
+                entradas[:] = vigentes
+                self._alcances.move_to_end(alcance)
+                for entrada in vigentes:
+                    if entrada.contexto != contexto or entrada.embedding.shape != consulta.shape:
+                        continue
+                    similitud = float(entrada.embedding @ consulta)
+                    if similitud > similitud_mejor:
+                        mejor, similitud_mejor = entrada, similitud
+
+        if mejor is not None:
+            observarHistograma('chat_cache_similitud', similitud_mejor, buckets=BUCKETS_SIMILITUD)
+        acierto = mejor is not None and similitud_mejor >= self.similitud
+        registrarCache('respuesta_chat', acierto)
+        if not acierto:
+            return None
+        return {'respuesta': mejor.respuesta, 'consulta': mejor.consulta, 'similitud': similitud_mejor}
+
+    def guardar(self, alcance: str, embedding: List[float], contexto: List[str], consulta: str, respuesta: str):
+        """Guarda la respuesta de una pregunta; descarta los alcances usados hace más tiempo si se llena."""
+        entrada = _Entrada(self._normalizar(embedding), tuple(sorted(contexto)), consulta, respuesta)
+        with self._lock:
+            self._alcances.setdefault(alcance, []).append(entrada)
+            self._alcances.move_to_end(alcance)
+            self._total += 1
+            while self._total > self.max_entradas and self._alcances:
+                alcance_antiguo, entradas = next(iter(self._alcances.items()))
+                entradas.pop(0)
+                self._total -= 1
+                if not entradas:
+                    del self._alcances[alcance_antiguo]
+
+    def limpiar(self):
+        """Vacía el cache."""
+        with self._lock:
+            self._alcances.clear()
+            self._total = 0
+
+    def tamano(self) -> int:
+        """Entradas guardadas."""
+        return self._total
+
+_cache = CacheDeRespuestas()
+
+def obtenerCacheRespuestas() -> CacheDeRespuestas:
+    """Cache de respuestas compartido por las sesiones del proceso."""
+    return _cache
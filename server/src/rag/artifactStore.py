@@ -0,0 +1,244 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+from .config import VERSION_PIPELINE, SCORING_MODO, DEFAULT_MODEL, ARTEFACTOS_MAX_BYTES, ARTEFACTOS_MAX_DIAS, OCR_HABILITADO
+from .logs import obtenerLogger
+from .metrics import describirMetrica, incrementarContador, registrarCache
+
+logger = obtenerLogger('artifactStore')
+
+describirMetrica('artefactos_evictados_total', 'Artefactos eliminados por edad o por tamaño total del almacén')
+
+# Almacén de artefactos por hash de PDF (server/data/txt)
+ARTEFACTOS_PATH = os.getenv('ARTEFACTOS_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'txt'))
+
+# La depuración recorre la carpeta; se ejecuta como máximo una vez por intervalo
+INTERVALO_DEPURACION_S = 60
+
+_lock_depuracion = threading.Lock()
+_ultima_depuracion = 0.0
+
+def _rutaArtefacto(hash_pdf: str, extension: str = '.json.gz') -> str:
+    """Ruta del artefacto, repartida en subcarpetas por los dos primeros caracteres del hash."""
+    return os.path.join(ARTEFACTOS_PATH, hash_pdf[:2], f"{hash_pdf}{extension}")
+
+def _escribirAtomico(ruta: str, contenido: str):
+    """Escribe un archivo gzip en un temporal y lo renombra, para no dejar archivos a medias."""
+    ruta_parcial = f"{ruta}.{os.getpid()}.{threading.get_ident()}.parcial"
+    try:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with gzip.open(ruta_parcial, 'wt', encoding='utf-8', compresslevel=6) as f:
+            f.write(contenido)
+        os.replace(ruta_parcial, ruta)
+    except Exception:
+        try:
+            os.remove(ruta_parcial)
+        except OSError:
+            pass
+        raise
+
+def _ocrActivo() -> bool:
+    """Indica si la extracción de este proceso aplica OCR (habilitado y con Tesseract instalado)."""
+    if not OCR_HABILITADO:
+        return False
+    from .ocr import ocrDisponible  # ocr importa este módulo
+    return ocrDisponible()
+
+def claveScoring(datos_sociales: Dict[str, Any]) -> str:
+    """
+    Clave del resultado de scoring: depende de los datos sociales y de la
+    configuración que cambia el resultado (modo de scoring y modelo).
+
+    Args:
+        datos_sociales (Dict): Datos sociales enviados con el PDF
+
+    Returns:
+        str: Hash corto de la combinación
+    """
+    base = json.dumps([datos_sociales, SCORING_MODO, DEFAULT_MODEL], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(base.encode('utf-8')).hexdigest()[:16]
+
+def cargarArtefacto(hash_pdf: str) -> Optional[Dict[str, Any]]:
+    """
+    Recupera el artefacto de un PDF si existe y corresponde a VERSION_PIPELINE.
+
+    Un artefacto extraído sin OCR no se reutiliza cuando el OCR ya está
+    disponible: sus páginas escaneadas (y el scoring calculado con ellas)
+    quedaron vacías.
+
+    Args:
+        hash_pdf (str): SHA-256 del PDF
+
+    Returns:
+        Optional[Dict]: 'paginas', 'spans', 'parametros_chunk' y, si existe, 'scoring'
+    """
+    ruta = _rutaArtefacto(hash_pdf)
+    try:
+        with gzip.open(ruta, 'rt', encoding='utf-8') as f:
+            artefacto = json.load(f)
+    except FileNotFoundError:
+        registrarCache('artefacto', False)
+        return None
+    except Exception as e:
+        logger.warning(f"Artefacto ilegible, se ignora: {str(e)}", extra={'campos': {'sha256': hash_pdf}})
+        registrarCache('artefacto', False)
+        return None
+
+    if artefacto.get('version') != VERSION_PIPELINE or (not artefacto.get('ocr') and _ocrActivo()):
+        registrarCache('artefacto', False)
+        return None
+
+    # La edad para la depuración cuenta desde el último uso
+    try:
+        os.utime(ruta)
+    except OSError:
+        pass
+
+    registrarCache('artefacto', True)
+    return artefacto
+
+def guardarArtefacto(hash_pdf: str, paginas: List[str], spans: List[Tuple[int, int]], parametros_chunk: Tuple[int, int],
+                     scoring: Optional[Dict[str, Any]] = None, clave_scoring: Optional[str] = None) -> bool:
+    """
+    Guarda (o reemplaza) el artefacto de un PDF en JSON comprimido con gzip.
+
+    La escritura es atómica, así que dos análisis simultáneos del mismo PDF
+    no dejan un archivo a medias.
+
+    Args:
+        hash_pdf (str): SHA-256 del PDF
+        paginas (List[str]): Texto sin limpiar de cada página
+        spans (List[Tuple[int, int]]): Límites de los chunks en el texto limpio
+        parametros_chunk (Tuple[int, int]): Tamaño de chunk y solapamiento usados
+        scoring (Dict): Último resultado de scoring, si existe
+        clave_scoring (str): claveScoring() de ese resultado
+
+    Returns:
+        bool: True si se guardó
+    """
+    artefacto = {
+        'version': VERSION_PIPELINE,
+        'sha256': hash_pdf,
+        'creado': time.time(),
+        'ocr': _ocrActivo(),
+        'paginas': paginas,
+        'spans': [list(span) for span in spans],
+        'parametros_chunk': list(parametros_chunk),
+        'scoring': {'clave': clave_scoring, 'resultado': scoring} if scoring is not None else None
+    }
+
+    try:
+        _escribirAtomico(_rutaArtefacto(hash_pdf), json.dumps(artefacto, ensure_ascii=False, separators=(',', ':')))
+    except Exception as e:
+        logger.error(f"Error al guardar artefacto: {str(e)}", extra={'campos': {'sha256': hash_pdf}})
+        return False
+
+    depurarArtefactos()
+    return True
+
+def cargarTextoOcr(hash_pagina: str) -> Optional[str]:
+    """
+    Recupera el texto OCR de una página ya procesada.
+
+    Args:
+        hash_pagina (str): Hash del contenido de la página, DPI e idioma
+
+    Returns:
+        Optional[str]: Texto reconocido, o None si la página no está en la cache
+    """
+    ruta = _rutaArtefacto(hash_pagina, '.ocr.gz')
+    try:
+        with gzip.open(ruta, 'rt', encoding='utf-8') as f:
+            texto = f.read()
+    except FileNotFoundError:
+        registrarCache('ocr', False)
+        return None
+    except Exception as e:
+        logger.warning(f"Texto OCR ilegible, se ignora: {str(e)}", extra={'campos': {'hash_pagina': hash_pagina}})
+        registrarCache('ocr', False)
+        return None
+
+    try:
+        os.utime(ruta)
+    except OSError:
+        pass
+
+    registrarCache('ocr', True)
+    return texto
+
+def guardarTextoOcr(hash_pagina: str, texto: str) -> bool:
+    """
+    Guarda el texto OCR de una página; comparte límites de tamaño y edad con los artefactos.
+
+    Args:
+        hash_pagina (str): Hash del contenido de la página, DPI e idioma
+        texto (str): Texto reconocido
+
+    Returns:
+        bool: True si se guardó
+    """
+    try:
+        _escribirAtomico(_rutaArtefacto(hash_pagina, '.ocr.gz'), texto)
+    except Exception as e:
+        logger.error(f"Error al guardar texto OCR: {str(e)}", extra={'campos': {'hash_pagina': hash_pagina}})
+        return False
+
+    depurarArtefactos()
+    return True
+
+def depurarArtefactos(max_bytes: int = ARTEFACTOS_MAX_BYTES, max_dias: float = ARTEFACTOS_MAX_DIAS, forzar: bool = False) -> int:
+    """
+    Elimina artefactos (y textos OCR) sin uso desde hace más de max_dias y, si el almacén
+    supera max_bytes, los menos usados recientemente hasta quedar por debajo.
+
+    Args:
+        max_bytes (int): Tamaño total máximo del almacén
+        max_dias (float): Edad máxima desde el último uso
+        forzar (bool): Ignorar el intervalo mínimo entre depuraciones
+
+    Returns:
+        int: Número de artefactos eliminados
+    """
+    global _ultima_depuracion
+
+    with _lock_depuracion:
+        ahora = time.time()
+        if not forzar and ahora - _ultima_depuracion < INTERVALO_DEPURACION_S:
+            return 0
+        _ultima_depuracion = ahora
+
+        archivos = []
+        for carpeta, _, nombres in os.walk(ARTEFACTOS_PATH):
+            for nombre in nombres:
+                if not nombre.endswith('.gz'):
+                    continue
+                ruta = os.path.join(carpeta, nombre)
+                try:
+                    estado = os.stat(ruta)
+                except OSError:
+                    continue
+                archivos.append((estado.st_mtime, estado.st_size, ruta))
+
+        archivos.sort()
+        total = sum(tamano for _, tamano, _ in archivos)
+        limite_edad = ahora - max_dias * 86400
+        eliminados = 0
+
+        for mtime, tamano, ruta in archivos:
+            if mtime >= limite_edad and total <= max_bytes:
+                break
+            try:
+                os.remove(ruta)
+            except OSError:
+                continue
+            total -= tamano
+            eliminados += 1
+
+    if eliminados:
+        incrementarContador('artefactos_evictados_total', eliminados)
+        logger.info("Artefactos depurados", extra={'campos': {'eliminados': eliminados, 'bytes_restantes': total}})
+    return eliminados
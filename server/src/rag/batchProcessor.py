@@ -0,0 +1,365 @@
+import os
+import csv
+import json
+import time
+import zipfile
+import posixpath
+import threading
+import contextvars
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Optional, Callable, Set
+from werkzeug.utils import secure_filename
+from .config import BATCH_PROCESOS, BATCH_CONCURRENCIA_LLM, contextoDeProcesos, inicializarProcesoHijo
+from .pdfProcessor import extraerTextoDePDF
+from .utils import scrapingRedSocial, generarScoring, formatearResultadoAnalisis
+from .llmScheduler import prioridadLlm
+from .logs import obtenerLogger
+from .metrics import ejecutarConMetricas, resultadoConMetricas
+
+logger = obtenerLogger('batchProcessor')
+
+# Límite global de llamadas concurrentes al LLM, compartido por todos los lotes del proceso
+_semaforo_llm = threading.BoundedSemaphore(BATCH_CONCURRENCIA_LLM)
+
+NOMBRES_MANIFIESTO = ('manifest.csv', 'manifest.jsonl', 'manifest.json')
+
+def leerManifiesto(ruta_manifiesto: str) -> List[Dict[str, Any]]:
+    """
+    Lee un manifiesto de empresas (CSV, JSONL o JSON).
+
+    Cada entrada debe tener 'pdf' y opcionalmente 'empresa_id' y 'social_url'.
+    Las rutas relativas se resuelven respecto a la carpeta del manifiesto.
+
+    Args:
+        ruta_manifiesto (str): Ruta al archivo de manifiesto
+
+    Returns:
+        List[Dict]: Entradas normalizadas con 'empresa_id', 'pdf' y 'social_url'
+    """
+    base = os.path.dirname(os.path.abspath(ruta_manifiesto))
+    extension = os.path.splitext(ruta_manifiesto)[1].lower()
+
+    with open(ruta_manifiesto, 'r', encoding='utf-8') as f:
+        if extension == '.csv':
+            filas = list(csv.DictReader(f))
+        elif extension == '.jsonl':
+            filas = [json.loads(linea) for linea in f if linea.strip()]
+        else:
+            filas = json.load(f)
+
+    entradas = []
+    for fila in filas:
+        pdf = (fila.get('pdf') or '').strip()
+        if not pdf:
+            continue
+
+        ruta_pdf = pdf if os.path.isabs(pdf) else os.path.join(base, pdf)
+        # Sin empresa_id se usa la ruta relativa: 'a/estados.pdf' y 'b/estados.pdf' son empresas distintas
+        referencia = os.path.basename(pdf) if os.path.isabs(pdf) else posixpath.normpath(pdf.replace('\\', '/'))
+        entradas.append({
+            'empresa_id': (fila.get('empresa_id') or '').strip() or os.path.splitext(referencia)[0],
+            'pdf': ruta_pdf,
+            'social_url': (fila.get('social_url') or '').strip()
+        })
+
+    return entradas
+
+def _rutaSegura(nombre: str) -> str:
+    """Ruta relativa de una entrada del ZIP con cada componente saneado ('..' y vacíos se descartan)."""
+    partes = [secure_filename(parte) for parte in nombre.replace('\\', '/').split('/')]
+    return '/'.join(parte for parte in partes if parte)
+
+def extraerArchivoComprimido(ruta_zip: str, destino: str) -> List[Dict[str, Any]]:
+    """
+    Extrae un ZIP de estados financieros y construye las entradas del lote.
+
+    Cada archivo se extrae en su ruta relativa saneada, así dos 'estados.pdf'
+    de carpetas distintas no chocan; los archivos existentes se sobrescriben
+    (un ZIP nuevo con el mismo job_id reemplaza al anterior).
+
+    Si el ZIP contiene un manifiesto (manifest.csv/.jsonl/.json) se usa; si no,
+    cada PDF se trata como una empresa identificada por su ruta sin extensión.
+
+    Args:
+        ruta_zip (str): Ruta al archivo ZIP
+        destino (str): Carpeta donde extraer el contenido
+
+    Returns:
+        List[Dict]: Entradas del lote
+    """
+    os.makedirs(destino, exist_ok=True)
+    manifiesto = None
+    extraidos = {}
+    usadas = set()
+
+    with zipfile.ZipFile(ruta_zip) as archivo:
+        for indice, info in enumerate(archivo.infolist()):
+            if info.is_dir():
+                continue
+
+            relativa = _rutaSegura(info.filename)
+            if not relativa:
+                continue
+            if relativa in usadas:
+                # Dos entradas que quedan iguales al sanearse: se distinguen por su posición
+                carpeta, nombre = posixpath.split(relativa)
+                relativa = posixpath.join(carpeta, f"{indice}_{nombre}")
+            usadas.add(relativa)
+
+            ruta_destino = os.path.join(destino, *relativa.split('/'))
+            os.makedirs(os.path.dirname(ruta_destino), exist_ok=True)
+            with archivo.open(info) as origen, open(ruta_destino, 'wb') as salida:
+                while True:
+                    bloque = origen.read(1024 * 1024)
+                    if not bloque:
+                        break
+                    salida.write(bloque)
+            extraidos[posixpath.normpath(info.filename.replace('\\', '/'))] = relativa
+
+            # El manifiesto menos anidado es el del portafolio
+            es_manifiesto = posixpath.basename(relativa).lower() in NOMBRES_MANIFIESTO
+            if es_manifiesto and (manifiesto is None or relativa.count('/') < manifiesto[1].count('/')):
+                manifiesto = (posixpath.normpath(info.filename.replace('\\', '/')), relativa)
+
+    if manifiesto:
+        original, relativa = manifiesto
+        ruta_manifiesto = os.path.join(destino, *relativa.split('/'))
+        entradas = leerManifiesto(ruta_manifiesto)
+        # Las rutas del manifiesto son relativas a él dentro del ZIP; se apuntan a lo extraído
+        for entrada in entradas:
+            referencia = os.path.relpath(entrada['pdf'], os.path.dirname(ruta_manifiesto)).replace(os.sep, '/')
+            en_zip = posixpath.normpath(posixpath.join(posixpath.dirname(original), referencia))
+            # Una ruta fuera del ZIP no se lee: queda una ruta inexistente que el lote registra como error
+            entrada['pdf'] = os.path.join(destino, *extraidos.get(en_zip, _rutaSegura(en_zip) or 'ausente.pdf').split('/'))
+        return entradas
+
+    return [
+        {'empresa_id': os.path.splitext(relativa)[0], 'pdf': os.path.join(destino, *relativa.split('/')), 'social_url': ''}
+        for relativa in sorted(extraidos.values()) if relativa.lower().endswith('.pdf')
+    ]
+
+def reservarLote(carpeta_lote: str):
+    """
+    Reserva exclusiva de la carpeta de un lote, entre procesos e hilos.
+
+    Un segundo envío con el mismo job_id (concurrente o en otro worker) no
+    debe reemplazar el ZIP ni los archivos de un lote en curso, ni agregar
+    líneas al mismo JSONL.
+
+    Args:
+        carpeta_lote (str): Carpeta del lote
+
+    Returns:
+        Archivo abierto que mantiene la reserva hasta cerrarse, o None si otro la tiene
+    """
+    import fcntl
+
+    os.makedirs(carpeta_lote, exist_ok=True)
+    candado = open(os.path.join(carpeta_lote, 'lote.lock'), 'a')
+    try:
+        fcntl.flock(candado, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        candado.close()
+        return None
+    return candado
+
+def cargarCheckpoint(ruta_salida: str) -> Set[str]:
+    """
+    Lee el JSONL de resultados y retorna las empresas ya procesadas con éxito.
+
+    Si la última línea quedó truncada por una caída, se recorta el archivo
+    para que las nuevas líneas se agreguen sobre un JSONL válido.
+
+    Args:
+        ruta_salida (str): Ruta al archivo JSONL de resultados
+
+    Returns:
+        Set[str]: IDs de empresas completadas
+    """
+    completadas = set()
+    if not os.path.exists(ruta_salida):
+        return completadas
+
+    with open(ruta_salida, 'rb+') as f:
+        contenido = f.read()
+        if contenido and not contenido.endswith(b'\n'):
+            ultimo_salto = contenido.rfind(b'\n')
+            f.truncate(ultimo_salto + 1)
+            contenido = contenido[:ultimo_salto + 1]
+
+    for linea in contenido.decode('utf-8').splitlines():
+        try:
+            registro = json.loads(linea)
+        except json.JSONDecodeError:
+            continue
+
+        if registro.get('estado') == 'ok':
+            completadas.add(registro.get('empresa_id'))
+        else:
+            completadas.discard(registro.get('empresa_id'))
+
+    return completadas
+
+def _puntuarEmpresa(entrada: Dict[str, Any], texto_pdf: str, coleccion=None) -> Dict[str, Any]:
+    """Obtiene datos sociales, ingesta opcionalmente y genera el scoring de una empresa."""
+    datos_sociales = scrapingRedSocial(entrada['social_url']) if entrada.get('social_url') else {}
+
+    with _semaforo_llm, prioridadLlm('lote'):
+        if coleccion is not None:
+            from .vectorStore import cargarDocumentosEnBaseDeConocimiento
+            documentos = [{
+                'contenido': texto_pdf,
+                'metadatos': {'tipo': 'estado_financiero', 'archivo': os.path.basename(entrada['pdf']), 'empresa_id': entrada['empresa_id']}
+            }]
+            if datos_sociales:
+                documentos.append({
+                    'contenido': json.dumps(datos_sociales),
+                    'metadatos': {'tipo': 'datos_sociales', 'url': datos_sociales.get('url', ''), 'empresa_id': entrada['empresa_id']}
+                })
+            cargarDocumentosEnBaseDeConocimiento(coleccion, documentos)
+
+        scoring_data = generarScoring(texto_pdf, datos_sociales)
+
+    return formatearResultadoAnalisis(scoring_data)
+
+def procesarLoteDeEmpresas(
+    entradas: List[Dict[str, Any]],
+    ruta_salida: str,
+    procesos: int = BATCH_PROCESOS,
+    concurrencia_llm: int = BATCH_CONCURRENCIA_LLM,
+    ingestar: bool = False,
+    progreso: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Procesa un portafolio de empresas y escribe los resultados como JSONL.
+
+    La extracción de texto se reparte en un pool de procesos y el scoring con
+    IA corre en un pool de hilos limitado por el semáforo global del LLM. Cada
+    resultado se agrega al JSONL apenas termina, de modo que el archivo sirve
+    como checkpoint: al relanzar el lote se omiten las empresas completadas.
+    Un scoring de respaldo (el LLM falló) se registra como error, así que
+    la empresa se reintenta al relanzar.
+
+    Args:
+        entradas (List[Dict]): Empresas con 'empresa_id', 'pdf' y 'social_url'
+        ruta_salida (str): Archivo JSONL de resultados (y checkpoint)
+        procesos (int): Procesos para extracción de PDFs
+        concurrencia_llm (int): Empresas puntuándose en paralelo en este lote
+        ingestar (bool): Si True, carga cada empresa en la base de conocimiento
+        progreso (Callable): Función opcional que recibe el resumen parcial
+
+    Returns:
+        Dict[str, Any]: Resumen del lote
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(ruta_salida)), exist_ok=True)
+    completadas = cargarCheckpoint(ruta_salida)
+    pendientes = [e for e in entradas if e['empresa_id'] not in completadas]
+
+    resumen = {
+        'total': len(entradas),
+        'omitidas': len(entradas) - len(pendientes),
+        'procesadas': 0,
+        'errores': 0,
+        'inicio': datetime.now().isoformat()
+    }
+    logger.info("Lote iniciado", extra={'campos': {'total': resumen['total'], 'omitidas': resumen['omitidas'], 'pendientes': len(pendientes)}})
+
+    if not pendientes:
+        resumen['fin'] = datetime.now().isoformat()
+        return resumen
+
+    coleccion = None
+    if ingestar:
+        from .vectorStore import crearBaseDeConocimiento
+        coleccion = crearBaseDeConocimiento()
+
+    # Ventanas acotadas para no acumular miles de textos en memoria
+    ventana_extraccion = max(procesos * 2, 1)
+    ventana_scoring = max(concurrencia_llm * 2, 1)
+
+    cola = iter(pendientes)
+    extracciones = {}
+    scorings = {}
+    inicio = time.time()
+    cola_agotada = False
+
+    # Los workers devuelven sus métricas (etapas, OCR) para exponerlas en /metrics
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=contextoDeProcesos(),
+                             initializer=inicializarProcesoHijo) as pool_procesos, \
+         ThreadPoolExecutor(max_workers=concurrencia_llm) as pool_hilos, \
+         open(ruta_salida, 'a', encoding='utf-8') as salida:
+
+        def escribir(entrada: Dict[str, Any], resultado: Optional[Dict[str, Any]], error: Optional[str], t0: float):
+            registro = {
+                'empresa_id': entrada['empresa_id'],
+                'archivo': os.path.basename(entrada['pdf']),
+                'estado': 'ok' if error is None else 'error',
+                'resultado': resultado,
+                'error': error,
+                'duracion_s': round(time.time() - t0, 3),
+                'timestamp': datetime.now().isoformat()
+            }
+            salida.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            salida.flush()
+
+            if error is None:
+                resumen['procesadas'] += 1
+            else:
+                resumen['errores'] += 1
+
+            hechas = resumen['procesadas'] + resumen['errores']
+            if hechas % 50 == 0 or hechas == len(pendientes):
+                velocidad = hechas / max(time.time() - inicio, 1e-6)
+                logger.info("Progreso del lote", extra={'campos': {'hechas': hechas, 'pendientes': len(pendientes), 'empresas_por_s': round(velocidad, 2)}})
+                if progreso:
+                    progreso(dict(resumen))
+
+        while True:
+            # Alimentar extracciones mientras haya espacio aguas abajo
+            while not cola_agotada and len(extracciones) < ventana_extraccion and len(scorings) < ventana_scoring:
+                entrada = next(cola, None)
+                if entrada is None:
+                    cola_agotada = True
+                    break
+                futuro = pool_procesos.submit(ejecutarConMetricas, extraerTextoDePDF, entrada['pdf'])
+                extracciones[futuro] = (entrada, time.time())
+
+            if not extracciones and not scorings:
+                break
+
+            hechos, _ = wait(list(extracciones) + list(scorings), return_when=FIRST_COMPLETED)
+
+            for futuro in hechos:
+                if futuro in extracciones:
+                    entrada, t0 = extracciones.pop(futuro)
+                    try:
+                        texto_pdf = resultadoConMetricas(futuro)
+                    except Exception as e:
+                        escribir(entrada, None, f"Error de extracción: {str(e)}", t0)
+                        continue
+
+                    if not texto_pdf:
+                        escribir(entrada, None, "El PDF no contiene texto extraíble", t0)
+                        continue
+
+                    # Copia del contexto para conservar el request ID del lote en el hilo
+                    scorings[pool_hilos.submit(contextvars.copy_context().run, _puntuarEmpresa, entrada, texto_pdf, coleccion)] = (entrada, t0)
+                else:
+                    entrada, t0 = scorings.pop(futuro)
+                    try:
+                        resultado = futuro.result()
+                    except Exception as e:
+                        escribir(entrada, None, f"Error de scoring: {str(e)}", t0)
+                        continue
+
+                    if resultado.get('scoring', {}).get('metodo') == 'respaldo':
+                        # El LLM falló: se conserva el puntaje de respaldo, pero la empresa queda pendiente
+                        escribir(entrada, resultado, "El LLM no respondió; scoring de respaldo", t0)
+                    else:
+                        escribir(entrada, resultado, None, t0)
+
+    resumen['fin'] = datetime.now().isoformat()
+    resumen['duracion_s'] = round(time.time() - inicio, 3)
+    logger.info("Lote finalizado", extra={'campos': {'procesadas': resumen['procesadas'], 'errores': resumen['errores'], 'duracion_s': resumen['duracion_s']}})
+    return resumen
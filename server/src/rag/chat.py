@@ -1,7 +1,44 @@
 import json
-from typing import Dict, List, Any
-from .config import obtenerLlm
-from .vectorStore import obtenerBaseDeConocimiento, buscarEnBaseDeConocimiento
+import hashlib
+from typing import TYPE_CHECKING, Dict, List, Any, Optional, Tuple
+from .config import obtenerLlm, RELEVANCIA_MINIMA, CHAT_CACHE_HABILITADO, RERANK_HABILITADO, RERANK_CANDIDATOS
+from .vectorStore import (
+    obtenerBaseDeConocimiento, buscarEnBaseDeConocimiento, embeberConsulta, coleccionVigente, nombreLogico, modeloDeColeccion
+)
+from .documentCatalog import huellaDeEmpresas
+from .answerCache import obtenerCacheRespuestas
+from .reranker import rerankearContexto
+from .logs import obtenerLogger
+from .metrics import medirEtapa
+from .tokenUsage import presupuestoAgotado, imputarConsumo
+
+# langchain_core se importa en el primer turno de chat
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+
+logger = obtenerLogger('chat')
+
+# Mensaje de sistema del chat. Es idéntico byte a byte en todos los turnos y sesiones
+# y va primero, así el proveedor puede servir ese prefijo desde su prompt cache
+PROMPT_SISTEMA = """Eres un asistente financiero especializado en evaluación de riesgos de PYMEs (Pequeñas y Medianas Empresas).
+
+Tu rol es:
+- Analizar datos financieros y no tradicionales de empresas
+- Evaluar riesgos crediticios de forma objetiva
+- Proporcionar insights sobre capacidad de pago
+- Explicar scoring y factores de riesgo de manera clara
+- Responder de forma profesional pero amigable
+- Usar emojis ocasionales para hacer las respuestas más accesibles
+
+Siempre base tus respuestas en los datos proporcionados y mantén un enfoque analítico y objetivo.
+
+Instrucciones específicas:
+1. Responde basándote principalmente en el contexto de documentos financieros proporcionado
+2. Si no tienes información suficiente, indícalo claramente
+3. Para análisis financieros, menciona específicamente qué datos usas
+4. Incluye recomendaciones prácticas cuando sea apropiado
+5. Mantén un tono profesional pero accesible
+6. Usa formato Markdown para mejorar la legibilidad"""
 
 class SesionDeChat:
     """Clase para manejar sesiones de chat con contexto."""
@@ -10,19 +47,9 @@ class SesionDeChat:
         self.historial = []
         self.coleccion = obtenerBaseDeConocimiento(nombre_coleccion)
         self.llm = obtenerLlm()
-        self.personalidad = """
-        Eres un asistente financiero especializado en evaluación de riesgos de PYMEs (Pequeñas y Medianas Empresas).
-        
-        Tu rol es:
-        - Analizar datos financieros y no tradicionales de empresas
-        - Evaluar riesgos crediticios de forma objetiva
-        - Proporcionar insights sobre capacidad de pago
-        - Explicar scoring y factores de riesgo de manera clara
-        - Responder de forma profesional pero amigable
-        - Usar emojis ocasionales para hacer las respuestas más accesibles
-        
-        Siempre base tus respuestas en los datos proporcionados y mantén un enfoque analítico y objetivo.
-        """
+        self.prompt_sistema = PROMPT_SISTEMA
+        # Candidatos, pasajes, tokens y latencia del reranking del último turno
+        self.estadisticas_contexto: Optional[Dict[str, Any]] = None
     
     def agregar_mensaje(self, rol: str, contenido: str):
         """Agrega un mensaje al historial."""
@@ -32,84 +59,144 @@ class SesionDeChat:
             'timestamp': str(len(self.historial))
         })
     
+    def _formatear_contexto(self, documentos: List[Dict[str, Any]]) -> str:
+        """Arma el bloque de contexto con los documentos relevantes."""
+        if not documentos:
+            return "No hay documentos disponibles en la base de conocimiento."
+        
+        contexto = "Información relevante de los documentos:\n\n"
+        
+        for i, doc in enumerate(documentos, 1):
+            relevancia = doc.get('relevancia', 0)
+            if relevancia >= RELEVANCIA_MINIMA:  # Solo incluir documentos relevantes (similitud coseno)
+                contexto += f"Documento {i} (Relevancia: {relevancia:.2f}):\n"
+                contexto += f"{doc['contenido']}\n\n"
+        
+        return contexto
+    
+    def _buscar_documentos(self, consulta: str, n_resultados: int = 3, embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """
+        Recupera los pasajes del contexto.
+        
+        Con el reranking activo se recuperan RERANK_CANDIDATOS chunks, se
+        reordenan en CPU y se conservan n_resultados recortados a sus
+        oraciones relevantes; si no, los n_resultados más similares completos.
+        """
+        with medirEtapa('recuperacion'):
+            if not RERANK_HABILITADO:
+                return buscarEnBaseDeConocimiento(self.coleccion, consulta, n_resultados, embedding_consulta=embedding)
+            candidatos = buscarEnBaseDeConocimiento(self.coleccion, consulta, max(RERANK_CANDIDATOS, n_resultados),
+                                                    embedding_consulta=embedding)
+        with medirEtapa('rerank'):
+            documentos, self.estadisticas_contexto = rerankearContexto(consulta, candidatos, max_pasajes=n_resultados)
+        logger.info("Contexto rerankeado", extra={'campos': self.estadisticas_contexto})
+        return documentos
+    
     def obtener_contexto_relevante(self, consulta: str, n_resultados: int = 3) -> str:
         """Obtiene contexto relevante de la base de conocimiento."""
         try:
-            documentos = buscarEnBaseDeConocimiento(self.coleccion, consulta, n_resultados)
-            
-            if not documentos:
-                return "No hay documentos disponibles en la base de conocimiento."
-            
-            contexto = "Información relevante de los documentos:\n\n"
-            
-            for i, doc in enumerate(documentos, 1):
-                relevancia = doc.get('relevancia', 0)
-                if relevancia > 0.7:  # Solo incluir documentos muy relevantes
-                    contexto += f"Documento {i} (Relevancia: {relevancia:.2f}):\n"
-                    contexto += f"{doc['contenido']}\n\n"
-            
-            return contexto
+            documentos = self._buscar_documentos(consulta, n_resultados)
+            return self._formatear_contexto(documentos)
             
         except Exception as e:
-            print(f"Error al obtener contexto: {str(e)}")
+            logger.error(f"Error al obtener contexto: {str(e)}")
             return "Error al acceder a la base de conocimiento."
     
+    def _recuperar_con_cache(self, consulta: str, n_resultados: int = 3) -> Tuple[str, Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Recupera el contexto y consulta el cache semántico de respuestas.
+        
+        Returns:
+            Tuple: (contexto, respuesta en cache o None, datos para guardar la respuesta o None)
+        """
+        try:
+            self.coleccion = coleccionVigente(self.coleccion)
+            embedding = embeberConsulta(self.coleccion, consulta)
+            documentos = self._buscar_documentos(consulta, n_resultados, embedding)
+        except Exception as e:
+            logger.error(f"Error al obtener contexto: {str(e)}")
+            return "Error al acceder a la base de conocimiento.", None, None
+        
+        contexto = self._formatear_contexto(documentos)
+        relevantes = [doc for doc in documentos if doc.get('relevancia', 0) >= RELEVANCIA_MINIMA]
+        if not relevantes:
+            # Sin contexto la respuesta no depende de documentos que permitan invalidarla
+            return contexto, None, None
+        
+        try:
+            # Alcance: colección, modelo de embeddings, documentos de las empresas del contexto y los
+            # turnos previos que recibe el LLM (un "¿y el año anterior?" depende de la conversación)
+            empresas = [doc['metadatos'].get('empresa_id') for doc in relevantes]
+            nombre = nombreLogico(self.coleccion)
+            alcance = f"{nombre}|{modeloDeColeccion(self.coleccion)}|{len(embedding)}|{huellaDeEmpresas(nombre, empresas)}|{self._huella_historial()}"
+            clave = {'alcance': alcance, 'embedding': embedding, 'contexto': [doc['id'] for doc in relevantes]}
+            acierto = obtenerCacheRespuestas().buscar(**clave)
+        except Exception as e:
+            logger.warning(f"Error al consultar el cache de respuestas: {str(e)}")
+            return contexto, None, None
+        
+        if acierto:
+            logger.info("Respuesta servida desde el cache", extra={'campos': {'similitud': round(acierto['similitud'], 4)}})
+            return contexto, acierto['respuesta'], None
+        return contexto, None, clave
+    
     def generar_respuesta(self, consulta_usuario: str) -> str:
         """Genera una respuesta usando LLM con contexto RAG."""
         try:
-            # Obtener contexto relevante
-            contexto = self.obtener_contexto_relevante(consulta_usuario)
-            
-            # Crear prompt con contexto y personalidad
-            prompt = f"""
-            {self.personalidad}
-            
-            Contexto de documentos financieros:
-            {contexto}
-            
-            Historial de conversación reciente:
-            {self._obtener_historial_reciente()}
-            
-            Consulta del usuario: {consulta_usuario}
+            from langchain_core.messages import HumanMessage, SystemMessage
             
-            Instrucciones específicas:
-            1. Responde basándote principalmente en el contexto proporcionado
-            2. Si no tienes información suficiente, indícalo claramente
-            3. Para análisis financieros, menciona específicamente qué datos usas
-            4. Incluye recomendaciones prácticas cuando sea apropiado
-            5. Mantén un tono profesional pero accesible
-            6. Usa formato Markdown para mejorar la legibilidad
+            self.estadisticas_contexto = None
+            # Obtener contexto relevante; una pregunta equivalente sobre el mismo contexto se responde desde el cache
+            if CHAT_CACHE_HABILITADO:
+                contexto, respuesta_cache, clave_cache = self._recuperar_con_cache(consulta_usuario)
+                if respuesta_cache is not None:
+                    self.agregar_mensaje('usuario', consulta_usuario)
+                    self.agregar_mensaje('asistente', respuesta_cache)
+                    return respuesta_cache
+            else:
+                contexto, clave_cache = self.obtener_contexto_relevante(consulta_usuario), None
             
-            Respuesta:
-            """
+            # Mensajes: sistema fijo (prefijo estable), contexto recuperado, turnos previos y la consulta
+            mensajes = [
+                SystemMessage(content=self.prompt_sistema),
+                SystemMessage(content=f"Contexto de documentos financieros:\n{contexto}"),
+                *self._obtener_historial_reciente(),
+                HumanMessage(content=consulta_usuario)
+            ]
             
             # Generar respuesta con LLM
-            respuesta = self.llm.invoke(prompt)
+            # Con el presupuesto de la sesión agotado, obtenerLlm entrega el modelo económico
+            llm = obtenerLlm() if presupuestoAgotado() else self.llm
+            with medirEtapa('llm', operacion='chat'), imputarConsumo('chat'):
+                respuesta = llm.invoke(mensajes)
             
             # Agregar intercambio al historial
             self.agregar_mensaje('usuario', consulta_usuario)
             self.agregar_mensaje('asistente', respuesta.content)
             
+            if clave_cache is not None:
+                obtenerCacheRespuestas().guardar(**clave_cache, consulta=consulta_usuario, respuesta=respuesta.content)
+            
             return respuesta.content
             
         except Exception as e:
             error_msg = f"Error al generar respuesta: {str(e)}"
-            print(error_msg)
+            logger.error(error_msg)
             return "Lo siento, ocurrió un error al procesar tu consulta. Por favor, intenta nuevamente."
     
-    def _obtener_historial_reciente(self, ultimos_n: int = 4) -> str:
-        """Obtiene el historial reciente de la conversación."""
-        if not self.historial:
-            return "No hay historial previo."
-        
-        historial_reciente = self.historial[-ultimos_n:]
-        historial_texto = ""
-        
-        for mensaje in historial_reciente:
-            rol = "Usuario" if mensaje['rol'] == 'usuario' else "Asistente"
-            historial_texto += f"{rol}: {mensaje['contenido']}\n\n"
+    def _huella_historial(self, ultimos_n: int = 4) -> str:
+        """Hash de los turnos que _obtener_historial_reciente envía al LLM (igual para toda conversación nueva)."""
+        turnos = [[mensaje['rol'], mensaje['contenido']] for mensaje in self.historial[-ultimos_n:]]
+        return hashlib.sha256(json.dumps(turnos, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+    
+    def _obtener_historial_reciente(self, ultimos_n: int = 4) -> List['BaseMessage']:
+        """Obtiene el historial reciente de la conversación como mensajes de usuario y asistente."""
+        from langchain_core.messages import AIMessage, HumanMessage
         
-        return historial_texto
+        return [
+            HumanMessage(content=mensaje['contenido']) if mensaje['rol'] == 'usuario' else AIMessage(content=mensaje['contenido'])
+            for mensaje in self.historial[-ultimos_n:]
+        ]
 
 def crearSesionDeChat(nombre_coleccion: str = "pyme_financial_docs") -> SesionDeChat:
     """
@@ -123,11 +210,11 @@ def crearSesionDeChat(nombre_coleccion: str = "pyme_financial_docs") -> SesionDe
     """
     try:
         sesion = SesionDeChat(nombre_coleccion)
-        print("Sesión de chat creada exitosamente")
+        logger.info("Sesión de chat creada exitosamente")
         return sesion
         
     except Exception as e:
-        print(f"Error al crear sesión de chat: {str(e)}")
+        logger.error(f"Error al crear sesión de chat: {str(e)}")
         raise e
 
 def enviarMensajeAlChat(sesion: SesionDeChat, mensaje: str) -> str:
@@ -150,7 +237,7 @@ def enviarMensajeAlChat(sesion: SesionDeChat, mensaje: str) -> str:
         
     except Exception as e:
         error_msg = f"Error al enviar mensaje: {str(e)}"
-        print(error_msg)
+        logger.error(error_msg)
         return "Error al procesar el mensaje. Por favor, intenta nuevamente."
 
 def obtenerHistorialChat(sesion: SesionDeChat) -> List[Dict[str, Any]]:
@@ -177,9 +264,9 @@ def limpiarHistorialChat(sesion: SesionDeChat) -> bool:
     """
     try:
         sesion.historial.clear()
-        print("Historial de chat limpiado")
+        logger.info("Historial de chat limpiado")
         return True
         
     except Exception as e:
-        print(f"Error al limpiar historial: {str(e)}")
+        logger.error(f"Error al limpiar historial: {str(e)}")
         return False
\ No newline at end of file
@@ -1,34 +1,198 @@
 import os
+import json
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain.llms.base import LLM
+
+from .logs import obtenerLogger, configurarLogs
+from .metrics import incrementarContador
+
+# langchain_openai se importa al crear el primer cliente, no al importar la configuración
+if TYPE_CHECKING:
+    import multiprocessing.context
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+logger = obtenerLogger('config')
 
 # Cargar variables de entorno
 load_dotenv()
 
+# Backend de modelos: 'openai' o 'fake' (modelos determinísticos locales para benchmarks)
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'openai')
+FAKE_LLM_LATENCIA_MS = float(os.getenv('FAKE_LLM_LATENCIA_MS', '0'))
+FAKE_EMBEDDING_LATENCIA_MS = float(os.getenv('FAKE_EMBEDDING_LATENCIA_MS', '0'))
+
 # Configuración de OpenAI
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY no está configurada en las variables de entorno")
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')  # p. ej. el mock local de benchmarks/mock_openai.py
 
 # Configuración del modelo
-DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_MODEL = os.getenv('LLM_MODELO', "gpt-4o-mini")
 DEFAULT_TEMPERATURE = 0.3
 DEFAULT_MAX_TOKENS = 2000
 
-# Configuración de embeddings
-EMBEDDING_MODEL = "text-embedding-3-small"
-EMBEDDING_DIMENSIONS = 1536
+# Configuración de embeddings. Las colecciones nuevas registran modelo y dimensiones en sus
+# metadatos; los modelos text-embedding-3 admiten vectores acortados (p. ej. 512)
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODELO', "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONES', '1536'))
+
+# Índice vectorial (HNSW de ChromaDB). El espacio y los parámetros HNSW se fijan al crear
+# la colección: para cambiarlos en una colección existente hay que recrearla
+CHROMA_ESPACIO = os.getenv('CHROMA_ESPACIO', 'cosine')  # 'cosine', 'l2' o 'ip'
+CHROMA_HNSW_M = int(os.getenv('CHROMA_HNSW_M', '16'))
+CHROMA_HNSW_EF_CONSTRUCCION = int(os.getenv('CHROMA_HNSW_EF_CONSTRUCCION', '100'))
+CHROMA_HNSW_EF_BUSQUEDA = int(os.getenv('CHROMA_HNSW_EF_BUSQUEDA', '50'))
+
+# Backend de las colecciones nuevas: 'chroma' (HNSW) o 'numpy' (matriz mapeada en memoria con
+# búsqueda exacta, para colecciones de pocos miles de chunks). En numpy, 'int8' es el más rápido
+# (NumPy convierte float16 a float32 sin aceleración en la mayoría de CPUs); 'float16' es más preciso
+VECTORES_BACKEND = os.getenv('VECTORES_BACKEND', 'chroma')
+VECTORES_NUMPY_TIPO = os.getenv('VECTORES_NUMPY_TIPO', 'int8')
+
+# Retención en la base vectorial, en días por tipo de documento ('*' para el resto; 0 = sin vencimiento).
+# Por defecto no vence nada: la purga se activa solo al configurar una política, p. ej. {"*": 180}
+VECTORES_RETENCION_DIAS = {}
+VECTORES_RETENCION_DIAS.update(json.loads(os.getenv('VECTORES_RETENCION_JSON', '{}')))
+VECTORES_RETENCION_ACTIVA = any(float(dias) > 0 for dias in VECTORES_RETENCION_DIAS.values())
+
+# Compactación: la colección se reconstruye cuando los chunks eliminados superan esta fracción;
+# el mantenimiento corre en segundo plano cada intervalo (0 = desactivado) y compacta, y además
+# aplica la retención si hay una política configurada
+VECTORES_COMPACTACION_UMBRAL = float(os.getenv('VECTORES_COMPACTACION_UMBRAL', '0.2'))
+VECTORES_MANTENIMIENTO_INTERVALO_S = float(os.getenv('VECTORES_MANTENIMIENTO_INTERVALO_S', '3600'))
+
+# Similitud coseno mínima (0 a 1) para incluir un chunk en el contexto del chat
+RELEVANCIA_MINIMA = float(os.getenv('RELEVANCIA_MINIMA', '0.3'))
+
+# Reranking del contexto del chat: se recuperan RERANK_CANDIDATOS chunks, se reordenan en CPU
+# (BM25 y cercanía de los términos de la consulta, combinados con la similitud del embedding según
+# RERANK_PESO_DENSO, o un cross-encoder de sentence-transformers si se indica RERANK_MODELO) y de
+# cada pasaje elegido se conservan hasta RERANK_ORACIONES oraciones, dentro de RERANK_MAX_TOKENS
+RERANK_HABILITADO = os.getenv('RERANK_HABILITADO', 'true').lower() == 'true'
+RERANK_CANDIDATOS = int(os.getenv('RERANK_CANDIDATOS', '12'))
+RERANK_PESO_DENSO = float(os.getenv('RERANK_PESO_DENSO', '0.5'))
+RERANK_CORTE_RELATIVO = float(os.getenv('RERANK_CORTE_RELATIVO', '0.6'))
+RERANK_ORACIONES = int(os.getenv('RERANK_ORACIONES', '4'))
+RERANK_MAX_TOKENS = int(os.getenv('RERANK_MAX_TOKENS', '600'))
+RERANK_MODELO = os.getenv('RERANK_MODELO', '')
+
+# Cache semántico de respuestas del chat: una pregunta con similitud coseno mayor o igual al umbral
+# sobre el mismo contexto y los mismos documentos de las empresas se responde sin llamar al LLM
+CHAT_CACHE_HABILITADO = os.getenv('CHAT_CACHE_HABILITADO', 'true').lower() == 'true'
+CHAT_CACHE_SIMILITUD = float(os.getenv('CHAT_CACHE_SIMILITUD', '0.95'))
+CHAT_CACHE_MAX_ENTRADAS = int(os.getenv('CHAT_CACHE_MAX_ENTRADAS', '2000'))
+CHAT_CACHE_TTL_S = float(os.getenv('CHAT_CACHE_TTL_S', str(24 * 3600)))
+
+# Precios en USD por millón de tokens (entrada/salida y entrada servida desde el prompt cache
+# del proveedor; sin 'entrada_cacheada' se cobra como entrada); LLM_PRECIOS_JSON los sobrescribe
+LLM_PRECIOS = {
+    'gpt-4o-mini': {'entrada': 0.15, 'entrada_cacheada': 0.075, 'salida': 0.60},
+    'gpt-4o': {'entrada': 2.50, 'entrada_cacheada': 1.25, 'salida': 10.00},
+    'gpt-3.5-turbo': {'entrada': 0.50, 'salida': 1.50},
+    'text-embedding-3-small': {'entrada': 0.02, 'salida': 0.0},
+    'text-embedding-3-large': {'entrada': 0.13, 'salida': 0.0},
+    'text-embedding-ada-002': {'entrada': 0.10, 'salida': 0.0},
+}
+LLM_PRECIOS.update(json.loads(os.getenv('LLM_PRECIOS_JSON', '{}')))
+
+# Presupuesto por sesión (0 = sin límite); al agotarse se usa el modelo económico
+LLM_PRESUPUESTO_SESION_USD = float(os.getenv('LLM_PRESUPUESTO_SESION_USD', '0'))
+LLM_MODELO_ECONOMICO = os.getenv('LLM_MODELO_ECONOMICO', 'gpt-4o-mini')
+LLM_MAX_TOKENS_ECONOMICO = int(os.getenv('LLM_MAX_TOKENS_ECONOMICO', '500'))
+
+# Salida estructurada: 'json_schema' (esquema estricto), 'json_object' o 'ninguna'
+LLM_SALIDA_ESTRUCTURADA = os.getenv('LLM_SALIDA_ESTRUCTURADA', 'json_schema')
+LLM_MAX_REPARACIONES_JSON = int(os.getenv('LLM_MAX_REPARACIONES_JSON', '1'))
+
+# Modo de scoring: 'hibrido' (reglas locales, LLM solo en casos ambiguos), 'local' (sin LLM) o 'llm'
+SCORING_MODO = os.getenv('SCORING_MODO', 'hibrido')
+
+# Documentos largos: por encima del umbral se resumen con map-reduce antes del scoring
+DOC_LARGO_UMBRAL = int(os.getenv('DOC_LARGO_UMBRAL', '2000'))
+DOC_LARGO_TAMANO_SECCION = int(os.getenv('DOC_LARGO_TAMANO_SECCION', '4000'))
+DOC_LARGO_CONCURRENCIA = int(os.getenv('DOC_LARGO_CONCURRENCIA', '4'))
+DOC_LARGO_MAX_RESUMEN = int(os.getenv('DOC_LARGO_MAX_RESUMEN', '2000'))
+
+# Expedientes de varios documentos en /analyze (balances, estados de resultados y declaraciones
+# de varios ejercicios): máximo de PDFs por petición y cuántos se extraen e ingestan en paralelo
+ANALISIS_MAX_DOCUMENTOS = int(os.getenv('ANALISIS_MAX_DOCUMENTOS', '12'))
+ANALISIS_CONCURRENCIA_DOCUMENTOS = int(os.getenv('ANALISIS_CONCURRENCIA_DOCUMENTOS', '4'))
+
+# Logging estructurado: nivel y formato ('json' o 'texto')
+LOG_NIVEL = os.getenv('LOG_NIVEL', 'INFO')
+LOG_FORMATO = os.getenv('LOG_FORMATO', 'json')
+
+# PDFs subidos: por encima del umbral se procesan desde un temporal en vez de memoria;
+# con retención activada se guardan en data/uploads con su SHA-256 como nombre
+PDF_UMBRAL_MEMORIA_BYTES = int(os.getenv('PDF_UMBRAL_MEMORIA_BYTES', str(8 * 1024 * 1024)))
+PDF_RETENER_SUBIDAS = os.getenv('PDF_RETENER_SUBIDAS', 'false').lower() == 'true'
+
+# OCR de páginas escaneadas (sin capa de texto); requiere pytesseract y el binario de Tesseract
+OCR_HABILITADO = os.getenv('OCR_HABILITADO', 'true').lower() == 'true'
+OCR_IDIOMA = os.getenv('OCR_IDIOMA', 'spa')
+OCR_MIN_CARACTERES = int(os.getenv('OCR_MIN_CARACTERES', '25'))
+OCR_DPI_MIN = int(os.getenv('OCR_DPI_MIN', '150'))
+OCR_DPI_MAX = int(os.getenv('OCR_DPI_MAX', '300'))
+OCR_MAX_PIXELES = int(os.getenv('OCR_MAX_PIXELES', '4000'))
+OCR_PROCESOS = int(os.getenv('OCR_PROCESOS', str(min(4, os.cpu_count() or 2))))
+
+# Versión del pipeline de extracción/chunking/scoring: al cambiarla se invalidan los artefactos guardados
+VERSION_PIPELINE = os.getenv('VERSION_PIPELINE', '2')
+
+# Almacén de artefactos por hash de PDF: límite de tamaño total y edad desde el último uso
+ARTEFACTOS_MAX_BYTES = int(os.getenv('ARTEFACTOS_MAX_BYTES', str(512 * 1024 * 1024)))
+ARTEFACTOS_MAX_DIAS = float(os.getenv('ARTEFACTOS_MAX_DIAS', '30'))
+
+# Configuración de procesamiento por lotes
+BATCH_PROCESOS = int(os.getenv('BATCH_PROCESOS', str(os.cpu_count() or 2)))
+BATCH_CONCURRENCIA_LLM = int(os.getenv('BATCH_CONCURRENCIA_LLM', '8'))
+# Tamaño máximo del ZIP de /analyze-batch (el resto de la API conserva el límite de 16 MB)
+BATCH_MAX_BYTES = int(os.getenv('BATCH_MAX_BYTES', str(4 * 1024 * 1024 * 1024)))
+
+# Gateway de llamadas a OpenAI: límites del tier de la cuenta (0 = sin límite local),
+# coalescencia de solicitudes idénticas y reintentos de 429/5xx con backoff
+LLM_GATEWAY_RPM = float(os.getenv('LLM_GATEWAY_RPM', '500'))
+LLM_GATEWAY_TPM = float(os.getenv('LLM_GATEWAY_TPM', '200000'))
+LLM_GATEWAY_COALESCER = os.getenv('LLM_GATEWAY_COALESCER', 'true').lower() == 'true'
+LLM_REINTENTOS = int(os.getenv('LLM_REINTENTOS', '4'))
+LLM_BACKOFF_BASE_S = float(os.getenv('LLM_BACKOFF_BASE_S', '0.5'))
+LLM_BACKOFF_MAX_S = float(os.getenv('LLM_BACKOFF_MAX_S', '20'))
+
+# Planificador de llamadas al LLM: prioridad estricta entre clases (interactivo > analisis > lote),
+# reparto justo por tenant dentro de cada clase y concurrencia máxima total y por clase
+LLM_CONCURRENCIA_TOTAL = int(os.getenv('LLM_CONCURRENCIA_TOTAL', '16'))
+LLM_CONCURRENCIA_POR_CLASE = {'interactivo': 16, 'analisis': 8, 'lote': 6}
+LLM_CONCURRENCIA_POR_CLASE.update(json.loads(os.getenv('LLM_CONCURRENCIA_POR_CLASE_JSON', '{}')))
+# Peso de cada tenant en el reparto ('*' = resto)
+LLM_PESOS_TENANT = {'*': 1.0}
+LLM_PESOS_TENANT.update(json.loads(os.getenv('LLM_PESOS_TENANT_JSON', '{}')))
+
+# Perfilado por petición (desactivado por defecto): con la cabecera X-Perfilar igual a PERFILADO_TOKEN
+# o en una fracción PERFILADO_MUESTREO de las peticiones se guardan pilas muestreadas y memoria pico
+PERFILADO_TOKEN = os.getenv('PERFILADO_TOKEN', '')
+PERFILADO_MUESTREO = float(os.getenv('PERFILADO_MUESTREO', '0'))
+PERFILADO_INTERVALO_MS = float(os.getenv('PERFILADO_INTERVALO_MS', '5'))
+PERFILADO_MEMORIA = os.getenv('PERFILADO_MEMORIA', 'true').lower() == 'true'
+PERFILADO_DIR = os.getenv('PERFILADO_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'perfiles'))
+
+# Precarga de dependencias y clientes al crear la app (antes de recibir tráfico)
+PRECALENTAR_AL_INICIAR = os.getenv('PRECALENTAR_AL_INICIAR', 'false').lower() == 'true'
+
+def _verificarApiKey():
+    """Lanza ValueError si el backend real no tiene API key configurada."""
+    if LLM_BACKEND == 'openai' and not OPENAI_API_KEY:
+        raise ValueError("OPENAI_API_KEY no está configurada en las variables de entorno")
 
 def obtenerLlm(
     modelo: str = DEFAULT_MODEL,
     temperatura: float = DEFAULT_TEMPERATURE,
     max_tokens: int = DEFAULT_MAX_TOKENS
-) -> ChatOpenAI:
+) -> 'ChatOpenAI':
     """
     Crea y configura una instancia del modelo de lenguaje OpenAI.
     
+    Si la sesión del contexto agotó su presupuesto (LLM_PRESUPUESTO_SESION_USD)
+    se usa LLM_MODELO_ECONOMICO con max_tokens acotado.
+    
     Args:
         modelo (str): Nombre del modelo a usar
         temperatura (float): Temperatura para la generación (0.0-2.0)
@@ -38,43 +202,77 @@ def obtenerLlm(
         ChatOpenAI: Instancia configurada del modelo
     """
     try:
+        from .tokenUsage import presupuestoAgotado
+        if presupuestoAgotado():
+            incrementarContador('llm_presupuesto_degradaciones_total', modelo=modelo)
+            modelo = LLM_MODELO_ECONOMICO
+            max_tokens = min(max_tokens, LLM_MAX_TOKENS_ECONOMICO)
+        
+        from .llmCallbacks import InstrumentacionLlm
+        
+        if LLM_BACKEND == 'fake':
+            from .fakeBackends import ChatFalso
+            return ChatFalso(modelo=modelo, latencia_ms=FAKE_LLM_LATENCIA_MS, max_tokens=max_tokens,
+                             callbacks=[InstrumentacionLlm(modelo)])
+        
+        _verificarApiKey()
+        from langchain_openai import ChatOpenAI
+        from .llmGateway import obtenerClienteHttp
+        
         llm = ChatOpenAI(
             model=modelo,
             temperature=temperatura,
             max_tokens=max_tokens,
             openai_api_key=OPENAI_API_KEY,
-            streaming=False
+            openai_api_base=OPENAI_BASE_URL,
+            streaming=False,
+            # Los reintentos los hace el gateway, que además coalesce y limita la tasa
+            max_retries=0,
+            http_client=obtenerClienteHttp(),
+            callbacks=[InstrumentacionLlm(modelo)]
         )
         
-        print(f"LLM configurado: {modelo} (temp: {temperatura}, max_tokens: {max_tokens})")
+        logger.debug("LLM configurado", extra={'campos': {'modelo': modelo, 'temperatura': temperatura, 'max_tokens': max_tokens}})
         return llm
         
     except Exception as e:
-        print(f"Error al configurar LLM: {str(e)}")
+        logger.error(f"Error al configurar LLM: {str(e)}")
         raise e
 
-def obtenerLlmEmbedding(modelo: str = EMBEDDING_MODEL) -> OpenAIEmbeddings:
+def obtenerLlmEmbedding(modelo: str = EMBEDDING_MODEL, dimensiones: int = EMBEDDING_DIMENSIONS) -> 'OpenAIEmbeddings':
     """
     Crea y configura una instancia para generar embeddings.
     
     Args:
         modelo (str): Modelo de embeddings a usar
+        dimensiones (int): Dimensión de los vectores (solo los modelos text-embedding-3 la acortan)
         
     Returns:
         OpenAIEmbeddings: Instancia configurada para embeddings
     """
     try:
+        if LLM_BACKEND == 'fake':
+            from .fakeBackends import EmbeddingsFalsos
+            return EmbeddingsFalsos(dimensiones=dimensiones, latencia_ms=FAKE_EMBEDDING_LATENCIA_MS)
+        
+        _verificarApiKey()
+        from langchain_openai import OpenAIEmbeddings
+        from .llmGateway import obtenerClienteHttp
+        
         embeddings = OpenAIEmbeddings(
             model=modelo,
             openai_api_key=OPENAI_API_KEY,
-            dimensions=EMBEDDING_DIMENSIONS
+            openai_api_base=OPENAI_BASE_URL,
+            dimensions=dimensiones if modelo.startswith('text-embedding-3') else None,
+            max_retries=0,
+            http_client=obtenerClienteHttp()
         )
         
-        print(f"Embeddings configurados: {modelo}")
+        logger.debug("Embeddings configurados", extra={'campos': {'modelo': modelo, 'dimensiones': dimensiones}})
         return embeddings
         
     except Exception as e:
-        print(f"Error al configurar embeddings: {str(e)}")
+        logger.error(f"Error al configurar embeddings: {str(e)}")
         raise e
 
 def validarConfiguracion() -> bool:
@@ -90,14 +288,14 @@ def validarConfiguracion() -> bool:
         respuesta = llm.invoke("Di 'configuración correcta'")
         
         if respuesta and respuesta.content:
-            print("✅ Configuración de OpenAI validada correctamente")
+            logger.info("Configuración de OpenAI validada correctamente")
             return True
         else:
-            print("❌ Error en la respuesta de OpenAI")
+            logger.error("Error en la respuesta de OpenAI")
             return False
             
     except Exception as e:
-        print(f"❌ Error al validar configuración: {str(e)}")
+        logger.error(f"Error al validar configuración: {str(e)}")
         return False
 
 def obtenerModelosDisponibles() -> dict:
@@ -129,15 +327,24 @@ def obtenerModelosDisponibles() -> dict:
         }
     }
 
-# Configuración de logging
-import logging
+def contextoDeProcesos() -> 'multiprocessing.context.BaseContext':
+    """
+    Contexto de multiprocessing para los pools de procesos (lotes, OCR).
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+    El proceso de la API tiene hilos (Flask, mantenimiento, lotes) y un fork
+    copiaría locks tomados por otros hilos; se usa forkserver (o spawn donde
+    no existe), cuyos hijos parten de un intérprete limpio.
 
-logger = logging.getLogger(__name__)
+    Returns:
+        BaseContext: Contexto para el parámetro mp_context del pool
+    """
+    import multiprocessing
+    metodo = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(metodo)
+
+def inicializarProcesoHijo():
+    """Configura los logs en un worker de un pool de procesos (no hereda la configuración del padre)."""
+    configurarLogs(LOG_NIVEL, LOG_FORMATO)
 
 def configurarLogging(nivel: str = 'INFO'):
     """
@@ -146,9 +353,5 @@ def configurarLogging(nivel: str = 'INFO'):
     Args:
         nivel (str): Nivel de logging (DEBUG, INFO, WARNING, ERROR)
     """
-    numeric_level = getattr(logging, nivel.upper(), None)
-    if not isinstance(numeric_level, int):
-        raise ValueError(f'Nivel de logging inválido: {nivel}')
-    
-    logger.setLevel(numeric_level)
-    print(f"Logging configurado en nivel: {nivel}")
\ No newline at end of file
+    configurarLogs(nivel, LOG_FORMATO)
+    logger.info(f"Logging configurado en nivel: {nivel}")
@@ -0,0 +1,322 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional
+from .logs import obtenerLogger
+
+logger = obtenerLogger('documentCatalog')
+
+# Catálogo de documentos de la base vectorial; por defecto junto a los datos de ChromaDB
+CATALOGO_PATH = os.getenv('CATALOGO_PATH', os.path.join(
+    os.getenv('CHROMA_DB_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'chromadb')),
+    'catalogo.sqlite3'
+))
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS documentos (
+    coleccion TEXT NOT NULL,
+    documento_id TEXT NOT NULL,
+    empresa_id TEXT,
+    tipo TEXT,
+    archivo TEXT,
+    chunk_ids TEXT NOT NULL,
+    ingestado_en REAL NOT NULL,
+    expira_en REAL,
+    PRIMARY KEY (coleccion, documento_id)
+);
+CREATE INDEX IF NOT EXISTS idx_documentos_empresa ON documentos (coleccion, empresa_id);
+CREATE INDEX IF NOT EXISTS idx_documentos_expira ON documentos (coleccion, expira_en);
+CREATE TABLE IF NOT EXISTS colecciones (
+    nombre TEXT PRIMARY KEY,
+    fisica TEXT NOT NULL,
+    generacion INTEGER NOT NULL DEFAULT 0,
+    chunks_eliminados INTEGER NOT NULL DEFAULT 0,
+    compactada_en REAL,
+    compactando_hasta REAL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    coleccion TEXT PRIMARY KEY,
+    snapshot_id TEXT NOT NULL,
+    hasta REAL NOT NULL,
+    importado_en REAL NOT NULL
+);
+"""
+
+_local = threading.local()
+
+def _conexion() -> sqlite3.Connection:
+    """Conexión SQLite del hilo actual (las conexiones no se comparten entre hilos ni procesos)."""
+    clave = (os.getpid(), CATALOGO_PATH)
+    if getattr(_local, 'clave', None) != clave:
+        os.makedirs(os.path.dirname(CATALOGO_PATH), exist_ok=True)
+        conexion = sqlite3.connect(CATALOGO_PATH, timeout=30, isolation_level=None)
+        conexion.row_factory = sqlite3.Row
+        conexion.execute('PRAGMA journal_mode=WAL')
+        conexion.executescript(_ESQUEMA)
+        _local.conexion = conexion
+        _local.clave = clave
+    return _local.conexion
+
+def _filaADocumento(fila: sqlite3.Row) -> Dict[str, Any]:
+    documento = dict(fila)
+    documento['chunk_ids'] = json.loads(documento['chunk_ids'])
+    documento['chunks'] = len(documento['chunk_ids'])
+    return documento
+
+def registrarDocumento(coleccion: str, documento_id: str, chunk_ids: List[str], empresa_id: Optional[str] = None,
+                       tipo: Optional[str] = None, archivo: Optional[str] = None, ttl_dias: float = 0) -> Dict[str, Any]:
+    """
+    Registra (o renueva) un documento ingestado y sus chunks.
+
+    Args:
+        coleccion (str): Nombre lógico de la colección
+        documento_id (str): ID estable del documento
+        chunk_ids (List[str]): IDs de sus chunks en ChromaDB
+        empresa_id (str): Empresa a la que pertenece, si se conoce
+        tipo (str): Tipo de documento ('estado_financiero', 'datos_sociales', ...)
+        archivo (str): Nombre del archivo de origen
+        ttl_dias (float): Días de retención desde esta ingesta (0 = sin vencimiento)
+
+    Returns:
+        Dict[str, Any]: Entrada del catálogo
+    """
+    ahora = time.time()
+    expira_en = ahora + ttl_dias * 86400 if ttl_dias else None
+    _conexion().execute(
+        """INSERT INTO documentos (coleccion, documento_id, empresa_id, tipo, archivo, chunk_ids, ingestado_en, expira_en)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT (coleccion, documento_id) DO UPDATE SET
+               empresa_id = excluded.empresa_id, tipo = excluded.tipo, archivo = excluded.archivo,
+               chunk_ids = excluded.chunk_ids, ingestado_en = excluded.ingestado_en, expira_en = excluded.expira_en""",
+        (coleccion, documento_id, empresa_id, tipo, archivo, json.dumps(chunk_ids), ahora, expira_en)
+    )
+    return obtenerDocumento(coleccion, documento_id)
+
+def obtenerDocumento(coleccion: str, documento_id: str) -> Optional[Dict[str, Any]]:
+    """Retorna la entrada de un documento o None si no está en el catálogo."""
+    fila = _conexion().execute(
+        "SELECT * FROM documentos WHERE coleccion = ? AND documento_id = ?", (coleccion, documento_id)
+    ).fetchone()
+    return _filaADocumento(fila) if fila else None
+
+def listarDocumentos(coleccion: str, empresa_id: Optional[str] = None, ingestados_desde: Optional[float] = None,
+                     limite: int = 1000) -> List[Dict[str, Any]]:
+    """
+    Lista documentos del catálogo, los más recientes primero.
+
+    Args:
+        coleccion (str): Nombre lógico de la colección
+        empresa_id (str): Filtrar por empresa
+        ingestados_desde (float): Filtrar por ingestas posteriores a este timestamp
+        limite (int): Máximo de documentos
+
+    Returns:
+        List[Dict]: Entradas del catálogo
+    """
+    consulta = "SELECT * FROM documentos WHERE coleccion = ?"
+    parametros: List[Any] = [coleccion]
+    if empresa_id is not None:
+        consulta += " AND empresa_id = ?"
+        parametros.append(empresa_id)
+    if ingestados_desde is not None:
+        consulta += " AND ingestado_en >= ?"
+        parametros.append(ingestados_desde)
+    consulta += " ORDER BY ingestado_en DESC LIMIT ?"
+    parametros.append(limite)
+    return [_filaADocumento(fila) for fila in _conexion().execute(consulta, parametros)]
+
+def huellaDeEmpresas(coleccion: str, empresa_ids: List[Optional[str]]) -> str:
+    """
+    Huella del conjunto de documentos de unas empresas: cambia al ingestar,
+    reemplazar o borrar cualquiera de sus documentos (no al renovar la retención).
+
+    Args:
+        coleccion (str): Nombre lógico de la colección
+        empresa_ids (List[str]): Empresas; None representa los documentos sin empresa
+
+    Returns:
+        str: Hash del conjunto de documentos
+    """
+    sha = hashlib.sha256()
+    conexion = _conexion()
+    for empresa_id in sorted(set(empresa_ids), key=lambda e: (e is not None, e or '')):
+        condicion = "empresa_id IS NULL" if empresa_id is None else "empresa_id = ?"
+        filas = conexion.execute(
+            f"SELECT documento_id, chunk_ids FROM documentos WHERE coleccion = ? AND {condicion} ORDER BY documento_id",
+            (coleccion,) if empresa_id is None else (coleccion, empresa_id)
+        )
+        sha.update(json.dumps([empresa_id, [[fila['documento_id'], fila['chunk_ids']] for fila in filas]]).encode('utf-8'))
+    return sha.hexdigest()
+
+def documentosExpirados(coleccion: str, ahora: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Documentos cuya retención venció."""
+    filas = _conexion().execute(
+        "SELECT * FROM documentos WHERE coleccion = ? AND expira_en IS NOT NULL AND expira_en < ?",
+        (coleccion, ahora or time.time())
+    )
+    return [_filaADocumento(fila) for fila in filas]
+
+def quitarDocumentos(coleccion: str, documento_ids: List[str]) -> int:
+    """
+    Quita documentos del catálogo y suma sus chunks a los pendientes de compactar.
+
+    Returns:
+        int: Chunks que tenían los documentos quitados
+    """
+    conexion = _conexion()
+    chunks = 0
+    conexion.execute('BEGIN IMMEDIATE')
+    try:
+        for documento_id in documento_ids:
+            fila = conexion.execute(
+                "SELECT chunk_ids FROM documentos WHERE coleccion = ? AND documento_id = ?", (coleccion, documento_id)
+            ).fetchone()
+            if fila is None:
+                continue
+            chunks += len(json.loads(fila['chunk_ids']))
+            conexion.execute("DELETE FROM documentos WHERE coleccion = ? AND documento_id = ?", (coleccion, documento_id))
+        _asegurarColeccion(conexion, coleccion)
+        conexion.execute("UPDATE colecciones SET chunks_eliminados = chunks_eliminados + ? WHERE nombre = ?", (chunks, coleccion))
+        conexion.execute('COMMIT')
+    except Exception:
+        conexion.execute('ROLLBACK')
+        raise
+    return chunks
+
+def sumarChunksEliminados(coleccion: str, chunks: int):
+    """Suma chunks borrados fuera de quitarDocumentos (p. ej. reemplazos) a los pendientes de compactar."""
+    conexion = _conexion()
+    _asegurarColeccion(conexion, coleccion)
+    conexion.execute("UPDATE colecciones SET chunks_eliminados = chunks_eliminados + ? WHERE nombre = ?", (chunks, coleccion))
+
+def _asegurarColeccion(conexion: sqlite3.Connection, nombre: str):
+    conexion.execute("INSERT OR IGNORE INTO colecciones (nombre, fisica) VALUES (?, ?)", (nombre, nombre))
+
+def estadoColeccion(nombre: str) -> Dict[str, Any]:
+    """
+    Estado de una colección lógica: colección física actual, generación y
+    chunks eliminados desde la última compactación.
+    """
+    conexion = _conexion()
+    fila = conexion.execute("SELECT * FROM colecciones WHERE nombre = ?", (nombre,)).fetchone()
+    if fila is None:
+        return {'nombre': nombre, 'fisica': nombre, 'generacion': 0, 'chunks_eliminados': 0,
+                'compactada_en': None, 'compactando_hasta': None}
+    return dict(fila)
+
+def coleccionFisica(nombre: str) -> str:
+    """Nombre de la colección de ChromaDB que respalda hoy a la colección lógica."""
+    fila = _conexion().execute("SELECT fisica FROM colecciones WHERE nombre = ?", (nombre,)).fetchone()
+    return fila['fisica'] if fila else nombre
+
+def reservarReconstruccion(nombre: str, duracion_s: float) -> bool:
+    """
+    Reserva la reconstrucción (compactación o migración) de una colección por duracion_s segundos.
+
+    La reserva vive en el catálogo, así que solo un proceso reconstruye a la vez.
+
+    Returns:
+        bool: True si se obtuvo la reserva
+    """
+    conexion = _conexion()
+    _asegurarColeccion(conexion, nombre)
+    ahora = time.time()
+    cursor = conexion.execute(
+        """UPDATE colecciones SET compactando_hasta = ?
+           WHERE nombre = ? AND (compactando_hasta IS NULL OR compactando_hasta < ?)""",
+        (ahora + duracion_s, nombre, ahora)
+    )
+    return cursor.rowcount == 1
+
+@contextmanager
+def bloqueoDeEscritura(nombre: str, exclusivo: bool = False):
+    """
+    Bloqueo entre procesos e hilos de las escrituras de una colección lógica.
+
+    Las ingestas y los borrados lo toman compartido mientras escriben en la
+    colección física vigente y actualizan el catálogo; una reconstrucción lo
+    toma exclusivo para conciliar y cambiar de colección física, así ninguna
+    escritura queda en la colección que se va a eliminar.
+
+    Args:
+        nombre (str): Colección lógica
+        exclusivo (bool): True para la reconstrucción
+    """
+    import fcntl
+
+    os.makedirs(os.path.dirname(CATALOGO_PATH), exist_ok=True)
+    with open(f"{CATALOGO_PATH}.{nombre}.lock", 'a') as candado:
+        fcntl.flock(candado, fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(candado, fcntl.LOCK_UN)
+
+def finalizarReconstruccion(nombre: str, fisica: Optional[str] = None, chunks_descontados: int = 0):
+    """
+    Libera la reserva y, si se indica, apunta la colección lógica a su nueva colección física.
+
+    Args:
+        nombre (str): Colección lógica
+        fisica (str): Nueva colección física (None si la reconstrucción no terminó)
+        chunks_descontados (int): Chunks eliminados que la nueva colección ya no contiene
+    """
+    conexion = _conexion()
+    if fisica is None:
+        conexion.execute("UPDATE colecciones SET compactando_hasta = NULL WHERE nombre = ?", (nombre,))
+        return
+    conexion.execute(
+        """UPDATE colecciones SET fisica = ?, generacion = generacion + 1, compactada_en = ?, compactando_hasta = NULL,
+               chunks_eliminados = MAX(chunks_eliminados - ?, 0)
+           WHERE nombre = ?""",
+        (fisica, time.time(), chunks_descontados, nombre)
+    )
+
+def olvidarColeccion(nombre: str):
+    """Elimina del catálogo una colección lógica y todos sus documentos."""
+    conexion = _conexion()
+    conexion.execute("DELETE FROM documentos WHERE coleccion = ?", (nombre,))
+    conexion.execute("DELETE FROM colecciones WHERE nombre = ?", (nombre,))
+    conexion.execute("DELETE FROM snapshots WHERE coleccion = ?", (nombre,))
+
+def importarDocumentos(coleccion: str, documentos: List[Dict[str, Any]], reemplazar: bool = False):
+    """
+    Registra entradas de otro catálogo (un snapshot) tal como vienen, sin renovar su retención.
+
+    Args:
+        coleccion (str): Nombre lógico de la colección
+        documentos (List[Dict]): Entradas con documento_id, chunk_ids, empresa_id, tipo, archivo,
+            ingestado_en y expira_en
+        reemplazar (bool): Quitar antes todos los documentos de la colección
+    """
+    conexion = _conexion()
+    conexion.execute('BEGIN IMMEDIATE')
+    try:
+        if reemplazar:
+            conexion.execute("DELETE FROM documentos WHERE coleccion = ?", (coleccion,))
+        conexion.executemany(
+            """INSERT OR REPLACE INTO documentos (coleccion, documento_id, empresa_id, tipo, archivo, chunk_ids, ingestado_en, expira_en)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            [(coleccion, d['documento_id'], d.get('empresa_id'), d.get('tipo'), d.get('archivo'), json.dumps(d['chunk_ids']),
+              d['ingestado_en'], d.get('expira_en')) for d in documentos]
+        )
+        conexion.execute('COMMIT')
+    except Exception:
+        conexion.execute('ROLLBACK')
+        raise
+
+def registrarSnapshot(coleccion: str, snapshot_id: str, hasta: float):
+    """Anota el último snapshot importado en la colección (base esperada del siguiente delta)."""
+    _conexion().execute(
+        "INSERT OR REPLACE INTO snapshots (coleccion, snapshot_id, hasta, importado_en) VALUES (?, ?, ?, ?)",
+        (coleccion, snapshot_id, hasta, time.time())
+    )
+
+def ultimoSnapshot(coleccion: str) -> Optional[Dict[str, Any]]:
+    """Último snapshot importado en la colección o None."""
+    fila = _conexion().execute("SELECT * FROM snapshots WHERE coleccion = ?", (coleccion,)).fetchone()
+    return dict(fila) if fila else None
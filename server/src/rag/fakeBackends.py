@@ -0,0 +1,123 @@
+import re
+import json
+import math
+import time
+import zlib
+from typing import Dict, List, Any, Optional
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Dimensión completa de los embeddings falsos (la de text-embedding-3-small)
+DIMENSIONES_COMPLETAS = 1536
+
+def _estimarTokens(texto: str) -> int:
+    """Aproximación de tokens (4 caracteres por token), suficiente para benchmarks."""
+    return max(1, len(texto) // 4)
+
+def _instanciaDeEsquema(esquema: Dict[str, Any], semilla: int) -> Any:
+    """Genera una instancia mínima y determinística que cumple el esquema JSON."""
+    tipo = esquema.get('type')
+    if isinstance(tipo, list):
+        tipo = next((t for t in tipo if t != 'null'), 'null')
+
+    if 'enum' in esquema:
+        return esquema['enum'][semilla % len(esquema['enum'])]
+    if tipo == 'object':
+        return {
+            campo: _instanciaDeEsquema(subesquema, semilla + i)
+            for i, (campo, subesquema) in enumerate(esquema.get('properties', {}).items())
+        }
+    if tipo == 'array':
+        return [_instanciaDeEsquema(esquema.get('items', {}), semilla)]
+    if tipo in ('number', 'integer'):
+        minimo = esquema.get('minimum', 0)
+        maximo = esquema.get('maximum', minimo + 100000)
+        return minimo + semilla % max(int(maximo - minimo), 1)
+    if tipo == 'boolean':
+        return bool(semilla % 2)
+    if tipo == 'string':
+        return f"valor simulado {semilla % 1000}"
+    return None
+
+class ChatFalso(BaseChatModel):
+    """
+    Modelo de chat determinístico que reemplaza a ChatOpenAI en benchmarks y pruebas.
+
+    Si la llamada trae un response_format con json_schema, responde con una
+    instancia válida del esquema; si no, con un texto fijo derivado del prompt.
+    Reporta uso de tokens estimado igual que el proveedor real.
+    """
+
+    modelo: str = "fake-chat"
+    latencia_ms: float = 0.0
+    max_tokens: int = 2000
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt = '\n'.join(str(mensaje.content) for mensaje in messages)
+        semilla = zlib.crc32(prompt.encode('utf-8'))
+
+        if self.latencia_ms:
+            time.sleep(self.latencia_ms / 1000)
+
+        formato = kwargs.get('response_format') or {}
+        if formato.get('type') == 'json_schema':
+            contenido = json.dumps(_instanciaDeEsquema(formato['json_schema']['schema'], semilla), ensure_ascii=False)
+        elif formato.get('type') == 'json_object':
+            contenido = json.dumps({'respuesta': f"simulada {semilla % 1000}"})
+        else:
+            contenido = f"Respuesta simulada ({len(prompt)} caracteres de prompt, id {semilla % 1000})."
+
+        uso = {
+            'prompt_tokens': _estimarTokens(prompt),
+            'completion_tokens': _estimarTokens(contenido),
+        }
+        uso['total_tokens'] = uso['prompt_tokens'] + uso['completion_tokens']
+
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=contenido), generation_info={'finish_reason': 'stop'})],
+            llm_output={'token_usage': uso, 'model_name': self.modelo}
+        )
+
+class EmbeddingsFalsos(Embeddings):
+    """
+    Embeddings determinísticos por hashing de palabras.
+
+    Textos con vocabulario común quedan cerca en el espacio vectorial, así que
+    la recuperación se comporta de forma realista sin llamar a OpenAI.
+    """
+
+    def __init__(self, dimensiones: int = 1536, latencia_ms: float = 0.0):
+        self.dimensiones = dimensiones
+        self.latencia_ms = latencia_ms
+
+    def _vectorizar(self, texto: str) -> List[float]:
+        # Como en text-embedding-3, un vector acortado es el prefijo renormalizado del completo
+        completo = max(self.dimensiones, DIMENSIONES_COMPLETAS)
+        vector = [0.0] * completo
+        for palabra in re.findall(r'\w+', texto.lower()):
+            hash_palabra = zlib.crc32(palabra.encode('utf-8'))
+            signo = 1.0 if hash_palabra & 1 else -1.0
+            vector[(hash_palabra >> 1) % completo] += signo
+        vector = vector[:self.dimensiones]
+
+        norma = math.sqrt(sum(v * v for v in vector))
+        if norma == 0:
+            vector[0] = 1.0
+            return vector
+        return [v / norma for v in vector]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.latencia_ms:
+            time.sleep(self.latencia_ms / 1000)
+        return self._vectorizar(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latencia_ms:
+            time.sleep(self.latencia_ms / 1000)
+        return [self._vectorizar(texto) for texto in texts]
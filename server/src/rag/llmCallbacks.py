@@ -0,0 +1,55 @@
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+from .logs import obtenerLogger
+from .metrics import describirMetrica, incrementarContador, observarHistograma
+from .tokenUsage import registrarConsumo
+
+logger = obtenerLogger('llmCallbacks')
+
+describirMetrica('llm_llamadas_total', 'Llamadas al LLM por modelo')
+describirMetrica('llm_errores_total', 'Llamadas al LLM terminadas en error por modelo y tipo')
+describirMetrica('llm_duracion_segundos', 'Latencia de cada llamada al LLM')
+
+class InstrumentacionLlm(BaseCallbackHandler):
+    """Registra latencia, llamadas, errores y consumo de cada invocación del LLM."""
+
+    def __init__(self, modelo: str):
+        self.modelo = modelo
+        self._inicios = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._inicios[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._inicios[run_id] = time.perf_counter()
+
+    def _cerrar(self, run_id) -> None:
+        inicio = self._inicios.pop(run_id, None)
+        if inicio is not None:
+            observarHistograma('llm_duracion_segundos', time.perf_counter() - inicio, modelo=self.modelo)
+        incrementarContador('llm_llamadas_total', modelo=self.modelo)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._cerrar(run_id)
+
+        salida = response.llm_output or {}
+        uso = salida.get('token_usage') or {}
+        if uso:
+            cacheados = (uso.get('prompt_tokens_details') or {}).get('cached_tokens', 0)
+            registrarConsumo(salida.get('model_name') or self.modelo, uso.get('prompt_tokens', 0), uso.get('completion_tokens', 0),
+                             tokens_cacheados=cacheados)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._cerrar(run_id)
+        incrementarContador('llm_errores_total', modelo=self.modelo, tipo=type(error).__name__)
+        logger.warning("Error del LLM", extra={'campos': {'modelo': self.modelo, 'error': str(error)}})
+
+class ContadorTokens(BaseCallbackHandler):
+    """Acumula los tokens reportados por el proveedor durante una llamada."""
+
+    def __init__(self):
+        self.total_tokens = 0
+
+    def on_llm_end(self, response, **kwargs):
+        uso = (response.llm_output or {}).get('token_usage') or {}
+        self.total_tokens += uso.get('total_tokens', 0)
@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+import httpx
+from .config import (
+    LLM_GATEWAY_RPM, LLM_GATEWAY_TPM, LLM_GATEWAY_COALESCER, LLM_REINTENTOS, LLM_BACKOFF_BASE_S, LLM_BACKOFF_MAX_S
+)
+from .llmScheduler import obtenerPlanificador
+from .logs import obtenerLogger
+from .metrics import describirMetrica, incrementarContador, observarHistograma
+
+logger = obtenerLogger('llmGateway')
+
+describirMetrica('llm_gateway_solicitudes_total', 'Solicitudes HTTP a OpenAI enviadas por el gateway por endpoint')
+describirMetrica('llm_gateway_coalescidas_total', 'Solicitudes idénticas en vuelo que reutilizaron la respuesta de otra')
+describirMetrica('llm_gateway_reintentos_total', 'Reintentos por endpoint y motivo (429, 5xx, conexion)')
+describirMetrica('llm_gateway_limitadas_total', 'Solicitudes que esperaron al limitador de tasa local')
+describirMetrica('llm_gateway_espera_segundos', 'Espera en el limitador de tasa local por endpoint')
+
+ESTADOS_REINTENTABLES = {408, 409, 429, 500, 502, 503, 504}
+
+class CubetaDeTokens:
+    """
+    Limitador de tasa por cubeta de tokens.
+
+    Se recarga a `tasa` unidades por segundo hasta `capacidad`. Un 429 del
+    proveedor pausa la cubeta hasta que vence su Retry-After, así los demás
+    hilos no insisten mientras dura el límite.
+    """
+
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self._disponibles = capacidad
+        self._actualizada = time.monotonic()
+        self._pausada_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def _recargar(self, ahora: float):
+        self._disponibles = min(self.capacidad, self._disponibles + (ahora - self._actualizada) * self.tasa)
+        self._actualizada = ahora
+
+    def adquirir(self, cantidad: float = 1) -> float:
+        """
+        Bloquea hasta disponer de `cantidad` unidades.
+
+        Returns:
+            float: Segundos esperados
+        """
+        if self.tasa <= 0:
+            return 0.0
+        # Una solicitud mayor que la cubeta completa no debe esperar para siempre
+        cantidad = min(cantidad, self.capacidad)
+        esperado = 0.0
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._recargar(ahora)
+                if ahora >= self._pausada_hasta and self._disponibles >= cantidad:
+                    self._disponibles -= cantidad
+                    return esperado
+                espera = max(self._pausada_hasta - ahora, (cantidad - self._disponibles) / self.tasa)
+            time.sleep(espera)
+            esperado += espera
+
+    def pausar(self, segundos: float):
+        """Detiene las entregas durante `segundos` (p. ej. tras un 429 con Retry-After)."""
+        with self._lock:
+            self._pausada_hasta = max(self._pausada_hasta, time.monotonic() + segundos)
+
+class _Vuelo:
+    """Solicitud en curso a la que se suman las solicitudes idénticas."""
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.respuesta: Optional[Tuple[int, list, bytes]] = None
+        self.error: Optional[BaseException] = None
+        self.seguidores = 0
+
+def _endpoint(request: httpx.Request) -> str:
+    """'chat', 'embeddings' u otro último segmento de la ruta de la API."""
+    ruta = request.url.path.rstrip('/')
+    if ruta.endswith('/chat/completions'):
+        return 'chat'
+    return ruta.rsplit('/', 1)[-1] or 'otro'
+
+def _tokensEstimados(cuerpo: Dict) -> int:
+    """Tokens que la solicitud consumirá del límite por minuto (prompt estimado + máximo de salida)."""
+    entrada = cuerpo.get('messages') or cuerpo.get('input') or ''
+    return max(1, len(json.dumps(entrada, ensure_ascii=False)) // 4) + int(cuerpo.get('max_tokens') or 0)
+
+def segundosDeRetryAfter(cabeceras: httpx.Headers) -> Optional[float]:
+    """
+    Segundos que pide esperar el proveedor (retry-after-ms, Retry-After en segundos o fecha HTTP).
+
+    Returns:
+        Optional[float]: Segundos, o None si la respuesta no trae la cabecera
+    """
+    try:
+        if 'retry-after-ms' in cabeceras:
+            return float(cabeceras['retry-after-ms']) / 1000
+        valor = cabeceras.get('retry-after')
+        if valor is None:
+            return None
+        try:
+            return float(valor)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except Exception:
+        return None
+
+def calcularBackoff(intento: int, retry_after: Optional[float] = None,
+                    base: float = LLM_BACKOFF_BASE_S, maximo: float = LLM_BACKOFF_MAX_S) -> float:
+    """
+    Espera antes del reintento `intento` (0 = primero): backoff exponencial con jitter completo.
+
+    Si el proveedor indicó Retry-After se respeta como mínimo, con un jitter
+    pequeño para que los hilos no reintenten todos en el mismo instante.
+    """
+    exponencial = random.uniform(0, min(maximo, base * (2 ** intento)))
+    if retry_after is None:
+        return exponencial
+    return min(max(retry_after, 0.0), maximo * 4) + random.uniform(0, base)
+
+def _enCero(uso: Dict) -> Dict:
+    return {clave: _enCero(valor) if isinstance(valor, dict) else 0 for clave, valor in uso.items()}
+
+def _sinConsumo(contenido: bytes) -> bytes:
+    """Copia de la respuesta con el uso en cero: la solicitud coalescida no se factura."""
+    try:
+        datos = json.loads(contenido)
+        if isinstance(datos, dict) and isinstance(datos.get('usage'), dict):
+            datos['usage'] = _enCero(datos['usage'])
+            return json.dumps(datos).encode('utf-8')
+    except ValueError:
+        pass
+    return contenido
+
+class TransporteGateway(httpx.BaseTransport):
+    """
+    Transporte HTTP de los clientes de OpenAI.
+
+    - Une solicitudes idénticas en vuelo (singleflight): la primera llama a la
+      API y las demás reciben una copia de su respuesta.
+    - Limita localmente solicitudes y tokens por minuto según el tier de la cuenta.
+    - Reintenta 429, 5xx y errores de conexión con backoff exponencial con
+      jitter, respetando Retry-After.
+    - Ordena las llamadas por prioridad y tenant con el planificador (llmScheduler).
+    """
+
+    def __init__(self, transporte: Optional[httpx.BaseTransport] = None, rpm: float = LLM_GATEWAY_RPM,
+                 tpm: float = LLM_GATEWAY_TPM, reintentos: int = LLM_REINTENTOS, coalescer: bool = LLM_GATEWAY_COALESCER):
+        self._transporte = transporte or httpx.HTTPTransport()
+        # Ráfagas de hasta 10 s de cupo: OpenAI mide los límites por minuto
+        self.solicitudes = CubetaDeTokens(rpm / 60, max(1.0, rpm / 6))
+        self.tokens = CubetaDeTokens(tpm / 60, max(1.0, tpm / 6))
+        self.reintentos = reintentos
+        self.coalescer = coalescer
+        self._vuelos: Dict[str, _Vuelo] = {}
+        self._lock = threading.Lock()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        contenido = request.read()
+        try:
+            cuerpo = json.loads(contenido) if contenido else {}
+        except ValueError:
+            cuerpo = {}
+        endpoint = _endpoint(request)
+
+        if not self.coalescer or request.method != 'POST' or cuerpo.get('stream'):
+            estado, cabeceras, datos = self._enviar(request, cuerpo, endpoint)
+            return httpx.Response(estado, headers=cabeceras, content=datos, request=request)
+
+        clave = hashlib.sha256(request.method.encode() + str(request.url).encode() + contenido).hexdigest()
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[clave] = _Vuelo()
+            else:
+                vuelo.seguidores += 1
+
+        if not lider:
+            incrementarContador('llm_gateway_coalescidas_total', endpoint=endpoint)
+            vuelo.listo.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            estado, cabeceras, datos = vuelo.respuesta
+            return httpx.Response(estado, headers=cabeceras, content=_sinConsumo(datos), request=request)
+
+        try:
+            vuelo.respuesta = self._enviar(request, cuerpo, endpoint)
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                self._vuelos.pop(clave, None)
+            vuelo.listo.set()
+        estado, cabeceras, datos = vuelo.respuesta
+        return httpx.Response(estado, headers=cabeceras, content=datos, request=request)
+
+    def _enviar(self, request: httpx.Request, cuerpo: Dict, endpoint: str) -> Tuple[int, list, bytes]:
+        """
+        Envía la solicitud con planificación, limitación de tasa y reintentos; retorna (estado, cabeceras, contenido).
+
+        Cada intento ocupa un cupo del planificador (según la prioridad del
+        contexto) solo mientras espera la tasa y la respuesta, no durante el backoff.
+        """
+        tokens = _tokensEstimados(cuerpo)
+        for intento in range(self.reintentos + 1):
+            error = None
+            with obtenerPlanificador().turno(costo=tokens):
+                espera = self.solicitudes.adquirir() + self.tokens.adquirir(tokens)
+                if espera > 0:
+                    incrementarContador('llm_gateway_limitadas_total', endpoint=endpoint)
+                    observarHistograma('llm_gateway_espera_segundos', espera, endpoint=endpoint)
+                incrementarContador('llm_gateway_solicitudes_total', endpoint=endpoint)
+
+                try:
+                    respuesta = self._transporte.handle_request(request)
+                    datos = respuesta.read()
+                    respuesta.close()
+                except httpx.TransportError as e:
+                    error = e
+
+            if error is not None:
+                if intento == self.reintentos:
+                    raise error
+                motivo, retry_after = 'conexion', None
+                logger.warning("Error de conexión con OpenAI", extra={'campos': {'endpoint': endpoint, 'error': str(error)}})
+            else:
+                if respuesta.status_code not in ESTADOS_REINTENTABLES or intento == self.reintentos:
+                    # httpx ya decodificó el contenido: no reenviar cabeceras de compresión o longitud
+                    cabeceras = [(clave, valor) for clave, valor in respuesta.headers.multi_items()
+                                 if clave.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')]
+                    return respuesta.status_code, cabeceras, datos
+                motivo = '429' if respuesta.status_code == 429 else '5xx'
+                retry_after = segundosDeRetryAfter(respuesta.headers)
+                if respuesta.status_code == 429 and retry_after:
+                    self.solicitudes.pausar(retry_after)
+
+            espera = calcularBackoff(intento, retry_after)
+            incrementarContador('llm_gateway_reintentos_total', endpoint=endpoint, motivo=motivo)
+            logger.info("Reintentando solicitud a OpenAI", extra={'campos': {
+                'endpoint': endpoint, 'motivo': motivo, 'intento': intento + 1, 'espera_s': round(espera, 3)}})
+            time.sleep(espera)
+
+    def close(self):
+        self._transporte.close()
+
+_lock_cliente = threading.Lock()
+_clientes = {}
+
+def obtenerClienteHttp() -> httpx.Client:
+    """
+    Cliente HTTP compartido por los clientes de OpenAI del proceso.
+
+    Compartirlo hace que la coalescencia y los límites de tasa abarquen todas
+    las llamadas; se recrea en procesos hijos (fork).
+    """
+    clave = os.getpid()
+    cliente = _clientes.get(clave)
+    if cliente is not None:
+        return cliente
+    with _lock_cliente:
+        if clave not in _clientes:
+            _clientes[clave] = httpx.Client(
+                transport=TransporteGateway(httpx.HTTPTransport(
+                    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+                )),
+                timeout=httpx.Timeout(600.0, connect=5.0)
+            )
+        return _clientes[clave]
@@ -0,0 +1,174 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from .config import LLM_CONCURRENCIA_TOTAL, LLM_CONCURRENCIA_POR_CLASE, LLM_PESOS_TENANT
+from .logs import obtenerLogger
+from .metrics import describirMetrica, incrementarContador, observarHistograma
+
+logger = obtenerLogger('llmScheduler')
+
+describirMetrica('llm_cola_espera_segundos', 'Tiempo en cola del planificador antes de llamar a OpenAI por clase de prioridad')
+describirMetrica('llm_planificador_admitidas_total', 'Llamadas admitidas por el planificador por clase de prioridad')
+
+# Clases de prioridad, de mayor a menor
+CLASES = ('interactivo', 'analisis', 'lote')
+CLASE_POR_DEFECTO = 'analisis'
+TENANT_POR_DEFECTO = 'general'
+
+# Clase y tenant de las llamadas al LLM del contexto actual (petición, lote, hilo)
+_prioridad: contextvars.ContextVar = contextvars.ContextVar('prioridad_llm', default=(CLASE_POR_DEFECTO, TENANT_POR_DEFECTO))
+
+def establecerPrioridad(clase: str, tenant: Optional[str] = None):
+    """
+    Asigna la clase de prioridad y el tenant de las llamadas al LLM del contexto actual.
+
+    Args:
+        clase (str): 'interactivo', 'analisis' o 'lote'
+        tenant (str): Cliente al que se imputa la llamada para el reparto justo
+    """
+    _prioridad.set((clase if clase in CLASES else CLASE_POR_DEFECTO, tenant or TENANT_POR_DEFECTO))
+
+@contextmanager
+def prioridadLlm(clase: str, tenant: Optional[str] = None):
+    """Aplica una clase de prioridad (y opcionalmente un tenant) a las llamadas del bloque."""
+    actual_tenant = _prioridad.get()[1]
+    token = _prioridad.set((clase if clase in CLASES else CLASE_POR_DEFECTO, tenant or actual_tenant))
+    try:
+        yield
+    finally:
+        _prioridad.reset(token)
+
+def prioridadActual() -> Tuple[str, str]:
+    """(clase, tenant) del contexto actual."""
+    return _prioridad.get()
+
+class _Turno:
+    """Llamada esperando o usando un cupo del planificador."""
+
+    def __init__(self, clase: str, tenant: str, inicio_virtual: float):
+        self.clase = clase
+        self.tenant = tenant
+        self.inicio_virtual = inicio_virtual
+        self.admitido = False
+
+class PlanificadorLlm:
+    """
+    Reparte los cupos de llamadas simultáneas a OpenAI.
+
+    Entre clases la prioridad es estricta: un cupo libre va a la clase más
+    alta con llamadas en cola que no haya alcanzado su límite. Como el límite
+    de 'lote' es menor que el total, siempre quedan cupos para el chat aunque
+    los lotes saturen el resto.
+
+    Dentro de cada clase el reparto entre tenants es justo y ponderado
+    (start-time fair queuing): cada llamada recibe una etiqueta virtual
+    inicio = max(reloj de la clase, fin de la llamada anterior del tenant) y
+    avanza el fin del tenant en costo / peso; se atiende la menor etiqueta.
+    """
+
+    def __init__(self, concurrencia_total: int = LLM_CONCURRENCIA_TOTAL,
+                 concurrencia_por_clase: Optional[Dict[str, int]] = None,
+                 pesos: Optional[Dict[str, float]] = None):
+        self.concurrencia_total = max(1, concurrencia_total)
+        limites = concurrencia_por_clase or LLM_CONCURRENCIA_POR_CLASE
+        self.limites = {clase: max(1, int(limites.get(clase, self.concurrencia_total))) for clase in CLASES}
+        self.pesos = pesos or LLM_PESOS_TENANT
+        self._condicion = threading.Condition()
+        self._en_curso = {clase: 0 for clase in CLASES}
+        self._total = 0
+        self._colas: Dict[str, List] = {clase: [] for clase in CLASES}
+        self._reloj = {clase: 0.0 for clase in CLASES}
+        self._fin_tenant: Dict[Tuple[str, str], float] = {}
+        self._secuencia = itertools.count()
+
+    def _peso(self, tenant: str) -> float:
+        return max(float(self.pesos.get(tenant, self.pesos.get('*', 1.0))), 1e-6)
+
+    def _despachar(self):
+        """Admite llamadas en cola mientras haya cupos (con el lock tomado)."""
+        admitidas = False
+        while self._total < self.concurrencia_total:
+            for clase in CLASES:
+                cola = self._colas[clase]
+                if cola and self._en_curso[clase] < self.limites[clase]:
+                    _, _, turno = heapq.heappop(cola)
+                    turno.admitido = True
+                    self._reloj[clase] = turno.inicio_virtual
+                    self._en_curso[clase] += 1
+                    self._total += 1
+                    admitidas = True
+                    break
+            else:
+                break
+        if admitidas:
+            self._condicion.notify_all()
+
+    def adquirir(self, clase: str, tenant: str, costo: float = 1.0) -> _Turno:
+        """Espera un cupo para una llamada de la clase y tenant indicados."""
+        inicio = time.perf_counter()
+        with self._condicion:
+            clave = (clase, tenant)
+            inicio_virtual = max(self._reloj[clase], self._fin_tenant.get(clave, 0.0))
+            self._fin_tenant[clave] = inicio_virtual + costo / self._peso(tenant)
+            if len(self._fin_tenant) > 10000:
+                # Tenants sin llamadas pendientes ya no adelantan a nadie
+                self._fin_tenant = {c: fin for c, fin in self._fin_tenant.items() if fin > self._reloj[c[0]]}
+
+            turno = _Turno(clase, tenant, inicio_virtual)
+            heapq.heappush(self._colas[clase], (inicio_virtual, next(self._secuencia), turno))
+            self._despachar()
+            while not turno.admitido:
+                self._condicion.wait()
+
+        observarHistograma('llm_cola_espera_segundos', time.perf_counter() - inicio, clase=clase)
+        incrementarContador('llm_planificador_admitidas_total', clase=clase)
+        return turno
+
+    def liberar(self, turno: _Turno):
+        """Devuelve el cupo de una llamada terminada."""
+        with self._condicion:
+            self._en_curso[turno.clase] -= 1
+            self._total -= 1
+            self._despachar()
+
+    @contextmanager
+    def turno(self, costo: float = 1.0, clase: Optional[str] = None, tenant: Optional[str] = None):
+        """
+        Ocupa un cupo durante el bloque.
+
+        Args:
+            costo (float): Costo de la llamada para el reparto entre tenants (p. ej. tokens estimados)
+            clase (str): Clase de prioridad; por defecto la del contexto
+            tenant (str): Tenant; por defecto el del contexto
+        """
+        clase_actual, tenant_actual = prioridadActual()
+        turno = self.adquirir(clase or clase_actual, tenant or tenant_actual, costo)
+        try:
+            yield turno
+        finally:
+            self.liberar(turno)
+
+    def estado(self) -> Dict[str, Dict[str, int]]:
+        """Llamadas en curso y en cola por clase."""
+        with self._condicion:
+            return {clase: {'en_curso': self._en_curso[clase], 'en_cola': len(self._colas[clase]),
+                            'limite': self.limites[clase]} for clase in CLASES}
+
+_lock_planificador = threading.Lock()
+_planificadores = {}
+
+def obtenerPlanificador() -> PlanificadorLlm:
+    """Planificador compartido del proceso (se recrea en procesos hijos)."""
+    clave = os.getpid()
+    planificador = _planificadores.get(clave)
+    if planificador is not None:
+        return planificador
+    with _lock_planificador:
+        if clave not in _planificadores:
+            _planificadores[clave] = PlanificadorLlm()
+        return _planificadores[clave]
@@ -0,0 +1,98 @@
+import json
+import logging
+import contextvars
+from datetime import datetime, timezone
+from typing import Optional
+
+# Identificador de la petición en curso, propagado a hilos con contextvars.copy_context()
+_request_id: contextvars.ContextVar = contextvars.ContextVar('request_id', default=None)
+
+def establecerRequestId(request_id: Optional[str]) -> contextvars.Token:
+    """
+    Asocia un request ID al contexto actual.
+
+    Args:
+        request_id (str): Identificador de la petición
+
+    Returns:
+        contextvars.Token: Token para restablecer el valor anterior con restablecerRequestId
+    """
+    return _request_id.set(request_id)
+
+def restablecerRequestId(token: contextvars.Token):
+    """Restablece el request ID anterior (al terminar la petición, para no dejarlo en el hilo)."""
+    _request_id.reset(token)
+
+def obtenerRequestId() -> Optional[str]:
+    """Retorna el request ID del contexto actual (None fuera de una petición)."""
+    return _request_id.get()
+
+def obtenerLogger(nombre: str) -> logging.Logger:
+    """
+    Retorna el logger de un módulo bajo la jerarquía 'pyme'.
+
+    Args:
+        nombre (str): Nombre corto del módulo (p. ej. 'vectorStore')
+
+    Returns:
+        logging.Logger: Logger configurado por configurarLogs
+    """
+    return logging.getLogger(f"pyme.{nombre}")
+
+class FormateadorJson(logging.Formatter):
+    """Formatea cada registro como una línea JSON con request ID y campos extra."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        registro = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensaje': record.getMessage(),
+        }
+
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            registro['request_id'] = request_id
+
+        campos = getattr(record, 'campos', None)
+        if campos:
+            registro.update(campos)
+
+        if record.exc_info:
+            registro['excepcion'] = self.formatException(record.exc_info)
+
+        return json.dumps(registro, ensure_ascii=False, default=str)
+
+class _FiltroRequestId(logging.Filter):
+    """Agrega el request ID del contexto a cada registro."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        return True
+
+def configurarLogs(nivel: str = 'INFO', formato: str = 'json'):
+    """
+    Configura el logging estructurado de la aplicación.
+
+    Args:
+        nivel (str): Nivel de logging (DEBUG, INFO, WARNING, ERROR)
+        formato (str): 'json' (una línea JSON por registro) o 'texto'
+    """
+    numeric_level = getattr(logging, nivel.upper(), None)
+    if not isinstance(numeric_level, int):
+        raise ValueError(f'Nivel de logging inválido: {nivel}')
+
+    manejador = logging.StreamHandler()
+    manejador.addFilter(_FiltroRequestId())
+    if formato == 'json':
+        manejador.setFormatter(FormateadorJson())
+    else:
+        manejador.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'))
+
+    raiz = logging.getLogger()
+    for anterior in list(raiz.handlers):
+        raiz.removeHandler(anterior)
+    raiz.addHandler(manejador)
+    raiz.setLevel(logging.WARNING)
+
+    logging.getLogger('pyme').setLevel(numeric_level)
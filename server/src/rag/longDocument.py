@@ -0,0 +1,147 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+from .config import obtenerLlm, DOC_LARGO_TAMANO_SECCION, DOC_LARGO_CONCURRENCIA, DOC_LARGO_MAX_RESUMEN
+from .pdfProcessor import dividirTextoEnChunks
+from .scoringLocal import PATRONES_PARTIDAS, extraerPartidasFinancieras
+from .structuredOutput import invocarLlmJson
+from .logs import obtenerLogger
+
+logger = obtenerLogger('longDocument')
+
+MAX_HALLAZGOS_POR_SECCION = 3
+MAX_HALLAZGOS_RESUMEN = 12
+MAX_CARACTERES_HALLAZGO = 200
+
+ESQUEMA_CIFRAS_SECCION = {
+    "type": "object",
+    "properties": {
+        "partidas": {
+            "type": "object",
+            "properties": {partida: {"type": ["number", "null"]} for partida in PATRONES_PARTIDAS},
+            "required": list(PATRONES_PARTIDAS),
+            "additionalProperties": False
+        },
+        "hallazgos": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["partidas", "hallazgos"],
+    "additionalProperties": False
+}
+
+def extraerCifrasDeSeccion(seccion: str, indice: int, total: int) -> Dict[str, Any]:
+    """
+    Extrae las partidas y hallazgos de una sección del estado financiero.
+
+    Si el LLM falla, se usa solo la extracción por expresiones regulares.
+
+    Args:
+        seccion (str): Texto de la sección
+        indice (int): Posición de la sección (base 1)
+        total (int): Número total de secciones
+
+    Returns:
+        Dict[str, Any]: 'partidas' y 'hallazgos' de la sección
+    """
+    partidas_locales = extraerPartidasFinancieras(seccion)
+
+    try:
+        llm = obtenerLlm(temperatura=0.0, max_tokens=400)
+        prompt = f"""
+        Extrae las cifras de esta sección de un estado financiero (sección {indice} de {total}).
+
+        Devuelve SOLO un JSON con:
+        - partidas: {', '.join(PATRONES_PARTIDAS)} (número, o null si no aparece en esta sección; usa el periodo más reciente)
+        - hallazgos: hasta {MAX_HALLAZGOS_POR_SECCION} observaciones breves relevantes para riesgo crediticio (flujo de caja, deudas, contingencias)
+
+        SECCIÓN:
+        {seccion}
+        """
+        datos = invocarLlmJson(llm, prompt, ESQUEMA_CIFRAS_SECCION, 'extraccion_seccion')
+    except Exception as e:
+        logger.warning(f"Error al extraer cifras de la sección {indice}: {str(e)}")
+        datos = None
+
+    if datos is None:
+        return {'partidas': partidas_locales, 'hallazgos': []}
+
+    # Completar con la extracción local lo que el LLM no encontró
+    partidas = {
+        partida: datos['partidas'].get(partida) if datos['partidas'].get(partida) is not None else partidas_locales.get(partida)
+        for partida in PATRONES_PARTIDAS
+    }
+    return {'partidas': partidas, 'hallazgos': datos['hallazgos'][:MAX_HALLAZGOS_POR_SECCION]}
+
+def fusionarCifras(resultados: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Combina los resultados por sección en un único conjunto de cifras.
+
+    Para cada partida se toma el primer valor encontrado en orden del documento.
+
+    Args:
+        resultados (List[Dict]): Resultados de extraerCifrasDeSeccion
+
+    Returns:
+        Dict[str, Any]: 'partidas' y 'hallazgos' fusionados
+    """
+    partidas = {partida: None for partida in PATRONES_PARTIDAS}
+    hallazgos = []
+    vistos = set()
+
+    for resultado in resultados:
+        for partida, valor in resultado['partidas'].items():
+            if partidas.get(partida) is None and valor is not None:
+                partidas[partida] = valor
+
+        for hallazgo in resultado['hallazgos']:
+            clave = hallazgo.strip().lower()
+            if clave and clave not in vistos and len(hallazgos) < MAX_HALLAZGOS_RESUMEN:
+                vistos.add(clave)
+                hallazgos.append(hallazgo.strip()[:MAX_CARACTERES_HALLAZGO])
+
+    return {'partidas': partidas, 'hallazgos': hallazgos}
+
+def construirResumenCompacto(partidas: Dict[str, Optional[float]], hallazgos: List[str], total_secciones: int) -> str:
+    """Genera el resumen de tamaño acotado que recibe la llamada final de scoring."""
+    lineas = [f"Resumen de un estado financiero de {total_secciones} secciones."]
+    lineas.append("Cifras principales:")
+    for partida, valor in partidas.items():
+        lineas.append(f"- {partida}: {valor:,.2f}" if valor is not None else f"- {partida}: no disponible")
+
+    if hallazgos:
+        lineas.append("Hallazgos:")
+        lineas.extend(f"- {hallazgo}" for hallazgo in hallazgos)
+
+    return '\n'.join(lineas)[:DOC_LARGO_MAX_RESUMEN]
+
+def resumirDocumentoLargo(texto_financiero: str) -> Dict[str, Any]:
+    """
+    Resume un estado financiero largo con un esquema map-reduce.
+
+    Divide el texto en secciones con el mismo chunker de la ingesta, extrae las
+    cifras de cada sección en paralelo (con concurrencia acotada) y las fusiona
+    en un resumen cuyo tamaño no depende de la longitud del documento.
+
+    Args:
+        texto_financiero (str): Texto completo extraído del PDF
+
+    Returns:
+        Dict[str, Any]: 'partidas', 'hallazgos', 'resumen' y 'secciones'
+    """
+    secciones = dividirTextoEnChunks(texto_financiero, tamaño_chunk=DOC_LARGO_TAMANO_SECCION, solapamiento=200)
+    total = len(secciones)
+    logger.info("Documento largo: extrayendo cifras", extra={'campos': {'secciones': total}})
+
+    # Cada tarea corre en una copia del contexto para conservar el request ID
+    with ThreadPoolExecutor(max_workers=DOC_LARGO_CONCURRENCIA) as pool:
+        futuros = [
+            pool.submit(contextvars.copy_context().run, extraerCifrasDeSeccion, seccion, indice, total)
+            for indice, seccion in enumerate(secciones, 1)
+        ]
+        resultados = [futuro.result() for futuro in futuros]
+
+    fusion = fusionarCifras(resultados)
+    return {
+        **fusion,
+        'resumen': construirResumenCompacto(fusion['partidas'], fusion['hallazgos'], total),
+        'secciones': total
+    }
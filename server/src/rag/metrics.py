@@ -0,0 +1,261 @@
+import time
+import logging
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from .logs import obtenerLogger
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+# Prefijo común de todas las métricas expuestas
+PREFIJO_METRICAS = "pyme"
+
+_lock = threading.Lock()
+_contadores: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_descripciones: Dict[str, str] = {}
+
+# Límites (segundos) de los buckets de latencia por defecto
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# clave -> [conteos por bucket..., suma, total]
+_histogramas: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[float]] = {}
+_buckets: Dict[str, Tuple[float, ...]] = {}
+
+logger = obtenerLogger('etapas')
+
+def describirMetrica(nombre: str, descripcion: str):
+    """
+    Registra el texto de ayuda (HELP) de una métrica.
+
+    Args:
+        nombre (str): Nombre de la métrica sin prefijo
+        descripcion (str): Descripción legible
+    """
+    _descripciones[nombre] = descripcion
+
+def incrementarContador(nombre: str, valor: float = 1, **etiquetas: str):
+    """
+    Incrementa un contador monotónico.
+
+    Args:
+        nombre (str): Nombre de la métrica sin prefijo (terminado en _total)
+        valor (float): Cantidad a sumar
+        **etiquetas: Etiquetas de la serie (operacion='scoring', ...)
+    """
+    clave = (nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items())))
+    with _lock:
+        _contadores[clave] = _contadores.get(clave, 0) + valor
+
+def obtenerContador(nombre: str, **etiquetas: str) -> float:
+    """Retorna el valor actual de una serie de contador (0 si no existe)."""
+    clave = (nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items())))
+    with _lock:
+        return _contadores.get(clave, 0)
+
+def observarHistograma(nombre: str, valor: float, buckets: Tuple[float, ...] = BUCKETS_LATENCIA, **etiquetas: str):
+    """
+    Registra una observación en un histograma.
+
+    Args:
+        nombre (str): Nombre de la métrica sin prefijo
+        valor (float): Valor observado (segundos para latencias)
+        buckets (Tuple[float, ...]): Límites superiores; se fijan con la primera observación
+        **etiquetas: Etiquetas de la serie
+    """
+    clave = (nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items())))
+    with _lock:
+        limites = _buckets.setdefault(nombre, tuple(buckets))
+        serie = _histogramas.get(clave)
+        if serie is None:
+            serie = _histogramas[clave] = [0] * (len(limites) + 2)
+        indice = bisect.bisect_left(limites, valor)
+        if indice < len(limites):
+            serie[indice] += 1
+        serie[-2] += valor
+        serie[-1] += 1
+
+def obtenerHistograma(nombre: str, **etiquetas: str) -> Dict[str, float]:
+    """Retorna la suma y el número de observaciones de una serie de histograma."""
+    clave = (nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items())))
+    with _lock:
+        serie = _histogramas.get(clave)
+        return {'suma': serie[-2], 'total': serie[-1]} if serie else {'suma': 0, 'total': 0}
+
+def _instantanea() -> Dict[str, Any]:
+    """Copia de los contadores e histogramas del proceso."""
+    with _lock:
+        return {
+            'contadores': dict(_contadores),
+            'histogramas': {clave: list(serie) for clave, serie in _histogramas.items()}
+        }
+
+def ejecutarConMetricas(funcion: Callable, *args: Any) -> Tuple[Any, Dict[str, Any], Optional[BaseException]]:
+    """
+    Ejecuta una función en un worker de un pool de procesos y retorna también
+    las métricas que registró, que de otro modo quedan en el proceso hijo.
+    El worker se reutiliza entre tareas, así que se retorna solo la diferencia.
+
+    Uso:
+        futuro = pool.submit(ejecutarConMetricas, extraerTextoDePDF, ruta)
+        texto = resultadoConMetricas(futuro)
+
+    Args:
+        funcion (Callable): Función de nivel de módulo (debe poder serializarse)
+        *args: Argumentos de la función
+
+    Returns:
+        Tuple: (resultado, métricas registradas, excepción o None)
+    """
+    antes = _instantanea()
+    resultado, error = None, None
+    try:
+        resultado = funcion(*args)
+    except Exception as e:
+        error = e
+    ahora = _instantanea()
+
+    contadores = {
+        clave: valor - antes['contadores'].get(clave, 0)
+        for clave, valor in ahora['contadores'].items()
+        if valor != antes['contadores'].get(clave, 0)
+    }
+    histogramas = {}
+    for clave, serie in ahora['histogramas'].items():
+        previa = antes['histogramas'].get(clave, [0] * len(serie))
+        if serie[-1] != previa[-1]:
+            histogramas[clave] = [a - b for a, b in zip(serie, previa)]
+    with _lock:
+        buckets = {clave[0]: _buckets[clave[0]] for clave in histogramas}
+
+    return resultado, {'contadores': contadores, 'histogramas': histogramas, 'buckets': buckets}, error
+
+def fusionarMetricas(metricas: Dict[str, Any]):
+    """
+    Suma al proceso actual las métricas registradas en un proceso hijo.
+
+    Args:
+        metricas (Dict[str, Any]): Diferencia retornada por ejecutarConMetricas
+    """
+    with _lock:
+        for clave, valor in metricas['contadores'].items():
+            _contadores[clave] = _contadores.get(clave, 0) + valor
+        for clave, serie in metricas['histogramas'].items():
+            limites = _buckets.setdefault(clave[0], tuple(metricas['buckets'][clave[0]]))
+            if len(limites) + 2 != len(serie):
+                # Buckets distintos entre procesos: no se pueden sumar
+                continue
+            actual = _histogramas.setdefault(clave, [0] * len(serie))
+            for i, valor in enumerate(serie):
+                actual[i] += valor
+
+def resultadoConMetricas(futuro: 'Future') -> Any:
+    """
+    Retorna el resultado de una tarea lanzada con ejecutarConMetricas,
+    fusionando antes sus métricas (también si la tarea falló).
+
+    Args:
+        futuro (Future): Futuro del pool de procesos
+
+    Returns:
+        Any: Resultado de la función; relanza su excepción si falló
+    """
+    resultado, metricas, error = futuro.result()
+    fusionarMetricas(metricas)
+    if error is not None:
+        raise error
+    return resultado
+
+describirMetrica('cache_aciertos_total', 'Aciertos de cache por tipo de cache')
+describirMetrica('cache_fallos_total', 'Fallos de cache por tipo de cache')
+
+def registrarCache(cache: str, acierto: bool):
+    """
+    Registra un acierto o fallo de cache.
+
+    Args:
+        cache (str): Tipo de cache ('coleccion', ...)
+        acierto (bool): True si el valor se encontró en cache
+    """
+    incrementarContador('cache_aciertos_total' if acierto else 'cache_fallos_total', cache=cache)
+
+describirMetrica('etapa_duracion_segundos', 'Duración de cada etapa del pipeline')
+describirMetrica('etapa_errores_total', 'Etapas del pipeline terminadas con excepción')
+
+@contextmanager
+def medirEtapa(etapa: str, **etiquetas: str):
+    """
+    Mide la duración de una etapa del pipeline y la registra en
+    etapa_duracion_segundos; si la etapa lanza una excepción también
+    incrementa etapa_errores_total. Con nivel DEBUG emite además un span
+    como log estructurado (con el request ID del contexto).
+
+    Uso:
+        with medirEtapa('extraccion_pdf'):
+            texto = extraerTextoDePDF(ruta)
+
+    Args:
+        etapa (str): Nombre de la etapa (extraccion_pdf, embedding, chroma_insercion, llm, ...)
+        **etiquetas: Etiquetas adicionales (modelo='gpt-4o-mini', ...)
+    """
+    inicio = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        incrementarContador('etapa_errores_total', etapa=etapa, **etiquetas)
+        raise
+    finally:
+        duracion = time.perf_counter() - inicio
+        observarHistograma('etapa_duracion_segundos', duracion, etapa=etapa, **etiquetas)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("span %s", etapa, extra={'campos': {'etapa': etapa, 'duracion_ms': round(duracion * 1000, 3), 'error': error, **etiquetas}})
+
+def _formatearEtiquetas(etiquetas: Tuple[Tuple[str, str], ...]) -> str:
+    """Formatea etiquetas en sintaxis Prometheus."""
+    if not etiquetas:
+        return ""
+    pares = ','.join(f'{k}="{v}"' for k, v in etiquetas)
+    return '{' + pares + '}'
+
+def exportarMetricasPrometheus() -> str:
+    """
+    Exporta todas las métricas en formato de texto de Prometheus.
+
+    Returns:
+        str: Exposición en formato text/plain version 0.0.4
+    """
+    with _lock:
+        series = sorted(_contadores.items())
+        histogramas = sorted((clave, list(serie)) for clave, serie in _histogramas.items())
+
+    lineas = []
+    nombre_actual = None
+    for (nombre, etiquetas), valor in series:
+        if nombre != nombre_actual:
+            nombre_actual = nombre
+            if nombre in _descripciones:
+                lineas.append(f"# HELP {PREFIJO_METRICAS}_{nombre} {_descripciones[nombre]}")
+            lineas.append(f"# TYPE {PREFIJO_METRICAS}_{nombre} counter")
+        lineas.append(f"{PREFIJO_METRICAS}_{nombre}{_formatearEtiquetas(etiquetas)} {valor:g}")
+
+    nombre_actual = None
+    for (nombre, etiquetas), serie in histogramas:
+        if nombre != nombre_actual:
+            nombre_actual = nombre
+            if nombre in _descripciones:
+                lineas.append(f"# HELP {PREFIJO_METRICAS}_{nombre} {_descripciones[nombre]}")
+            lineas.append(f"# TYPE {PREFIJO_METRICAS}_{nombre} histogram")
+
+        acumulado = 0
+        for limite, conteo in zip(_buckets[nombre], serie):
+            acumulado += conteo
+            lineas.append(f"{PREFIJO_METRICAS}_{nombre}_bucket{_formatearEtiquetas(etiquetas + (('le', f'{limite:g}'),))} {acumulado:g}")
+        lineas.append(f"{PREFIJO_METRICAS}_{nombre}_bucket{_formatearEtiquetas(etiquetas + (('le', '+Inf'),))} {serie[-1]:g}")
+        lineas.append(f"{PREFIJO_METRICAS}_{nombre}_sum{_formatearEtiquetas(etiquetas)} {serie[-2]:g}")
+        lineas.append(f"{PREFIJO_METRICAS}_{nombre}_count{_formatearEtiquetas(etiquetas)} {serie[-1]:g}")
+
+    return '\n'.join(lineas) + '\n'
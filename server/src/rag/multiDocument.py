@@ -0,0 +1,251 @@
+import re
+import time
+import contextvars
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+from .config import ANALISIS_CONCURRENCIA_DOCUMENTOS, DOC_LARGO_MAX_RESUMEN
+from .pdfProcessor import PdfRecibido, extraerPaginasDePDF, unirPaginas, dividirTextoEnSpans
+from .artifactStore import cargarArtefacto, guardarArtefacto
+from .scoringLocal import PATRONES_PARTIDAS, extraerPartidasFinancieras, calcularRatios
+from .vectorStore import cargarDocumentosEnBaseDeConocimiento, idDeDocumento
+from .logs import obtenerLogger
+from .metrics import describirMetrica, incrementarContador, medirEtapa
+
+logger = obtenerLogger('multiDocument')
+
+describirMetrica('expediente_documentos_total', 'Documentos de expedientes multi-documento por tipo detectado')
+
+# Tipos de documento de un expediente de crédito, con las expresiones que los identifican
+# en el nombre del archivo o en el encabezado del texto
+PATRONES_TIPO = {
+    'declaracion_tributaria': [r'declaraci[oó]n\s+jurada', r'renta\s+anual', r'\bpdt\b', r'formulario\s+(?:virtual|7\d\d)'],
+    'estado_resultados': [r'estado\s+de\s+resultados', r'ganancias\s+y\s+p[eé]rdidas', r'estado\s+de\s+p[eé]rdidas', r'resultados\s+integrales'],
+    'balance_general': [r'balance\s+general', r'estado\s+de\s+situaci[oó]n\s+financiera', r'situaci[oó]n\s+financiera', r'\bbalance\b']
+}
+TIPO_POR_DEFECTO = 'estado_financiero'
+
+# Caracteres del inicio del texto donde se buscan el tipo y el periodo
+CARACTERES_ENCABEZADO = 3000
+
+# Partidas cuya variación entre ejercicios se informa en el resumen
+PARTIDAS_VARIACION = ('ventas', 'utilidad_neta', 'pasivo_total', 'patrimonio')
+
+_REGEX_ANIO = re.compile(r'(?<!\d)((?:19|20)\d{2})(?!\d)')
+_REGEX_PERIODO = re.compile(
+    r'(?:al\s+\d{1,2}\s+de\s+\w+\s+(?:de(?:l)?\s+)?|ejercicio\s+(?:fiscal\s+)?|periodo\s+(?:tributario\s+)?|período\s+|a[ñn]o\s+)((?:19|20)\d{2})'
+)
+
+def clasificarDocumento(archivo: str, texto: str) -> Tuple[str, Optional[str]]:
+    """
+    Detecta el tipo de documento y el ejercicio fiscal a partir del nombre y el encabezado.
+
+    Un documento con balance y estado de resultados juntos queda como
+    'estado_financiero'. El periodo se toma del nombre del archivo; si no
+    aparece, de expresiones como "al 31 de diciembre de 2023" o "ejercicio
+    2023" y, en último caso, del año más frecuente del encabezado.
+
+    Args:
+        archivo (str): Nombre del archivo
+        texto (str): Texto extraído del PDF
+
+    Returns:
+        Tuple[str, Optional[str]]: (tipo, periodo) con el periodo como año ('2023') o None
+    """
+    encabezado = texto[:CARACTERES_ENCABEZADO].lower()
+    nombre = archivo.lower().replace('_', ' ').replace('-', ' ')
+
+    tipo = TIPO_POR_DEFECTO
+    for fuente in (nombre, encabezado):
+        encontrados = [t for t, patrones in PATRONES_TIPO.items() if any(re.search(p, fuente) for p in patrones)]
+        if encontrados:
+            # Balance y resultados juntos: estados financieros completos
+            tipo = 'declaracion_tributaria' if 'declaracion_tributaria' in encontrados else \
+                encontrados[0] if len(encontrados) == 1 else TIPO_POR_DEFECTO
+            break
+
+    anios_nombre = _REGEX_ANIO.findall(nombre)
+    if anios_nombre:
+        return tipo, max(anios_nombre)
+    declarados = _REGEX_PERIODO.findall(encabezado)
+    if declarados:
+        return tipo, max(declarados)
+    anios = Counter(_REGEX_ANIO.findall(encabezado))
+    return tipo, anios.most_common(1)[0][0] if anios else None
+
+def procesarDocumento(pdf: PdfRecibido, archivo: str, empresa_id: Optional[str], coleccion,
+                      tipo: Optional[str] = None, periodo: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Extrae, clasifica e ingesta un documento del expediente.
+
+    Reutiliza el texto del almacén de artefactos si el PDF ya se procesó.
+
+    Args:
+        pdf (PdfRecibido): PDF recibido
+        archivo (str): Nombre del archivo
+        empresa_id (str): Empresa dueña del documento
+        coleccion (chromadb.Collection): Colección donde se ingesta
+        tipo (str): Tipo declarado por el cliente; por defecto se detecta
+        periodo (str): Ejercicio declarado por el cliente; por defecto se detecta
+
+    Returns:
+        Dict[str, Any]: archivo, sha256, tipo, periodo, partidas, documentoId, chunks, cache y duracion_s
+    """
+    inicio = time.time()
+    artefacto = cargarArtefacto(pdf.hash)
+    paginas = artefacto['paginas'] if artefacto else extraerPaginasDePDF(pdf.origen)
+    texto = unirPaginas(paginas)
+    if not texto.strip():
+        raise ValueError(f"El PDF {archivo} no contiene texto extraíble")
+    spans = artefacto['spans'] if artefacto else dividirTextoEnSpans(texto)
+    if not artefacto:
+        guardarArtefacto(pdf.hash, paginas, spans, (1000, 200))
+
+    tipo_detectado, periodo_detectado = clasificarDocumento(archivo, texto)
+    tipo = tipo or tipo_detectado
+    periodo = str(periodo) if periodo else periodo_detectado
+    incrementarContador('expediente_documentos_total', tipo=tipo)
+
+    metadatos = {'tipo': tipo, 'periodo': periodo, 'archivo': archivo, 'sha256': pdf.hash, 'empresa_id': empresa_id}
+    cargarDocumentosEnBaseDeConocimiento(coleccion, [{
+        'contenido': texto,
+        'chunks': [texto[a:b] for a, b in spans],
+        'metadatos': metadatos
+    }])
+
+    return {
+        'archivo': archivo,
+        'sha256': pdf.hash,
+        'tipo': tipo,
+        'periodo': periodo,
+        'partidas': extraerPartidasFinancieras(texto),
+        'documentoId': idDeDocumento(texto, metadatos),
+        'chunks': len(spans),
+        'cache': 'texto' if artefacto else 'ninguno',
+        'duracion_s': round(time.time() - inicio, 3)
+    }
+
+def procesarDocumentosEnParalelo(entradas: List[Dict[str, Any]], empresa_id: Optional[str], coleccion,
+                                 concurrencia: int = ANALISIS_CONCURRENCIA_DOCUMENTOS) -> List[Dict[str, Any]]:
+    """
+    Procesa los documentos de un expediente en paralelo (extracción, artefactos e ingesta).
+
+    La latencia queda cerca de la del documento más lento en vez de la suma.
+    Un documento que falla se informa con su error sin detener a los demás.
+
+    Args:
+        entradas (List[Dict]): 'pdf' (PdfRecibido), 'archivo' y opcionalmente 'tipo' y 'periodo'
+        empresa_id (str): Empresa dueña de los documentos
+        coleccion (chromadb.Collection): Colección donde se ingestan
+        concurrencia (int): Documentos procesándose a la vez
+
+    Returns:
+        List[Dict]: Un resultado por entrada, en el mismo orden (con 'error' si falló)
+    """
+    def procesar(entrada):
+        try:
+            return procesarDocumento(entrada['pdf'], entrada['archivo'], empresa_id, coleccion,
+                                     tipo=entrada.get('tipo'), periodo=entrada.get('periodo'))
+        except Exception as e:
+            logger.warning(f"Error al procesar un documento del expediente: {str(e)}", extra={'campos': {'archivo': entrada['archivo']}})
+            return {'archivo': entrada['archivo'], 'sha256': entrada['pdf'].hash, 'error': str(e)}
+
+    # Cada tarea corre en una copia del contexto para conservar el request ID y la prioridad del LLM
+    with medirEtapa('expediente_documentos'), ThreadPoolExecutor(max_workers=max(1, concurrencia)) as pool:
+        futuros = [pool.submit(contextvars.copy_context().run, procesar, entrada) for entrada in entradas]
+        return [futuro.result() for futuro in futuros]
+
+def consolidarPeriodos(documentos: List[Dict[str, Any]]) -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    Reúne las partidas de los documentos por ejercicio.
+
+    Dentro de un ejercicio cada partida toma el primer valor encontrado,
+    priorizando el balance para las cuentas de situación y el estado de
+    resultados para ventas y utilidad.
+
+    Args:
+        documentos (List[Dict]): Resultados de procesarDocumento
+
+    Returns:
+        Dict[str, Dict]: Partidas por periodo ('sin_periodo' si no se detectó), del más antiguo al más reciente
+    """
+    prioridad = {'balance_general': 0, 'estado_resultados': 1, TIPO_POR_DEFECTO: 2, 'declaracion_tributaria': 3}
+    de_resultados = {'ventas', 'utilidad_neta'}
+    periodos: Dict[str, Dict[str, Optional[float]]] = {}
+
+    for documento in documentos:
+        if 'error' in documento:
+            continue
+        periodo = documento['periodo'] or 'sin_periodo'
+        periodos.setdefault(periodo, {partida: None for partida in PATRONES_PARTIDAS})
+
+    for periodo, partidas in periodos.items():
+        del_periodo = [d for d in documentos if 'error' not in d and (d['periodo'] or 'sin_periodo') == periodo]
+        for partida in partidas:
+            orden = sorted(del_periodo, key=lambda d: (
+                (0 if d['tipo'] == 'estado_resultados' else 1) if partida in de_resultados else prioridad.get(d['tipo'], 2)
+            ))
+            partidas[partida] = next((d['partidas'][partida] for d in orden if d['partidas'].get(partida) is not None), None)
+
+    return dict(sorted(periodos.items(), key=lambda item: (item[0] == 'sin_periodo', item[0])))
+
+def _variacion(anterior: Optional[float], actual: Optional[float]) -> Optional[float]:
+    if anterior is None or actual is None or anterior == 0:
+        return None
+    return (actual - anterior) / abs(anterior)
+
+def construirResumenMultiperiodo(documentos: List[Dict[str, Any]], periodos: Dict[str, Dict[str, Optional[float]]]) -> str:
+    """
+    Resumen compacto del expediente para la llamada de scoring: documentos,
+    cifras y ratios por ejercicio y variaciones entre ejercicios consecutivos.
+    Su tamaño no depende del largo de los documentos.
+
+    Args:
+        documentos (List[Dict]): Resultados de procesarDocumento
+        periodos (Dict): Resultado de consolidarPeriodos
+
+    Returns:
+        str: Resumen acotado a DOC_LARGO_MAX_RESUMEN caracteres
+    """
+    validos = [d for d in documentos if 'error' not in d]
+    lineas = [f"Expediente de {len(validos)} documentos y {len(periodos)} ejercicios."]
+    lineas.append("Documentos: " + "; ".join(f"{d['tipo']} {d['periodo'] or 's/p'}" for d in validos))
+
+    # Del ejercicio más reciente al más antiguo: si el resumen se recorta, se pierde lo más viejo
+    for periodo, partidas in reversed(list(periodos.items())):
+        cifras = ", ".join(f"{partida}={valor:,.0f}" for partida, valor in partidas.items() if valor is not None)
+        lineas.append(f"Ejercicio {periodo}: {cifras or 'sin cifras detectadas'}")
+        ratios = calcularRatios(partidas)
+        if ratios:
+            lineas.append(f"  Ratios {periodo}: " + ", ".join(f"{nombre}={valor:.2f}" for nombre, valor in ratios.items()))
+
+    con_periodo = [p for p in periodos if p != 'sin_periodo']
+    variaciones = []
+    for anterior, actual in zip(con_periodo, con_periodo[1:]):
+        for partida in PARTIDAS_VARIACION:
+            cambio = _variacion(periodos[anterior][partida], periodos[actual][partida])
+            if cambio is not None:
+                variaciones.append(f"{partida} {anterior}->{actual}: {cambio * 100:+.1f}%")
+    if variaciones:
+        lineas.append("Variaciones: " + "; ".join(variaciones))
+
+    return '\n'.join(lineas)[:DOC_LARGO_MAX_RESUMEN]
+
+def partidasMasRecientes(periodos: Dict[str, Dict[str, Optional[float]]]) -> Dict[str, Optional[float]]:
+    """
+    Partidas del último ejercicio, para las reglas locales de scoring.
+
+    No se completan con cifras de otros ejercicios: un ratio que mezcla años
+    (p. ej. pasivo actual sobre patrimonio de hace dos años) no describe a la
+    empresa. Las partidas que falten quedan en None y sus ratios no se calculan.
+    Los documentos sin periodo solo se usan si ninguno tiene periodo.
+
+    Args:
+        periodos (Dict): Resultado de consolidarPeriodos
+
+    Returns:
+        Dict[str, Optional[float]]: Partidas del ejercicio más reciente
+    """
+    con_periodo = [periodo for periodo in periodos if periodo != 'sin_periodo']
+    ultimo = periodos[con_periodo[-1]] if con_periodo else periodos.get('sin_periodo') or {}
+    return {partida: ultimo.get(partida) for partida in PATRONES_PARTIDAS}
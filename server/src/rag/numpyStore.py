@@ -0,0 +1,341 @@
+import os
+import json
+import shutil
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
+from .logs import obtenerLogger
+
+# numpy se importa al abrir la primera colección
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = obtenerLogger('numpyStore')
+
+# Filas por bloque al calcular similitudes (acota la memoria temporal por consulta)
+FILAS_POR_BLOQUE = 2048
+
+TIPOS = ('float16', 'int8')
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS filas (
+    fila INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    documento TEXT,
+    metadatos TEXT,
+    vivo INTEGER NOT NULL DEFAULT 1
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_filas_vivas ON filas (id) WHERE vivo = 1;
+CREATE TABLE IF NOT EXISTS estado (clave TEXT PRIMARY KEY, valor INTEGER NOT NULL);
+INSERT OR IGNORE INTO estado (clave, valor) VALUES ('version', 0);
+"""
+
+_local = threading.local()
+_lock_vistas = threading.Lock()
+_vistas: Dict[Any, Dict[str, Any]] = {}
+
+def existeColeccion(raiz: str, nombre: str) -> bool:
+    """Indica si existe una colección NumPy con ese nombre."""
+    return os.path.exists(os.path.join(raiz, nombre, 'coleccion.json'))
+
+def crearColeccion(raiz: str, nombre: str, metadata: Dict[str, Any], tipo: str = 'float16') -> 'ColeccionNumpy':
+    """
+    Crea una colección NumPy vacía.
+
+    Args:
+        raiz (str): Carpeta de las colecciones NumPy
+        nombre (str): Nombre de la colección
+        metadata (Dict): Metadatos de la colección
+        tipo (str): 'float16' o 'int8' (cuantizado con escala por fila)
+
+    Returns:
+        ColeccionNumpy: Colección creada
+    """
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de vector no soportado: {tipo}")
+    if existeColeccion(raiz, nombre):
+        raise ValueError(f"La colección {nombre} ya existe")
+
+    carpeta = os.path.join(raiz, nombre)
+    os.makedirs(carpeta, exist_ok=True)
+    info = {'nombre': nombre, 'uid': uuid.uuid4().hex, 'metadata': {**metadata, 'espacio': 'cosine', 'tipo_vector': tipo}, 'tipo': tipo, 'dimensiones': None}
+    ruta_parcial = os.path.join(carpeta, f"coleccion.json.{os.getpid()}.parcial")
+    with open(ruta_parcial, 'w', encoding='utf-8') as f:
+        json.dump(info, f, ensure_ascii=False)
+    os.replace(ruta_parcial, os.path.join(carpeta, 'coleccion.json'))
+    return ColeccionNumpy(carpeta)
+
+def eliminarColeccion(raiz: str, nombre: str):
+    """Elimina una colección NumPy y sus archivos."""
+    if not existeColeccion(raiz, nombre):
+        raise ValueError(f"Collection {nombre} does not exist.")
+    carpeta = os.path.join(raiz, nombre)
+    # Primero el descriptor, para que nadie la abra a medio borrar
+    os.remove(os.path.join(carpeta, 'coleccion.json'))
+    shutil.rmtree(carpeta, ignore_errors=True)
+
+class ColeccionNumpy:
+    """
+    Colección de vectores en una matriz de solo anexado, mapeada en memoria.
+
+    Los embeddings se guardan en float16 (o int8 con una escala por fila) en
+    vectores.bin y los IDs, documentos y metadatos en una tabla SQLite. Las
+    consultas son exactas: producto punto vectorizado contra toda la matriz.
+    Los procesos que leen la misma colección comparten las páginas de la
+    matriz a través de la caché del sistema operativo.
+
+    Expone el subconjunto de la API de chromadb.Collection que usa vectorStore
+    (count, upsert, delete, get, query, name y metadata).
+    """
+
+    def __init__(self, carpeta: str):
+        self.carpeta = carpeta
+        self._leerDescriptor()
+
+    def _leerDescriptor(self):
+        with open(os.path.join(self.carpeta, 'coleccion.json'), 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        self.name = info['nombre']
+        self.uid = info['uid']
+        self.metadata = info['metadata']
+        self.tipo = info['tipo']
+        self.dimensiones = info['dimensiones']
+
+    # --- Almacenamiento ---
+
+    def _ruta(self, nombre: str) -> str:
+        return os.path.join(self.carpeta, nombre)
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Conexión SQLite del hilo actual para esta colección."""
+        conexiones = getattr(_local, 'conexiones', None)
+        if conexiones is None or _local.pid != os.getpid():
+            conexiones = _local.conexiones = {}
+            _local.pid = os.getpid()
+        # La clave incluye el uid: una colección recreada con el mismo nombre usa otro archivo
+        conexion = conexiones.get(self.uid)
+        if conexion is None:
+            conexion = sqlite3.connect(self._ruta('filas.sqlite3'), timeout=30, isolation_level=None)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.executescript(_ESQUEMA)
+            conexiones[self.uid] = conexion
+        return conexion
+
+    @contextmanager
+    def _escritura(self):
+        """Bloqueo exclusivo entre procesos e hilos para anexar o borrar filas."""
+        import fcntl
+
+        with open(self._ruta('escritura.lock'), 'a') as candado:
+            fcntl.flock(candado, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(candado, fcntl.LOCK_UN)
+
+    def _fijarDimensiones(self, dimensiones: int):
+        """La primera inserción fija la dimensión de la colección."""
+        with open(self._ruta('coleccion.json'), 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        if info['dimensiones'] is None:
+            info['dimensiones'] = dimensiones
+            ruta_parcial = self._ruta(f"coleccion.json.{os.getpid()}.parcial")
+            with open(ruta_parcial, 'w', encoding='utf-8') as f:
+                json.dump(info, f, ensure_ascii=False)
+            os.replace(ruta_parcial, self._ruta('coleccion.json'))
+        self.dimensiones = info['dimensiones']
+
+    def _codificar(self, matriz: 'np.ndarray'):
+        """Normaliza y convierte los vectores al tipo de la colección; retorna (filas, escalas)."""
+        import numpy as np
+
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        matriz = matriz / np.where(normas == 0, 1, normas)
+        if self.tipo == 'float16':
+            return matriz.astype(np.float16), None
+        maximos = np.abs(matriz).max(axis=1)
+        escalas = np.where(maximos == 0, 1, maximos / 127).astype(np.float32)
+        return np.round(matriz / escalas[:, None]).astype(np.int8), escalas
+
+    def _vista(self) -> Dict[str, Any]:
+        """
+        Matriz mapeada y filas vivas, recargadas solo si la colección cambió
+        (la tabla estado lleva un contador de versión).
+        """
+        import numpy as np
+
+        conexion = self._conexion()
+        version = conexion.execute("SELECT valor FROM estado WHERE clave = 'version'").fetchone()[0]
+        clave = (os.getpid(), self.uid)
+        vista = _vistas.get(clave)
+        if vista is not None and vista['version'] == version:
+            return vista
+
+        with _lock_vistas:
+            filas = conexion.execute("SELECT COALESCE(MAX(fila) + 1, 0) FROM filas").fetchone()[0]
+            vivas = np.fromiter((f for (f,) in conexion.execute("SELECT fila FROM filas WHERE vivo = 1")), dtype=np.int64)
+            if self.dimensiones is None and filas:
+                # Otro proceso hizo la primera inserción
+                self._leerDescriptor()
+
+            vista = {'version': version, 'filas': filas, 'matriz': None, 'escalas': None, 'vivo': np.zeros(filas, dtype=bool)}
+            vista['vivo'][vivas] = True
+            if filas:
+                vista['matriz'] = np.memmap(self._ruta('vectores.bin'), dtype=self.tipo, mode='r', shape=(filas, self.dimensiones))
+                if self.tipo == 'int8':
+                    vista['escalas'] = np.memmap(self._ruta('escalas.bin'), dtype=np.float32, mode='r', shape=(filas,))
+            _vistas[clave] = vista
+        return vista
+
+    # --- API compatible con chromadb.Collection ---
+
+    def count(self) -> int:
+        return self._conexion().execute("SELECT COUNT(*) FROM filas WHERE vivo = 1").fetchone()[0]
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Dict[str, Any]]] = None):
+        """Anexa los vectores; los IDs existentes quedan reemplazados por las filas nuevas."""
+        import numpy as np
+
+        matriz = np.asarray(embeddings, dtype=np.float32)
+        if matriz.ndim != 2 or len(matriz) != len(ids):
+            raise ValueError("Se esperaba un embedding por ID")
+
+        with self._escritura():
+            self._fijarDimensiones(matriz.shape[1])
+            if matriz.shape[1] != self.dimensiones:
+                raise ValueError(f"Embedding de dimensión {matriz.shape[1]}, la colección usa {self.dimensiones}")
+            codificados, escalas = self._codificar(matriz)
+
+            conexion = self._conexion()
+            conexion.execute('BEGIN IMMEDIATE')
+            try:
+                inicio = conexion.execute("SELECT COALESCE(MAX(fila) + 1, 0) FROM filas").fetchone()[0]
+
+                # Se escribe desde la última fila confirmada: restos de una escritura fallida se sobrescriben
+                for nombre, datos, ancho in (('vectores.bin', codificados, codificados.itemsize * self.dimensiones),
+                                             ('escalas.bin', escalas, 4)):
+                    if datos is None:
+                        continue
+                    with open(self._ruta(nombre), 'ab') as f:
+                        pass
+                    with open(self._ruta(nombre), 'r+b') as f:
+                        f.seek(inicio * ancho)
+                        f.write(datos.tobytes())
+                        f.truncate()
+
+                marcadores = ','.join('?' * len(ids))
+                conexion.execute(f"UPDATE filas SET vivo = 0 WHERE vivo = 1 AND id IN ({marcadores})", ids)
+                conexion.executemany(
+                    "INSERT INTO filas (fila, id, documento, metadatos) VALUES (?, ?, ?, ?)",
+                    [
+                        (inicio + i, chunk_id,
+                         documents[i] if documents else None,
+                         json.dumps(metadatas[i], ensure_ascii=False) if metadatas else None)
+                        for i, chunk_id in enumerate(ids)
+                    ]
+                )
+                conexion.execute("UPDATE estado SET valor = valor + 1 WHERE clave = 'version'")
+                conexion.execute('COMMIT')
+            except Exception:
+                conexion.execute('ROLLBACK')
+                raise
+
+    add = upsert
+
+    def delete(self, ids: List[str]):
+        """Marca las filas como borradas; el espacio se recupera al compactar."""
+        if not ids:
+            return
+        with self._escritura():
+            conexion = self._conexion()
+            marcadores = ','.join('?' * len(ids))
+            conexion.execute('BEGIN IMMEDIATE')
+            conexion.execute(f"UPDATE filas SET vivo = 0 WHERE vivo = 1 AND id IN ({marcadores})", ids)
+            conexion.execute("UPDATE estado SET valor = valor + 1 WHERE clave = 'version'")
+            conexion.execute('COMMIT')
+
+    def _decodificar(self, vista: Dict[str, Any], filas: List[int]) -> List[List[float]]:
+        import numpy as np
+
+        vectores = np.asarray(vista['matriz'][filas], dtype=np.float32)
+        if vista['escalas'] is not None:
+            vectores *= np.asarray(vista['escalas'][filas])[:, None]
+        return vectores.tolist()
+
+    def _resultado(self, filas: List[int], include: List[str], vista: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Arma la respuesta con el formato de ChromaDB para las filas indicadas."""
+        conexion = self._conexion()
+        datos = {}
+        for inicio in range(0, len(filas), 500):
+            lote = filas[inicio:inicio + 500]
+            marcadores = ','.join('?' * len(lote))
+            for fila, chunk_id, documento, metadatos in conexion.execute(
+                f"SELECT fila, id, documento, metadatos FROM filas WHERE fila IN ({marcadores})", lote
+            ):
+                datos[fila] = (chunk_id, documento, json.loads(metadatos) if metadatos else None)
+
+        return {
+            'ids': [datos[f][0] for f in filas],
+            'documents': [datos[f][1] for f in filas] if 'documents' in include else None,
+            'metadatas': [datos[f][2] for f in filas] if 'metadatas' in include else None,
+            'embeddings': self._decodificar(vista or self._vista(), filas) if 'embeddings' in include and filas else
+                          ([] if 'embeddings' in include else None)
+        }
+
+    def get(self, ids: Optional[List[str]] = None, limit: Optional[int] = None, offset: Optional[int] = None,
+            include: List[str] = ['documents', 'metadatas']) -> Dict[str, Any]:
+        """Recupera filas vivas por ID o por posición (en orden de inserción)."""
+        conexion = self._conexion()
+        vista = self._vista()
+        if ids is not None:
+            marcadores = ','.join('?' * len(ids)) or "''"
+            filas = [f for (f,) in conexion.execute(f"SELECT fila FROM filas WHERE vivo = 1 AND id IN ({marcadores})", ids)]
+        else:
+            filas = [f for (f,) in conexion.execute(
+                "SELECT fila FROM filas WHERE vivo = 1 AND fila < ? ORDER BY fila LIMIT ? OFFSET ?",
+                (vista['filas'], limit if limit is not None else -1, offset or 0)
+            )]
+        return self._resultado(filas, include, vista)
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10,
+              include: List[str] = ['documents', 'metadatas', 'distances']) -> Dict[str, Any]:
+        """
+        Top-k exacto por similitud coseno; las distancias se informan como 1 - coseno
+        (espacio 'cosine' de ChromaDB).
+        """
+        import numpy as np
+
+        vista = self._vista()
+        respuesta = {'ids': [], 'documents': [], 'metadatas': [], 'distances': [], 'embeddings': None}
+        consultas = np.asarray(query_embeddings, dtype=np.float32)
+        if self.dimensiones is not None and consultas.shape[1] != self.dimensiones:
+            raise ValueError(f"Consulta de dimensión {consultas.shape[1]}, la colección usa {self.dimensiones}")
+
+        for consulta in consultas:
+            norma = np.linalg.norm(consulta)
+            consulta = consulta / norma if norma else consulta
+            similitudes = np.full(vista['filas'], -np.inf, dtype=np.float32)
+            for inicio in range(0, vista['filas'], FILAS_POR_BLOQUE):
+                bloque = np.asarray(vista['matriz'][inicio:inicio + FILAS_POR_BLOQUE], dtype=np.float32)
+                puntajes = bloque @ consulta
+                if vista['escalas'] is not None:
+                    puntajes *= vista['escalas'][inicio:inicio + FILAS_POR_BLOQUE]
+                similitudes[inicio:inicio + len(puntajes)] = puntajes
+            similitudes[~vista['vivo']] = -np.inf
+
+            k = min(n_results, int(vista['vivo'].sum()))
+            if k == 0:
+                mejores = []
+            else:
+                candidatas = np.argpartition(-similitudes, k - 1)[:k]
+                mejores = candidatas[np.argsort(-similitudes[candidatas])].tolist()
+
+            resultado = self._resultado(mejores, include, vista)
+            respuesta['ids'].append(resultado['ids'])
+            respuesta['documents'].append(resultado['documents'])
+            respuesta['metadatas'].append(resultado['metadatas'])
+            respuesta['distances'].append([float(1 - similitudes[f]) for f in mejores])
+        return respuesta
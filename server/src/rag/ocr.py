@@ -0,0 +1,171 @@
+import os
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, List
+from .config import contextoDeProcesos, inicializarProcesoHijo, OCR_IDIOMA, OCR_PROCESOS, OCR_MIN_CARACTERES, OCR_DPI_MIN, OCR_DPI_MAX, OCR_MAX_PIXELES
+from .artifactStore import cargarTextoOcr, guardarTextoOcr
+from .logs import obtenerLogger
+from .metrics import describirMetrica, incrementarContador, medirEtapa
+
+if TYPE_CHECKING:
+    import fitz
+
+logger = obtenerLogger('ocr')
+
+describirMetrica('ocr_paginas_total', 'Páginas sin capa de texto por resultado (cache, ocr, error, sin_motor)')
+
+_lock_pool = threading.Lock()
+_pools = {}
+
+@lru_cache(maxsize=1)
+def ocrDisponible() -> bool:
+    """Indica si pytesseract y el binario de Tesseract están instalados (se comprueba una vez)."""
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+def paginaRequiereOcr(pagina: 'fitz.Page', texto: str) -> bool:
+    """
+    Detecta una página escaneada: casi sin texto extraíble pero con imágenes.
+
+    Args:
+        pagina (fitz.Page): Página del documento
+        texto (str): Texto ya extraído de la capa de texto
+
+    Returns:
+        bool: True si conviene pasar la página por OCR
+    """
+    return len(texto.strip()) < OCR_MIN_CARACTERES and bool(pagina.get_images(full=False))
+
+def calcularDpi(pagina: 'fitz.Page') -> int:
+    """
+    Elige la resolución de rasterizado de una página.
+
+    Usa la resolución nativa de la imagen escaneada más grande (rasterizar por
+    encima no agrega información), acotada a [OCR_DPI_MIN, OCR_DPI_MAX] y a
+    OCR_MAX_PIXELES en el lado más largo.
+
+    Args:
+        pagina (fitz.Page): Página del documento
+
+    Returns:
+        int: DPI de rasterizado
+    """
+    dpi = OCR_DPI_MAX
+    mayor_area = 0
+    for imagen in pagina.get_image_info():
+        x0, y0, x1, y1 = imagen['bbox']
+        ancho_pt, alto_pt = max(x1 - x0, 1), max(y1 - y0, 1)
+        if ancho_pt * alto_pt > mayor_area:
+            mayor_area = ancho_pt * alto_pt
+            dpi = max(imagen['width'] / (ancho_pt / 72), imagen['height'] / (alto_pt / 72))
+
+    lado_mayor_pt = max(pagina.rect.width, pagina.rect.height, 1)
+    dpi = min(dpi, OCR_MAX_PIXELES / (lado_mayor_pt / 72))
+    return int(max(OCR_DPI_MIN, min(OCR_DPI_MAX, dpi)))
+
+def hashDePagina(doc: 'fitz.Document', pagina: 'fitz.Page', dpi: int) -> str:
+    """
+    Hash del contenido de la página (flujo de contenido e imágenes), el DPI y
+    el idioma: identifica el resultado del OCR sin rasterizar.
+    """
+    sha = hashlib.sha256()
+    sha.update(f"{dpi}|{OCR_IDIOMA}|".encode('utf-8'))
+    sha.update(pagina.read_contents() or b'')
+    for imagen in pagina.get_images(full=False):
+        sha.update(doc.xref_stream_raw(imagen[0]) or b'')
+    return sha.hexdigest()
+
+def _ocrImagen(png: bytes, idioma: str) -> str:
+    """Ejecuta Tesseract sobre una imagen PNG (corre en un proceso del pool)."""
+    import io
+    import pytesseract
+    from PIL import Image
+
+    with Image.open(io.BytesIO(png)) as imagen:
+        return pytesseract.image_to_string(imagen, lang=idioma)
+
+def _obtenerPool() -> ProcessPoolExecutor:
+    """Pool de procesos de OCR compartido por el proceso (recreado tras un fork)."""
+    pid = os.getpid()
+    with _lock_pool:
+        if pid not in _pools:
+            _pools[pid] = ProcessPoolExecutor(max_workers=OCR_PROCESOS, mp_context=contextoDeProcesos(),
+                                              initializer=inicializarProcesoHijo)
+        return _pools[pid]
+
+def aplicarOcr(doc: 'fitz.Document', paginas: List[str], forzar: bool = False) -> List[str]:
+    """
+    Completa con OCR el texto de las páginas sin capa de texto.
+
+    Solo se rasterizan las páginas escaneadas que no están en la cache de OCR;
+    Tesseract corre en paralelo en un pool de procesos. Dentro de un worker de
+    otro pool (p. ej. el procesamiento por lotes) el OCR es secuencial para no
+    multiplicar procesos.
+
+    Args:
+        doc (fitz.Document): Documento abierto
+        paginas (List[str]): Texto extraído de cada página
+        forzar (bool): OCR de todas las páginas con imágenes, tengan o no texto
+
+    Returns:
+        List[str]: Texto de cada página, con el OCR donde corresponda
+    """
+    candidatas = [
+        num for num, texto in enumerate(paginas)
+        if (forzar and doc[num].get_images(full=False)) or paginaRequiereOcr(doc[num], texto)
+    ]
+    if not candidatas:
+        return paginas
+
+    if not ocrDisponible():
+        incrementarContador('ocr_paginas_total', len(candidatas), resultado='sin_motor')
+        logger.warning("Páginas escaneadas sin OCR: pytesseract/Tesseract no está instalado",
+                       extra={'campos': {'paginas': len(candidatas)}})
+        return paginas
+
+    resultado = list(paginas)
+    pendientes = []
+
+    with medirEtapa('ocr'):
+        for num in candidatas:
+            pagina = doc[num]
+            dpi = calcularDpi(pagina)
+            clave = hashDePagina(doc, pagina, dpi)
+
+            texto = cargarTextoOcr(clave)
+            if texto is not None:
+                resultado[num] = texto
+                incrementarContador('ocr_paginas_total', resultado='cache')
+                continue
+
+            png = pagina.get_pixmap(dpi=dpi, colorspace='gray').tobytes('png')
+            pendientes.append((num, clave, png))
+
+        if pendientes:
+            if multiprocessing.parent_process() is not None:
+                futuros = None
+            else:
+                pool = _obtenerPool()
+                futuros = [pool.submit(_ocrImagen, png, OCR_IDIOMA) for _, _, png in pendientes]
+
+            for i, (num, clave, png) in enumerate(pendientes):
+                try:
+                    texto = futuros[i].result() if futuros else _ocrImagen(png, OCR_IDIOMA)
+                except Exception as e:
+                    incrementarContador('ocr_paginas_total', resultado='error')
+                    logger.error(f"Error de OCR en la página {num + 1}: {str(e)}")
+                    continue
+
+                resultado[num] = texto
+                guardarTextoOcr(clave, texto)
+                incrementarContador('ocr_paginas_total', resultado='ocr')
+
+    logger.info("OCR aplicado", extra={'campos': {'paginas_escaneadas': len(candidatas), 'ocr_ejecutado': len(pendientes)}})
+    return resultado
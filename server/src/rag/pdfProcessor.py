@@ -1,58 +1,219 @@
-import fitz  # PyMuPDF
 import os
-from typing import List, Dict
+import shutil
+import hashlib
+import tempfile
+from typing import BinaryIO, List, Dict, Optional, Tuple, Union
+from .config import PDF_UMBRAL_MEMORIA_BYTES, OCR_HABILITADO
+from .logs import obtenerLogger
+from .metrics import describirMetrica, incrementarContador, medirEtapa
 
-def extraerTextoDePDF(ruta_pdf: str) -> str:
+logger = obtenerLogger('pdfProcessor')
+
+describirMetrica('pdf_bytes_copiados_total', 'Bytes de PDFs subidos copiados por destino (memoria, temporal, retencion)')
+
+TAMANO_BLOQUE_LECTURA = 64 * 1024
+
+class PdfRecibido:
+    """PDF subido, en memoria o en un archivo temporal si supera el umbral."""
+
+    def __init__(self):
+        self.contenido: Optional[bytearray] = bytearray()
+        self.ruta_temporal: Optional[str] = None
+        self.sha256 = hashlib.sha256()
+        self.tamano = 0
+        self.bytes_copiados = 0
+
+    @property
+    def hash(self) -> str:
+        return self.sha256.hexdigest()
+
+    @property
+    def origen(self) -> Union[str, bytearray]:
+        """Bytes en memoria o ruta del temporal, aceptados por extraerTextoDePDF."""
+        return self.ruta_temporal or self.contenido
+
+    def cerrar(self):
+        """Libera la memoria y elimina el archivo temporal, si existe."""
+        self.contenido = None
+        if self.ruta_temporal:
+            try:
+                os.remove(self.ruta_temporal)
+            except OSError:
+                pass
+            self.ruta_temporal = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
+
+def recibirPdf(stream: BinaryIO, umbral_memoria: int = PDF_UMBRAL_MEMORIA_BYTES) -> PdfRecibido:
     """
-    Extrae todo el texto de un archivo PDF.
-    
+    Lee un PDF subido en una sola pasada, calculando su SHA-256.
+
+    Hasta umbral_memoria bytes el PDF queda en memoria; por encima se vuelca
+    a un archivo temporal propio de la petición (nunca al nombre del usuario),
+    así que subidas concurrentes con el mismo nombre no se pisan.
+
     Args:
-        ruta_pdf (str): Ruta al archivo PDF
-        
+        stream (BinaryIO): Stream del archivo subido
+        umbral_memoria (int): Tamaño máximo a mantener en memoria
+
     Returns:
-        str: Texto extraído del PDF
+        PdfRecibido: PDF listo para extraerTextoDePDF(pdf.origen)
     """
+    pdf = PdfRecibido()
+    archivo_temporal = None
+
     try:
-        # Abrir el documento PDF
-        doc = fitz.open(ruta_pdf)
-        texto_completo = ""
+        while True:
+            bloque = stream.read(TAMANO_BLOQUE_LECTURA)
+            if not bloque:
+                break
+            pdf.sha256.update(bloque)
+            pdf.tamano += len(bloque)
+
+            if archivo_temporal is None and pdf.tamano > umbral_memoria:
+                # Volcar lo acumulado y seguir escribiendo en disco
+                archivo_temporal = tempfile.NamedTemporaryFile(prefix='pdf_', suffix='.pdf', delete=False)
+                pdf.ruta_temporal = archivo_temporal.name
+                archivo_temporal.write(pdf.contenido)
+                pdf.bytes_copiados += len(pdf.contenido)
+                pdf.contenido = None
+
+            if archivo_temporal is not None:
+                archivo_temporal.write(bloque)
+            else:
+                pdf.contenido += bloque
+            pdf.bytes_copiados += len(bloque)
+    except Exception:
+        if archivo_temporal is not None:
+            archivo_temporal.close()
+        pdf.cerrar()
+        raise
+
+    if archivo_temporal is not None:
+        archivo_temporal.close()
+        incrementarContador('pdf_bytes_copiados_total', pdf.bytes_copiados, destino='temporal')
+    else:
+        incrementarContador('pdf_bytes_copiados_total', pdf.bytes_copiados, destino='memoria')
+
+    return pdf
+
+def retenerPdf(pdf: PdfRecibido, carpeta: str) -> str:
+    """
+    Guarda el PDF con su hash como nombre (almacenamiento direccionado por contenido).
+
+    Un PDF ya retenido no se vuelve a escribir; la escritura es atómica.
+
+    Args:
+        pdf (PdfRecibido): PDF recibido
+        carpeta (str): Carpeta de retención
+
+    Returns:
+        str: Ruta del PDF retenido
+    """
+    ruta = os.path.join(carpeta, f"{pdf.hash}.pdf")
+    if os.path.exists(ruta):
+        return ruta
+
+    os.makedirs(carpeta, exist_ok=True)
+    ruta_parcial = f"{ruta}.{os.getpid()}.parcial"
+    if pdf.ruta_temporal:
+        shutil.copyfile(pdf.ruta_temporal, ruta_parcial)
+    else:
+        with open(ruta_parcial, 'wb') as f:
+            f.write(pdf.contenido)
+    os.replace(ruta_parcial, ruta)
+
+    incrementarContador('pdf_bytes_copiados_total', pdf.tamano, destino='retencion')
+    return ruta
+
+def extraerPaginasDePDF(ruta_pdf: Union[str, bytes, bytearray], ocr: bool = OCR_HABILITADO, forzar_ocr: bool = False) -> List[str]:
+    """
+    Extrae el texto sin limpiar de cada página de un PDF.
+    
+    Las páginas escaneadas (sin capa de texto) se pasan por OCR si está habilitado.
+    
+    Args:
+        ruta_pdf (str | bytes): Ruta al archivo PDF o su contenido en memoria
+        ocr (bool): Aplicar OCR a las páginas sin capa de texto
+        forzar_ocr (bool): Aplicar OCR a toda página con imágenes
         
-        # Iterar por todas las páginas
-        for num_pagina in range(doc.page_count):
-            pagina = doc[num_pagina]
-            texto_pagina = pagina.get_text()
-            texto_completo += f"\n--- Página {num_pagina + 1} ---\n"
-            texto_completo += texto_pagina
+    Returns:
+        List[str]: Texto de cada página, en orden
+    """
+    import fitz  # PyMuPDF, se importa en el primer uso
+    
+    with medirEtapa('extraccion_pdf'):
+        # Abrir el documento PDF (desde disco o desde memoria, sin copia a disco)
+        if isinstance(ruta_pdf, (bytes, bytearray)):
+            doc = fitz.open(stream=ruta_pdf, filetype='pdf')
+        else:
+            doc = fitz.open(ruta_pdf)
         
-        doc.close()
+        try:
+            paginas = [doc[num_pagina].get_text() for num_pagina in range(doc.page_count)]
+            if ocr or forzar_ocr:
+                from .ocr import aplicarOcr
+                paginas = aplicarOcr(doc, paginas, forzar=forzar_ocr)
+            return paginas
+        finally:
+            doc.close()
+
+def unirPaginas(paginas: List[str]) -> str:
+    """
+    Une los textos de página con su separador y limpia el resultado.
+    
+    Args:
+        paginas (List[str]): Texto de cada página
         
-        # Limpiar el texto
-        texto_limpio = limpiarTexto(texto_completo)
+    Returns:
+        str: Texto completo limpio, igual al de extraerTextoDePDF
+    """
+    texto_completo = ""
+    for num_pagina, texto_pagina in enumerate(paginas):
+        texto_completo += f"\n--- Página {num_pagina + 1} ---\n"
+        texto_completo += texto_pagina
+    
+    return limpiarTexto(texto_completo)
+
+def extraerTextoDePDF(ruta_pdf: Union[str, bytes, bytearray]) -> str:
+    """
+    Extrae todo el texto de un archivo PDF.
+    
+    Args:
+        ruta_pdf (str | bytes): Ruta al archivo PDF o su contenido en memoria
         
-        return texto_limpio
+    Returns:
+        str: Texto extraído del PDF
+    """
+    try:
+        return unirPaginas(extraerPaginasDePDF(ruta_pdf))
         
     except Exception as e:
-        print(f"Error al extraer texto del PDF: {str(e)}")
+        logger.error(f"Error al extraer texto del PDF: {str(e)}")
         return ""
 
-def extraerTextosDePdfConOCR(ruta_pdf: str) -> str:
+def extraerTextosDePdfConOCR(ruta_pdf: Union[str, bytes, bytearray]) -> str:
     """
-    Extrae texto de PDF usando OCR para documentos escaneados.
-    Nota: Implementación básica, se puede mejorar con Tesseract OCR.
+    Extrae texto de PDF usando OCR (Tesseract) para documentos escaneados.
+    
+    A diferencia de extraerTextoDePDF, reconoce toda página con imágenes aunque
+    tenga algo de texto; el resultado por página queda en la cache de OCR.
     
     Args:
-        ruta_pdf (str): Ruta al archivo PDF
+        ruta_pdf (str | bytes): Ruta al archivo PDF o su contenido en memoria
         
     Returns:
         str: Texto extraído con OCR
     """
     try:
-        # Por ahora, usar el método básico
-        # En una implementación completa, se usaría Tesseract OCR
-        return extraerTextoDePDF(ruta_pdf)
+        return unirPaginas(extraerPaginasDePDF(ruta_pdf, forzar_ocr=True))
         
     except Exception as e:
-        print(f"Error en OCR del PDF: {str(e)}")
+        logger.error(f"Error en OCR del PDF: {str(e)}")
         return ""
 
 def limpiarTexto(texto: str) -> str:
@@ -83,9 +244,9 @@ def limpiarTexto(texto: str) -> str:
     
     return '\n'.join(lineas_limpias)
 
-def dividirTextoEnChunks(texto: str, tamaño_chunk: int = 1000, solapamiento: int = 200) -> List[str]:
+def dividirTextoEnSpans(texto: str, tamaño_chunk: int = 1000, solapamiento: int = 200) -> List[Tuple[int, int]]:
     """
-    Divide el texto en chunks más pequeños para procesamiento.
+    Calcula los límites (inicio, fin) de cada chunk dentro del texto.
     
     Args:
         texto (str): Texto a dividir
@@ -93,12 +254,12 @@ def dividirTextoEnChunks(texto: str, tamaño_chunk: int = 1000, solapamiento: in
         solapamiento (int): Número de caracteres de solapamiento entre chunks
         
     Returns:
-        List[str]: Lista de chunks de texto
+        List[Tuple[int, int]]: Posiciones de cada chunk, sin espacios en los extremos
     """
     if not texto:
         return []
     
-    chunks = []
+    spans = []
     inicio = 0
     
     while inicio < len(texto):
@@ -111,14 +272,30 @@ def dividirTextoEnChunks(texto: str, tamaño_chunk: int = 1000, solapamiento: in
             if punto_corte > inicio:
                 fin = punto_corte
         
-        chunk = texto[inicio:fin].strip()
-        if chunk:
-            chunks.append(chunk)
+        segmento = texto[inicio:fin]
+        contenido = segmento.strip()
+        if contenido:
+            desde = inicio + len(segmento) - len(segmento.lstrip())
+            spans.append((desde, desde + len(contenido)))
         
         # Mover el inicio considerando el solapamiento
         inicio = fin - solapamiento if fin - solapamiento > inicio else fin
     
-    return chunks
+    return spans
+
+def dividirTextoEnChunks(texto: str, tamaño_chunk: int = 1000, solapamiento: int = 200) -> List[str]:
+    """
+    Divide el texto en chunks más pequeños para procesamiento.
+    
+    Args:
+        texto (str): Texto a dividir
+        tamaño_chunk (int): Tamaño máximo de cada chunk
+        solapamiento (int): Número de caracteres de solapamiento entre chunks
+        
+    Returns:
+        List[str]: Lista de chunks de texto
+    """
+    return [texto[inicio:fin] for inicio, fin in dividirTextoEnSpans(texto, tamaño_chunk, solapamiento)]
 
 def extraerMetadatosPDF(ruta_pdf: str) -> Dict[str, str]:
     """
@@ -131,6 +308,8 @@ def extraerMetadatosPDF(ruta_pdf: str) -> Dict[str, str]:
         Dict[str, str]: Diccionario con metadatos del PDF
     """
     try:
+        import fitz  # PyMuPDF
+        
         doc = fitz.open(ruta_pdf)
         metadatos = doc.metadata
         doc.close()
@@ -147,5 +326,5 @@ def extraerMetadatosPDF(ruta_pdf: str) -> Dict[str, str]:
         }
         
     except Exception as e:
-        print(f"Error al extraer metadatos del PDF: {str(e)}")
+        logger.warning(f"Error al extraer metadatos del PDF: {str(e)}")
         return {'nombre_archivo': os.path.basename(ruta_pdf)}
\ No newline at end of file
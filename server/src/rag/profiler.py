@@ -0,0 +1,152 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Dict, Any, Optional
+from .config import PERFILADO_TOKEN, PERFILADO_MUESTREO, PERFILADO_INTERVALO_MS, PERFILADO_MEMORIA, PERFILADO_DIR
+from .logs import obtenerLogger
+from .metrics import describirMetrica, incrementarContador
+
+logger = obtenerLogger('profiler')
+
+describirMetrica('perfilado_peticiones_total', 'Peticiones perfiladas por motivo (cabecera, muestreo)')
+
+# Peticiones perfiladas si no se configuró token ni muestreo: ninguna, y el hook no hace nada
+PERFILADO_ACTIVO = bool(PERFILADO_TOKEN) or PERFILADO_MUESTREO > 0
+
+# tracemalloc es global al proceso: solo una petición a la vez mide memoria
+_lock_memoria = threading.Lock()
+
+def motivoDePerfilado(cabecera: Optional[str]) -> Optional[str]:
+    """
+    Decide si perfilar una petición.
+
+    Args:
+        cabecera (str): Valor de la cabecera X-Perfilar (debe coincidir con PERFILADO_TOKEN)
+
+    Returns:
+        Optional[str]: 'cabecera', 'muestreo' o None si no se perfila
+    """
+    if not PERFILADO_ACTIVO:
+        return None
+    if PERFILADO_TOKEN and cabecera == PERFILADO_TOKEN:
+        return 'cabecera'
+    if PERFILADO_MUESTREO > 0 and random.random() < PERFILADO_MUESTREO:
+        return 'muestreo'
+    return None
+
+def _marco(frame) -> str:
+    codigo = frame.f_code
+    return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})"
+
+class MuestreadorDePila(threading.Thread):
+    """
+    Profiler por muestreo de un hilo: cada intervalo toma su pila con
+    sys._current_frames y cuenta las pilas colapsadas (formato folded de
+    flamegraph.pl / speedscope). El hilo perfilado no se instrumenta.
+    """
+
+    def __init__(self, hilo_id: int, intervalo_s: float):
+        super().__init__(name='perfilado', daemon=True)
+        self.hilo_id = hilo_id
+        self.intervalo_s = intervalo_s
+        self.pilas: Counter = Counter()
+        self.muestras = 0
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.wait(self.intervalo_s):
+            frame = sys._current_frames().get(self.hilo_id)
+            if frame is None:
+                continue
+            marcos = []
+            while frame is not None:
+                marcos.append(_marco(frame))
+                frame = frame.f_back
+            self.pilas[';'.join(reversed(marcos))] += 1
+            self.muestras += 1
+
+    def detener(self):
+        self._detener.set()
+        self.join()
+
+class PerfilDePeticion:
+    """Perfil de CPU (muestreo) y memoria (tracemalloc) de una petición."""
+
+    def __init__(self, request_id: str, endpoint: str, motivo: str, intervalo_ms: float = PERFILADO_INTERVALO_MS,
+                 memoria: bool = PERFILADO_MEMORIA):
+        self.request_id = request_id
+        self.endpoint = endpoint
+        self.motivo = motivo
+        self.inicio = time.perf_counter()
+        self.muestreador = MuestreadorDePila(threading.get_ident(), intervalo_ms / 1000)
+        # Si otra petición ya mide memoria (o tracemalloc ya estaba activo) solo se perfila CPU
+        self.memoria = memoria and not tracemalloc.is_tracing() and _lock_memoria.acquire(blocking=False)
+        if self.memoria:
+            tracemalloc.start(25)
+        self.muestreador.start()
+        incrementarContador('perfilado_peticiones_total', motivo=motivo)
+
+    def finalizar(self, estado: Optional[int] = None, directorio: str = PERFILADO_DIR) -> Dict[str, Any]:
+        """
+        Detiene el perfilado y escribe <request_id>.folded y <request_id>.json en el directorio.
+
+        Returns:
+            Dict[str, Any]: Reporte escrito en el JSON
+        """
+        self.muestreador.detener()
+        duracion = time.perf_counter() - self.inicio
+
+        reporte: Dict[str, Any] = {
+            'request_id': self.request_id,
+            'endpoint': self.endpoint,
+            'estado': estado,
+            'motivo': self.motivo,
+            'duracion_ms': round(duracion * 1000, 3),
+            'muestras': self.muestreador.muestras,
+            'intervalo_ms': self.muestreador.intervalo_s * 1000
+        }
+
+        if self.memoria:
+            try:
+                actual, pico = tracemalloc.get_traced_memory()
+                estadisticas = tracemalloc.take_snapshot().statistics('lineno')[:25]
+            finally:
+                tracemalloc.stop()
+                _lock_memoria.release()
+            reporte['memoria'] = {
+                'pico_mb': round(pico / 1024 / 1024, 3),
+                'retenida_mb': round(actual / 1024 / 1024, 3),
+                'asignaciones': [
+                    {'origen': f"{estadistica.traceback[0].filename}:{estadistica.traceback[0].lineno}",
+                     'kb': round(estadistica.size / 1024, 1), 'bloques': estadistica.count}
+                    for estadistica in estadisticas
+                ]
+            }
+
+        # Funciones con más muestras propias (la hoja de cada pila)
+        propias: Counter = Counter()
+        for pila, muestras in self.muestreador.pilas.items():
+            propias[pila.rsplit(';', 1)[-1]] += muestras
+        reporte['funciones'] = [{'funcion': funcion, 'muestras': muestras} for funcion, muestras in propias.most_common(20)]
+
+        try:
+            os.makedirs(directorio, exist_ok=True)
+            # El request ID puede venir del cliente: solo caracteres seguros para un nombre de archivo
+            base = os.path.join(directorio, re.sub(r'[^A-Za-z0-9_-]', '_', self.request_id)[:100])
+            with open(base + '.folded', 'w', encoding='utf-8') as f:
+                for pila, muestras in self.muestreador.pilas.most_common():
+                    f.write(f"{pila} {muestras}\n")
+            with open(base + '.json', 'w', encoding='utf-8') as f:
+                json.dump(reporte, f, indent=2, ensure_ascii=False)
+            logger.info("Perfil de petición guardado", extra={'campos': {
+                'request_id': self.request_id, 'ruta': base, 'duracion_ms': reporte['duracion_ms'], 'muestras': reporte['muestras']}})
+        except Exception as e:
+            logger.error(f"Error al guardar el perfil: {str(e)}")
+
+        return reporte
@@ -0,0 +1,251 @@
+import re
+import math
+import time
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
+from .config import (
+    RELEVANCIA_MINIMA, RERANK_PESO_DENSO, RERANK_CORTE_RELATIVO, RERANK_ORACIONES, RERANK_MAX_TOKENS, RERANK_MODELO
+)
+from .logs import obtenerLogger
+from .metrics import describirMetrica, incrementarContador, observarHistograma
+from .tokenUsage import estimarTokens
+
+logger = obtenerLogger('reranker')
+
+describirMetrica('rerank_tokens_contexto', 'Tokens estimados del contexto del chat por versión (sin_rerank, rerank)')
+describirMetrica('rerank_tokens_ahorrados_total', 'Tokens de contexto que el reranking y el recorte evitaron enviar al LLM')
+
+BUCKETS_TOKENS = (50, 100, 200, 400, 600, 800, 1200, 1600, 2400, 3200)
+
+# BM25 estándar
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = frozenset("""
+a al algo algunas algunos ante antes como con contra cual cuales cuando cuanto de del desde donde durante e el ella
+ellas ellos en entre era es esa esas ese eso esos esta estas este esto estos fue ha han hasta hay la las le les lo los
+mas me mi mis muy no nos o otra otras otro otros para pero poco por porque que quien quienes se sea ser si sin sobre
+son su sus tambien te tiene tienen tu tus un una uno unos y ya yo cual cuales como cuanto cuanta cuantos cuantas
+""".split())
+
+_PALABRA = re.compile(r'\w+', re.UNICODE)
+# Fin de oración: puntuación seguida de espacio, o salto de línea (filas de tablas, viñetas)
+_FIN_DE_ORACION = re.compile(r'(?<=[.!?;:])\s+|\n+')
+
+def _normalizar(texto: str) -> str:
+    """Minúsculas y sin tildes, para que 'déficit' y 'deficit' coincidan."""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+def tokenizar(texto: str) -> List[str]:
+    """Términos de un texto para el puntaje léxico (sin stopwords; los números se conservan)."""
+    return [t for t in _PALABRA.findall(_normalizar(texto)) if t not in STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+def dividirEnOraciones(texto: str) -> List[str]:
+    """Oraciones (o líneas) no vacías de un pasaje."""
+    return [o.strip() for o in _FIN_DE_ORACION.split(texto) if o and o.strip()]
+
+def _idf(terminos: List[str], documentos: List[List[str]]) -> Dict[str, float]:
+    """IDF de BM25 calculado sobre los candidatos."""
+    n = len(documentos)
+    conjuntos = [set(d) for d in documentos]
+    idf = {}
+    for termino in set(terminos):
+        frecuencia = sum(termino in c for c in conjuntos)
+        idf[termino] = math.log(1 + (n - frecuencia + 0.5) / (frecuencia + 0.5))
+    return idf
+
+def _bm25(terminos: List[str], documento: List[str], idf: Dict[str, float], largo_promedio: float) -> float:
+    frecuencias = Counter(documento)
+    puntaje = 0.0
+    for termino in set(terminos):
+        f = frecuencias.get(termino, 0)
+        if f:
+            puntaje += idf[termino] * f * (BM25_K1 + 1) / (f + BM25_K1 * (1 - BM25_B + BM25_B * len(documento) / largo_promedio))
+    return puntaje
+
+def _cercania(terminos: set, documento: List[str]) -> float:
+    """
+    Cercanía de los términos de la consulta en el pasaje (0 a 1): términos
+    distintos presentes dividido por el ancho de la ventana más corta que
+    los contiene a todos.
+    """
+    posiciones = [(i, t) for i, t in enumerate(documento) if t in terminos]
+    presentes = len({t for _, t in posiciones})
+    if presentes == 0:
+        return 0.0
+    if presentes == 1:
+        return 1.0 / max(len(terminos), 1)
+
+    # Ventana deslizante mínima que cubre todos los términos presentes
+    conteo: Counter = Counter()
+    cubiertos, izquierda, mejor = 0, 0, len(documento)
+    for posicion, termino in posiciones:
+        conteo[termino] += 1
+        if conteo[termino] == 1:
+            cubiertos += 1
+        while cubiertos == presentes:
+            mejor = min(mejor, posicion - posiciones[izquierda][0] + 1)
+            termino_izquierda = posiciones[izquierda][1]
+            conteo[termino_izquierda] -= 1
+            if conteo[termino_izquierda] == 0:
+                cubiertos -= 1
+            izquierda += 1
+    return (presentes / max(len(terminos), 1)) * (presentes / mejor)
+
+def puntuarLexico(consulta: str, textos: List[str]) -> List[float]:
+    """
+    Puntaje léxico de cada texto para la consulta, normalizado a 0..1:
+    80% BM25 (relativo al mejor candidato) y 20% cercanía de los términos.
+
+    Args:
+        consulta (str): Pregunta del usuario
+        textos (List[str]): Pasajes candidatos
+
+    Returns:
+        List[float]: Un puntaje por texto
+    """
+    terminos = tokenizar(consulta)
+    if not terminos or not textos:
+        return [0.0] * len(textos)
+    documentos = [tokenizar(texto) for texto in textos]
+    idf = _idf(terminos, documentos)
+    largo_promedio = max(sum(len(d) for d in documentos) / len(documentos), 1.0)
+    bm25 = [_bm25(terminos, d, idf, largo_promedio) for d in documentos]
+    maximo = max(bm25) or 1.0
+    conjunto = set(terminos)
+    return [0.8 * b / maximo + 0.2 * _cercania(conjunto, d) for b, d in zip(bm25, documentos)]
+
+@lru_cache(maxsize=1)
+def _crossEncoder(modelo: str):
+    """Cross-encoder de sentence-transformers (se carga una vez), o None si no está instalado."""
+    try:
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(modelo)
+    except Exception as e:
+        logger.warning(f"No se pudo cargar el cross-encoder, se usa el puntaje léxico: {str(e)}")
+        return None
+
+def _puntuarCandidatos(consulta: str, textos: List[str], modelo: str) -> List[float]:
+    if modelo:
+        encoder = _crossEncoder(modelo)
+        if encoder is not None:
+            puntajes = encoder.predict([(consulta, texto) for texto in textos])
+            return [1 / (1 + math.exp(-float(p))) for p in puntajes]
+    return puntuarLexico(consulta, textos)
+
+def recortarPasaje(consulta: str, texto: str, max_oraciones: int = RERANK_ORACIONES,
+                   vistas: Optional[set] = None) -> str:
+    """
+    Conserva las oraciones del pasaje que contienen términos de la consulta.
+
+    Cada oración suma los términos de la consulta que contiene, ponderados por
+    su rareza dentro del pasaje (un término presente en todas, como el nombre
+    de la empresa, pesa poco). Se conservan las que alcanzan la mitad del
+    mejor puntaje, en su orden original; un salto entre ellas se marca con
+    '…'. Si ninguna coincide se conservan las primeras.
+
+    Args:
+        consulta (str): Pregunta del usuario
+        texto (str): Pasaje completo
+        max_oraciones (int): Oraciones a conservar
+        vistas (set): Oraciones ya incluidas en otros pasajes (los chunks se solapan); se omiten y se actualiza
+
+    Returns:
+        str: Pasaje recortado
+    """
+    oraciones = dividirEnOraciones(texto)
+    vistas = vistas if vistas is not None else set()
+    terminos = set(tokenizar(consulta))
+    presentes = [terminos & set(tokenizar(oracion)) for oracion in oraciones]
+    frecuencias = Counter(termino for conjunto in presentes for termino in conjunto)
+    pesos = {termino: math.log(1 + len(oraciones) / frecuencia) for termino, frecuencia in frecuencias.items()}
+
+    candidatas = []
+    for i, oracion in enumerate(oraciones):
+        if _normalizar(oracion) in vistas:
+            continue
+        candidatas.append((sum(pesos[termino] for termino in presentes[i]), i))
+
+    if not candidatas:
+        return ''
+    elegidas = sorted(candidatas, key=lambda c: (-c[0], c[1]))[:max_oraciones]
+    if elegidas[0][0] == 0:
+        elegidas = sorted(candidatas, key=lambda c: c[1])[:max_oraciones]
+    else:
+        elegidas = [c for c in elegidas if c[0] >= elegidas[0][0] / 2]
+
+    partes = []
+    anterior = None
+    for _, i in sorted(elegidas, key=lambda c: c[1]):
+        if anterior is not None and i != anterior + 1:
+            partes.append('…')
+        partes.append(oraciones[i])
+        vistas.add(_normalizar(oraciones[i]))
+        anterior = i
+    return ' '.join(partes)
+
+def rerankearContexto(consulta: str, candidatos: List[Dict[str, Any]], max_pasajes: int = 3,
+                      peso_denso: float = RERANK_PESO_DENSO, max_tokens: int = RERANK_MAX_TOKENS,
+                      modelo: str = RERANK_MODELO) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Reordena los candidatos de la búsqueda vectorial y recorta los mejores.
+
+    El puntaje combina la similitud del embedding con el puntaje léxico (o del
+    cross-encoder). Se conservan hasta max_pasajes candidatos con al menos
+    RERANK_CORTE_RELATIVO del mejor puntaje, recortados a sus oraciones
+    relevantes y dentro de max_tokens (el primero siempre entra).
+
+    Args:
+        consulta (str): Pregunta del usuario
+        candidatos (List[Dict]): Resultados de buscarEnBaseDeConocimiento
+        max_pasajes (int): Pasajes a conservar
+        peso_denso (float): Peso de la similitud del embedding (0 a 1)
+        max_tokens (int): Presupuesto de tokens estimados del contexto
+        modelo (str): Cross-encoder de sentence-transformers; vacío para el puntaje léxico
+
+    Returns:
+        Tuple: (pasajes con 'contenido' recortado y 'puntaje', estadísticas del reranking)
+    """
+    inicio = time.perf_counter()
+    aptos = [c for c in candidatos if c.get('relevancia', 0) >= RELEVANCIA_MINIMA]
+    # Contexto que se habría enviado sin reranking: los primeros max_pasajes completos
+    tokens_sin_rerank = sum(estimarTokens(c['contenido']) for c in aptos[:max_pasajes])
+
+    pasajes = []
+    if aptos:
+        puntajes = _puntuarCandidatos(consulta, [c['contenido'] for c in aptos], modelo)
+        ordenados = sorted(
+            ({**c, 'puntaje': peso_denso * c['relevancia'] + (1 - peso_denso) * p} for c, p in zip(aptos, puntajes)),
+            key=lambda c: c['puntaje'], reverse=True
+        )
+        corte = ordenados[0]['puntaje'] * RERANK_CORTE_RELATIVO
+        vistas: set = set()
+        tokens = 0
+        for candidato in ordenados:
+            if len(pasajes) >= max_pasajes or candidato['puntaje'] < corte:
+                break
+            recortado = recortarPasaje(consulta, candidato['contenido'], vistas=vistas)
+            if not recortado:
+                continue
+            tokens_pasaje = estimarTokens(recortado)
+            if pasajes and tokens + tokens_pasaje > max_tokens:
+                break
+            pasajes.append({**candidato, 'contenido': recortado})
+            tokens += tokens_pasaje
+
+    tokens_rerank = sum(estimarTokens(p['contenido']) for p in pasajes)
+    estadisticas = {
+        'candidatos': len(candidatos),
+        'pasajes': len(pasajes),
+        'tokens_sin_rerank': tokens_sin_rerank,
+        'tokens_contexto': tokens_rerank,
+        'tokens_ahorrados': max(tokens_sin_rerank - tokens_rerank, 0),
+        'rerank_ms': round((time.perf_counter() - inicio) * 1000, 3)
+    }
+    observarHistograma('rerank_tokens_contexto', tokens_sin_rerank, buckets=BUCKETS_TOKENS, version='sin_rerank')
+    observarHistograma('rerank_tokens_contexto', tokens_rerank, buckets=BUCKETS_TOKENS, version='rerank')
+    incrementarContador('rerank_tokens_ahorrados_total', estadisticas['tokens_ahorrados'])
+    return pasajes, estadisticas
@@ -0,0 +1,309 @@
+import re
+from typing import Dict, List, Any, Optional, Tuple
+
+# Etiquetas de las partidas principales, en orden de preferencia
+PATRONES_PARTIDAS = {
+    'activo_corriente': [r'total\s+activos?\s+corrientes?', r'activos?\s+corrientes?'],
+    'pasivo_corriente': [r'total\s+pasivos?\s+corrientes?', r'pasivos?\s+corrientes?'],
+    'activo_total': [r'total\s+(?:de\s+)?activos?\b(?!\s+(?:no\s+)?corrientes?)', r'activos?\s+totale?s?'],
+    'pasivo_total': [r'total\s+(?:de\s+)?pasivos?\b(?!\s+(?:no\s+)?corrientes?)(?!\s+y)', r'pasivos?\s+totale?s?'],
+    'patrimonio': [r'total\s+(?:del\s+)?patrimonio(?:\s+neto)?', r'(?<!y\s)patrimonio\s+neto', r'(?<!y\s)patrimonio'],
+    'ventas': [r'ventas\s+netas', r'ingresos\s+(?:por\s+ventas|operacionales|de\s+actividades\s+ordinarias)', r'total\s+ingresos', r'ventas'],
+    'utilidad_neta': [r'(?:utilidad|ganancia|p[ée]rdida)\s+neta(?:\s+del\s+(?:ejercicio|periodo|período))?', r'resultado\s+(?:neto\s+)?del\s+ejercicio']
+}
+
+# Tablas de puntaje por ratio (puntos de quiebre, puntaje 0-100), interpoladas linealmente
+TABLAS_PUNTAJE = {
+    'liquidez_corriente': ([0.5, 1.0, 1.5, 2.0, 3.0], [0, 35, 70, 90, 100]),
+    'endeudamiento': ([0.5, 1.0, 2.0, 3.0, 5.0], [100, 85, 60, 30, 0]),
+    'margen_neto': ([-0.10, 0.0, 0.05, 0.10, 0.20], [0, 30, 60, 85, 100]),
+    'roe': ([-0.10, 0.0, 0.08, 0.15, 0.25], [0, 30, 60, 85, 100])
+}
+
+PESOS_RATIOS = {
+    'liquidez_corriente': 0.30,
+    'endeudamiento': 0.30,
+    'margen_neto': 0.20,
+    'roe': 0.20
+}
+
+# Límites de puntuación entre niveles de riesgo
+LIMITE_RIESGO_BAJO = 70
+LIMITE_RIESGO_MEDIO = 50
+
+# Distancia mínima a un límite para considerar el resultado decisivo
+MARGEN_AMBIGUEDAD = 5
+MIN_RATIOS_DECISIVO = 3
+
+_REGEX_NUMERO = re.compile(r'\(?-?\$?\s?\d[\d.,]*\)?')
+
+def _parsearMonto(texto: str) -> Optional[float]:
+    """Convierte un monto en formato 1.234,56 / 1,234.56 / (1.234) a float."""
+    negativo = texto.startswith('(') or texto.lstrip('$ ').startswith('-')
+    limpio = re.sub(r'[^\d.,]', '', texto).strip('.,')
+    if not limpio:
+        return None
+
+    ultimo_punto = limpio.rfind('.')
+    ultima_coma = limpio.rfind(',')
+
+    if ultimo_punto >= 0 and ultima_coma >= 0:
+        # El separador que aparece al final es el decimal
+        decimal = '.' if ultimo_punto > ultima_coma else ','
+    elif ultimo_punto >= 0 or ultima_coma >= 0:
+        # Un único separador seguido de exactamente 3 dígitos se toma como miles
+        separador = '.' if ultimo_punto >= 0 else ','
+        repetido = limpio.count(separador) > 1
+        tres_digitos = len(limpio) - limpio.rfind(separador) - 1 == 3
+        decimal = None if repetido or tres_digitos else separador
+    else:
+        decimal = None
+
+    if decimal:
+        miles = ',' if decimal == '.' else '.'
+        limpio = limpio.replace(miles, '').replace(decimal, '.')
+    else:
+        limpio = limpio.replace('.', '').replace(',', '')
+
+    try:
+        valor = float(limpio)
+    except ValueError:
+        return None
+
+    return -valor if negativo else valor
+
+def _esAnio(texto: str) -> bool:
+    """Detecta años (2023) que suelen aparecer como encabezado de columna."""
+    return bool(re.fullmatch(r'(19|20)\d{2}', texto.strip()))
+
+def extraerPartidasFinancieras(texto: str) -> Dict[str, Optional[float]]:
+    """
+    Extrae las partidas principales del texto de un estado financiero.
+
+    Args:
+        texto (str): Texto extraído del PDF
+
+    Returns:
+        Dict[str, Optional[float]]: Monto de cada partida o None si no se encontró
+    """
+    texto_lower = texto.lower()
+    partidas = {}
+
+    for partida, patrones in PATRONES_PARTIDAS.items():
+        partidas[partida] = None
+
+        for patron in patrones:
+            for coincidencia in re.finditer(patron, texto_lower):
+                # Tomar el primer número (que no sea un año) tras la etiqueta
+                ventana = texto_lower[coincidencia.end():coincidencia.end() + 60]
+                for numero in _REGEX_NUMERO.finditer(ventana):
+                    if _esAnio(numero.group()):
+                        continue
+                    partidas[partida] = _parsearMonto(numero.group())
+                    break
+
+                if partidas[partida] is not None:
+                    break
+
+            if partidas[partida] is not None:
+                break
+
+    return partidas
+
+def calcularRatios(partidas: Dict[str, Optional[float]]) -> Dict[str, float]:
+    """
+    Calcula ratios de liquidez, endeudamiento y rentabilidad.
+
+    Args:
+        partidas (Dict): Partidas extraídas con extraerPartidasFinancieras
+
+    Returns:
+        Dict[str, float]: Solo los ratios que se pudieron calcular
+    """
+    ratios = {}
+    ac = partidas.get('activo_corriente')
+    pc = partidas.get('pasivo_corriente')
+    patrimonio = partidas.get('patrimonio')
+    ventas = partidas.get('ventas')
+    utilidad = partidas.get('utilidad_neta')
+
+    pasivo = partidas.get('pasivo_total')
+    if pasivo is None and partidas.get('activo_total') is not None and patrimonio is not None:
+        pasivo = partidas['activo_total'] - patrimonio
+    if pasivo is None:
+        pasivo = pc
+
+    if ac is not None and pc:
+        ratios['liquidez_corriente'] = ac / pc
+
+    if pasivo is not None and patrimonio is not None:
+        # Patrimonio negativo equivale a endeudamiento máximo
+        ratios['endeudamiento'] = pasivo / patrimonio if patrimonio > 0 else float('inf')
+
+    if utilidad is not None and ventas:
+        ratios['margen_neto'] = utilidad / ventas
+
+    if utilidad is not None and patrimonio and patrimonio > 0:
+        ratios['roe'] = utilidad / patrimonio
+
+    return ratios
+
+def puntuarRatio(nombre: str, valor: float) -> float:
+    """Interpola linealmente el puntaje 0-100 de un ratio en su tabla."""
+    xs, ys = TABLAS_PUNTAJE[nombre]
+    if valor <= xs[0]:
+        return float(ys[0])
+    if valor >= xs[-1]:
+        return float(ys[-1])
+
+    for i in range(1, len(xs)):
+        if valor <= xs[i]:
+            fraccion = (valor - xs[i - 1]) / (xs[i] - xs[i - 1])
+            return ys[i - 1] + fraccion * (ys[i] - ys[i - 1])
+
+    return float(ys[-1])
+
+def nivelDeRiesgo(puntuacion: float) -> str:
+    """Traduce la puntuación al nivel de riesgo bajo/medio/alto."""
+    if puntuacion >= LIMITE_RIESGO_BAJO:
+        return 'bajo'
+    if puntuacion >= LIMITE_RIESGO_MEDIO:
+        return 'medio'
+    return 'alto'
+
+def calcularUmbralCredito(partidas: Dict[str, Optional[float]], puntuacion: float) -> int:
+    """Estima el monto de crédito recomendado a partir de ventas, patrimonio y puntuación."""
+    capacidades = []
+    if partidas.get('ventas') and partidas['ventas'] > 0:
+        capacidades.append(partidas['ventas'] * 0.10)
+    if partidas.get('patrimonio') and partidas['patrimonio'] > 0:
+        capacidades.append(partidas['patrimonio'] * 0.50)
+
+    base = min(capacidades) if capacidades else 30000
+    umbral = base * puntuacion / 65
+    return int(max(5000, min(umbral, 500000)) // 1000 * 1000)
+
+def _describirRatio(nombre: str, valor: float) -> str:
+    """Genera el texto de análisis para un ratio."""
+    if nombre == 'liquidez_corriente':
+        estado = 'holgada' if valor >= 1.5 else 'ajustada' if valor >= 1.0 else 'insuficiente'
+        return f"Liquidez corriente de {valor:.2f} ({estado})"
+    if nombre == 'endeudamiento':
+        if valor == float('inf'):
+            return "Patrimonio negativo: la empresa está técnicamente en quiebra"
+        estado = 'moderado' if valor <= 1.5 else 'elevado' if valor <= 3 else 'crítico'
+        return f"Endeudamiento (pasivo/patrimonio) de {valor:.2f} ({estado})"
+    if nombre == 'margen_neto':
+        return f"Margen neto de {valor * 100:.1f}% sobre ventas"
+    return f"Rentabilidad sobre patrimonio (ROE) de {valor * 100:.1f}%"
+
+def _analizarDatosSociales(datos_sociales: Dict[str, Any]) -> Tuple[List[str], str]:
+    """Resume los datos digitales y estima el riesgo reputacional."""
+    if not datos_sociales:
+        return ["Sin datos digitales proporcionados"], 'medio'
+
+    sentimiento = datos_sociales.get('sentimiento', {}).get('clasificacion', 'neutro')
+    indicadores = datos_sociales.get('indicadores_comerciales', [])
+    analisis = [
+        f"Sitio de tipo {datos_sociales.get('tipo_sitio', 'general')}",
+        f"Sentimiento {sentimiento} en el contenido público",
+        f"{len(indicadores)} indicadores de actividad comercial detectados"
+    ]
+
+    if datos_sociales.get('simulado'):
+        analisis.append("Datos digitales no verificables (scraping fallido)")
+        return analisis, 'medio'
+
+    nivel = {'positivo': 'bajo', 'negativo': 'alto'}.get(sentimiento, 'bajo' if indicadores else 'medio')
+    return analisis, nivel
+
+def generarScoringLocal(
+    texto_financiero: str,
+    datos_sociales: Dict[str, Any],
+    partidas: Optional[Dict[str, Optional[float]]] = None
+) -> Dict[str, Any]:
+    """
+    Genera un scoring determinístico basado en ratios, sin llamar al LLM.
+
+    Args:
+        texto_financiero (str): Texto extraído de estados financieros
+        datos_sociales (Dict): Datos de redes sociales y web
+        partidas (Dict): Partidas ya extraídas; si se omite se extraen del texto
+
+    Returns:
+        Dict[str, Any]: 'resultado' (mismo formato que generarScoringPorDefecto),
+        'decisivo' (si el resultado no necesita al LLM), 'partidas' y 'ratios'
+    """
+    if partidas is None:
+        partidas = extraerPartidasFinancieras(texto_financiero or '')
+    ratios = calcularRatios(partidas)
+
+    if ratios:
+        peso_total = sum(PESOS_RATIOS[nombre] for nombre in ratios)
+        puntuacion = sum(PESOS_RATIOS[nombre] * puntuarRatio(nombre, valor) for nombre, valor in ratios.items()) / peso_total
+    else:
+        puntuacion = 65.0
+
+    puntuacion = round(puntuacion)
+    nivel = nivelDeRiesgo(puntuacion)
+    distancia_limite = min(abs(puntuacion - LIMITE_RIESGO_BAJO), abs(puntuacion - LIMITE_RIESGO_MEDIO))
+    decisivo = len(ratios) >= MIN_RATIOS_DECISIVO and distancia_limite >= MARGEN_AMBIGUEDAD
+
+    analisis_financiero = [_describirRatio(nombre, valor) for nombre, valor in ratios.items()]
+    if not analisis_financiero:
+        analisis_financiero = ["No se identificaron partidas suficientes para calcular ratios"]
+
+    factores_positivos = [_describirRatio(n, v) for n, v in ratios.items() if puntuarRatio(n, v) >= 70]
+    factores_negativos = [_describirRatio(n, v) for n, v in ratios.items() if puntuarRatio(n, v) < 50]
+
+    recomendaciones = []
+    if ratios.get('liquidez_corriente', 2) < 1.0:
+        recomendaciones.append("Mejorar el capital de trabajo antes de asumir deuda de corto plazo")
+    if ratios.get('endeudamiento', 0) > 2:
+        recomendaciones.append("Reducir el nivel de endeudamiento o capitalizar la empresa")
+    if ratios.get('margen_neto', 1) < 0.05:
+        recomendaciones.append("Revisar la estructura de costos para mejorar el margen")
+    if len(ratios) < len(PESOS_RATIOS):
+        recomendaciones.append("Completar los estados financieros con las partidas faltantes")
+
+    analisis_digital, riesgo_reputacional = _analizarDatosSociales(datos_sociales)
+
+    identificadas = sum(1 for valor in partidas.values() if valor is not None)
+    analisis_referencias = [f"{identificadas} de {len(partidas)} partidas financieras identificadas automáticamente"]
+    activo, pasivo, patrimonio = partidas.get('activo_total'), partidas.get('pasivo_total'), partidas.get('patrimonio')
+    if activo and pasivo is not None and patrimonio is not None:
+        consistente = abs(activo - (pasivo + patrimonio)) <= abs(activo) * 0.02
+        analisis_referencias.append(
+            "Ecuación contable consistente (activo = pasivo + patrimonio)" if consistente
+            else "Inconsistencia en la ecuación contable: requiere revisión"
+        )
+
+    margen = ratios.get('margen_neto')
+    riesgo_operacional = 'medio' if margen is None else 'bajo' if margen >= 0.08 else 'medio' if margen >= 0 else 'alto'
+
+    resultado = {
+        "analisis_financiero": analisis_financiero,
+        "analisis_digital": analisis_digital,
+        "analisis_referencias": analisis_referencias,
+        "riesgos": [
+            {"tipo": "financiero", "nivel": nivel, "descripcion": f"Puntuación por ratios de {puntuacion}/100"},
+            {"tipo": "operacional", "nivel": riesgo_operacional, "descripcion": "Estimado a partir del margen neto"},
+            {"tipo": "reputacional", "nivel": riesgo_reputacional, "descripcion": "Estimado a partir de la presencia digital"}
+        ],
+        "scoring": {
+            "puntuacion": puntuacion,
+            "nivel": nivel,
+            "umbral": calcularUmbralCredito(partidas, puntuacion),
+            "factores_positivos": factores_positivos or ["Documentación disponible"],
+            "factores_negativos": factores_negativos or ["Sin factores negativos relevantes en los ratios"],
+            "recomendaciones": recomendaciones or ["Mantener la disciplina financiera actual"],
+            "metodo": "reglas"
+        }
+    }
+
+    return {
+        'resultado': resultado,
+        'decisivo': decisivo,
+        'partidas': partidas,
+        'ratios': {nombre: (None if valor == float('inf') else round(valor, 4)) for nombre, valor in ratios.items()}
+    }
@@ -0,0 +1,207 @@
+import numpy as np
+from typing import Dict, List, Any, Optional
+from .scoringLocal import (
+    TABLAS_PUNTAJE, PESOS_RATIOS, LIMITE_RIESGO_BAJO, LIMITE_RIESGO_MEDIO, PATRONES_PARTIDAS
+)
+
+# Orden fijo de las partidas en el vector base
+PARTIDAS = list(PATRONES_PARTIDAS)
+RATIOS = list(TABLAS_PUNTAJE)
+
+# Factores de escenario admitidos (variación relativa, 0.10 = +10%)
+FACTORES = ('ventas', 'pasivo', 'activo_corriente', 'patrimonio')
+
+# Parte de cada dólar adicional de ventas que llega a la utilidad neta
+MARGEN_CONTRIBUCION_POR_DEFECTO = 0.30
+
+MAX_ESCENARIOS = 200000
+
+# Ratios mínimos de las cifras base para simular: con menos, la puntuación sería inventada
+MIN_RATIOS_SIMULACION = 2
+
+def construirGrilla(rangos: Dict[str, List[float]]) -> Dict[str, np.ndarray]:
+    """
+    Construye la grilla cartesiana de escenarios.
+
+    Args:
+        rangos (Dict): factor -> [inicio, fin, pasos], p. ej. {'ventas': [0.05, 0.30, 6]}
+
+    Returns:
+        Dict[str, np.ndarray]: Variación de cada factor por escenario
+    """
+    factores = [f for f in rangos if f in FACTORES]
+    ejes = [np.linspace(float(rangos[f][0]), float(rangos[f][1]), int(rangos[f][2])) for f in factores]
+    total = int(np.prod([len(eje) for eje in ejes])) if ejes else 0
+    if total > MAX_ESCENARIOS:
+        raise ValueError(f"La grilla genera {total} escenarios (máximo {MAX_ESCENARIOS})")
+
+    mallas = np.meshgrid(*ejes, indexing='ij')
+    return {factor: malla.ravel() for factor, malla in zip(factores, mallas)}
+
+def muestrearMonteCarlo(distribuciones: Dict[str, Dict[str, float]], n: int, semilla: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Muestrea escenarios con variaciones normales independientes por factor.
+
+    Args:
+        distribuciones (Dict): factor -> {'media': 0.1, 'desv': 0.05}
+        n (int): Número de escenarios
+        semilla (int): Semilla para resultados reproducibles
+
+    Returns:
+        Dict[str, np.ndarray]: Variación de cada factor por escenario
+    """
+    if n > MAX_ESCENARIOS:
+        raise ValueError(f"Se pidieron {n} escenarios (máximo {MAX_ESCENARIOS})")
+
+    generador = np.random.default_rng(semilla)
+    return {
+        factor: generador.normal(float(params.get('media', 0.0)), float(params.get('desv', 0.0)), n)
+        for factor, params in distribuciones.items() if factor in FACTORES
+    }
+
+def _aplicarEscenarios(base: Dict[str, Optional[float]], variaciones: Dict[str, np.ndarray], n: int, margen_contribucion: float) -> Dict[str, np.ndarray]:
+    """Aplica las variaciones a las partidas base; las partidas ausentes quedan en NaN."""
+    partidas = {p: np.full(n, np.nan if base.get(p) is None else float(base[p])) for p in PARTIDAS}
+    cero = np.zeros(n)
+
+    # Completar pasivo total como en calcularRatios
+    if np.isnan(partidas['pasivo_total']).all():
+        partidas['pasivo_total'] = partidas['activo_total'] - partidas['patrimonio']
+        if np.isnan(partidas['pasivo_total']).all():
+            partidas['pasivo_total'] = partidas['pasivo_corriente'].copy()
+
+    dv = variaciones.get('ventas', cero)
+    delta_ventas = partidas['ventas'] * dv
+    partidas['ventas'] = partidas['ventas'] + delta_ventas
+    delta_utilidad = np.nan_to_num(delta_ventas) * margen_contribucion
+    partidas['utilidad_neta'] = partidas['utilidad_neta'] + delta_utilidad
+
+    # La reducción de deuda se asume capitalizada (pasa al patrimonio)
+    dp = variaciones.get('pasivo', cero)
+    delta_pasivo = np.nan_to_num(partidas['pasivo_total'] * dp)
+    partidas['pasivo_total'] = partidas['pasivo_total'] * (1 + dp)
+    partidas['pasivo_corriente'] = partidas['pasivo_corriente'] * (1 + dp)
+
+    partidas['activo_corriente'] = partidas['activo_corriente'] * (1 + variaciones.get('activo_corriente', cero))
+    partidas['patrimonio'] = partidas['patrimonio'] * (1 + variaciones.get('patrimonio', cero)) - delta_pasivo + delta_utilidad
+
+    return partidas
+
+def _calcularRatiosVectorizados(partidas: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Versión vectorizada de calcularRatios; NaN donde el ratio no es calculable."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        patrimonio = partidas['patrimonio']
+        patrimonio_positivo = np.where(patrimonio > 0, patrimonio, np.nan)
+
+        return {
+            'liquidez_corriente': np.where(partidas['pasivo_corriente'] != 0, partidas['activo_corriente'] / partidas['pasivo_corriente'], np.nan),
+            # Patrimonio negativo equivale a endeudamiento máximo
+            'endeudamiento': np.where(patrimonio > 0, partidas['pasivo_total'] / patrimonio_positivo,
+                                      np.where(np.isnan(patrimonio) | np.isnan(partidas['pasivo_total']), np.nan, np.inf)),
+            'margen_neto': np.where(partidas['ventas'] != 0, partidas['utilidad_neta'] / partidas['ventas'], np.nan),
+            'roe': partidas['utilidad_neta'] / patrimonio_positivo
+        }
+
+def puntuarRatiosVectorizados(ratios: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Versión vectorizada de la puntuación de generarScoringLocal.
+
+    Args:
+        ratios (Dict): nombre de ratio -> arreglo de valores (NaN si falta)
+
+    Returns:
+        np.ndarray: Puntuación 0-100 de cada escenario
+    """
+    suma = 0.0
+    pesos = 0.0
+
+    for nombre in RATIOS:
+        valores = ratios[nombre]
+        xs, ys = TABLAS_PUNTAJE[nombre]
+        disponible = ~np.isnan(valores)
+        # np.interp satura en los extremos, igual que puntuarRatio
+        puntaje = np.interp(np.nan_to_num(valores, nan=xs[0], posinf=xs[-1], neginf=xs[0]), xs, ys)
+        suma = suma + np.where(disponible, PESOS_RATIOS[nombre] * puntaje, 0.0)
+        pesos = pesos + np.where(disponible, PESOS_RATIOS[nombre], 0.0)
+
+    return np.where(pesos > 0, suma / np.where(pesos > 0, pesos, 1.0), 65.0)
+
+def _calcularUmbrales(partidas: Dict[str, np.ndarray], puntuaciones: np.ndarray) -> np.ndarray:
+    """Versión vectorizada de calcularUmbralCredito."""
+    ventas = np.where(partidas['ventas'] > 0, partidas['ventas'] * 0.10, np.inf)
+    patrimonio = np.where(partidas['patrimonio'] > 0, partidas['patrimonio'] * 0.50, np.inf)
+    base = np.minimum(ventas, patrimonio)
+    base = np.where(np.isinf(base), 30000.0, base)
+    umbral = np.clip(base * puntuaciones / 65, 5000, 500000)
+    return np.floor(umbral / 1000) * 1000
+
+def _niveles(puntuaciones: np.ndarray) -> np.ndarray:
+    """Versión vectorizada de nivelDeRiesgo."""
+    return np.where(puntuaciones >= LIMITE_RIESGO_BAJO, 'bajo', np.where(puntuaciones >= LIMITE_RIESGO_MEDIO, 'medio', 'alto'))
+
+def simularEscenarios(
+    partidas_base: Dict[str, Optional[float]],
+    variaciones: Dict[str, np.ndarray],
+    margen_contribucion: float = MARGEN_CONTRIBUCION_POR_DEFECTO,
+    n_mejores: int = 5
+) -> Dict[str, Any]:
+    """
+    Evalúa todos los escenarios de una vez con arreglos de NumPy.
+
+    Args:
+        partidas_base (Dict): Partidas actuales de la empresa
+        variaciones (Dict): factor -> arreglo de variaciones relativas
+        margen_contribucion (float): Fracción de las ventas adicionales que llega a la utilidad
+        n_mejores (int): Cantidad de mejores escenarios a retornar
+
+    Returns:
+        Dict[str, Any]: Puntuación base, distribución, sensibilidades y mejores escenarios
+    """
+    factores = [f for f in FACTORES if f in variaciones]
+    n = len(next(iter(variaciones.values()))) if variaciones else 0
+    if n == 0:
+        raise ValueError("No hay escenarios para simular")
+
+    base = _aplicarEscenarios(partidas_base, {}, 1, margen_contribucion)
+    puntuacion_base = float(puntuarRatiosVectorizados(_calcularRatiosVectorizados(base))[0])
+
+    partidas = _aplicarEscenarios(partidas_base, variaciones, n, margen_contribucion)
+    puntuaciones = puntuarRatiosVectorizados(_calcularRatiosVectorizados(partidas))
+    umbrales = _calcularUmbrales(partidas, puntuaciones)
+    niveles = _niveles(puntuaciones)
+
+    percentiles = np.percentile(puntuaciones, [5, 25, 50, 75, 95])
+    distribucion = {
+        'media': round(float(puntuaciones.mean()), 2),
+        'desviacion': round(float(puntuaciones.std()), 2),
+        'minimo': round(float(puntuaciones.min()), 2),
+        'maximo': round(float(puntuaciones.max()), 2),
+        'percentiles': {f"p{p}": round(float(v), 2) for p, v in zip([5, 25, 50, 75, 95], percentiles)},
+        'probabilidad_nivel': {nivel: round(float((niveles == nivel).mean()), 4) for nivel in ('bajo', 'medio', 'alto')}
+    }
+
+    # Sensibilidad: puntos de scoring por cada +10% en el factor (regresión lineal)
+    sensibilidades = {}
+    if factores and n > len(factores):
+        X = np.column_stack([variaciones[f] for f in factores] + [np.ones(n)])
+        coeficientes, *_ = np.linalg.lstsq(X, puntuaciones, rcond=None)
+        sensibilidades = {f: round(float(c) * 0.10, 3) for f, c in zip(factores, coeficientes)}
+
+    orden = np.argsort(-puntuaciones, kind='stable')[:n_mejores]
+    mejores = [
+        {
+            'variaciones': {f: round(float(variaciones[f][i]), 4) for f in factores},
+            'puntuacion': round(float(puntuaciones[i]), 2),
+            'nivel': str(niveles[i]),
+            'umbral': int(umbrales[i])
+        }
+        for i in orden
+    ]
+
+    return {
+        'escenarios': n,
+        'puntuacion_base': round(puntuacion_base, 2),
+        'distribucion': distribucion,
+        'sensibilidades': sensibilidades,
+        'mejores': mejores
+    }
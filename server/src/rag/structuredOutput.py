@@ -0,0 +1,249 @@
+import re
+import json
+from typing import Dict, List, Any, Optional
+from .config import LLM_SALIDA_ESTRUCTURADA, LLM_MAX_REPARACIONES_JSON
+from .metrics import describirMetrica, incrementarContador
+from .tokenUsage import imputarConsumo
+from .logs import obtenerLogger
+
+logger = obtenerLogger('structuredOutput')
+
+describirMetrica('llm_json_solicitudes_total', 'Llamadas al LLM que esperan una respuesta JSON')
+describirMetrica('llm_json_fallos_parseo_total', 'Respuestas del LLM que no se pudieron parsear o validar')
+describirMetrica('llm_json_reparaciones_total', 'Reintentos de reparación de JSON por resultado')
+describirMetrica('llm_json_respaldo_total', 'Llamadas que terminaron usando la respuesta de respaldo')
+describirMetrica('llm_json_tokens_desperdiciados_total', 'Tokens consumidos por respuestas descartadas')
+
+_NIVEL_RIESGO = {"type": "string", "enum": ["bajo", "medio", "alto"]}
+_LISTA_TEXTO = {"type": "array", "items": {"type": "string"}}
+
+ESQUEMA_SCORING = {
+    "type": "object",
+    "properties": {
+        "analisis_financiero": _LISTA_TEXTO,
+        "analisis_digital": _LISTA_TEXTO,
+        "analisis_referencias": _LISTA_TEXTO,
+        "riesgos": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "tipo": {"type": "string"},
+                    "nivel": _NIVEL_RIESGO,
+                    "descripcion": {"type": "string"}
+                },
+                "required": ["tipo", "nivel", "descripcion"],
+                "additionalProperties": False
+            }
+        },
+        "scoring": {
+            "type": "object",
+            "properties": {
+                "puntuacion": {"type": "number", "minimum": 0, "maximum": 100},
+                "nivel": _NIVEL_RIESGO,
+                "umbral": {"type": "number", "minimum": 0},
+                "factores_positivos": _LISTA_TEXTO,
+                "factores_negativos": _LISTA_TEXTO,
+                "recomendaciones": _LISTA_TEXTO
+            },
+            "required": ["puntuacion", "nivel", "umbral", "factores_positivos", "factores_negativos", "recomendaciones"],
+            "additionalProperties": False
+        }
+    },
+    "required": ["analisis_financiero", "analisis_digital", "analisis_referencias", "riesgos", "scoring"],
+    "additionalProperties": False
+}
+
+ESQUEMA_SIMULACION = {
+    "type": "object",
+    "properties": {
+        "scoring_mejorado": {"type": "number", "minimum": 0, "maximum": 100},
+        "nivel_riesgo": _NIVEL_RIESGO,
+        "umbral_credito": {"type": "number", "minimum": 0},
+        "recomendaciones": _LISTA_TEXTO
+    },
+    "required": ["scoring_mejorado", "nivel_riesgo", "umbral_credito", "recomendaciones"],
+    "additionalProperties": False
+}
+
+_TIPOS_JSON = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'number': (int, float),
+    'integer': int,
+    'boolean': bool
+}
+
+def extraerJson(texto: str) -> Optional[Any]:
+    """
+    Recupera un objeto JSON de una respuesta del LLM.
+
+    Tolera bloques de código markdown y texto antes o después del JSON.
+
+    Args:
+        texto (str): Contenido de la respuesta
+
+    Returns:
+        Optional[Any]: Objeto decodificado o None si no hay JSON recuperable
+    """
+    if not texto:
+        return None
+
+    texto = texto.strip()
+    try:
+        return json.loads(texto)
+    except json.JSONDecodeError:
+        pass
+
+    # Contenido dentro de ```json ... ```
+    for bloque in re.findall(r'```(?:json)?\s*(.*?)```', texto, re.DOTALL):
+        try:
+            return json.loads(bloque.strip())
+        except json.JSONDecodeError:
+            continue
+
+    # Primer objeto o arreglo decodificable dentro de la prosa
+    decodificador = json.JSONDecoder()
+    for posicion, caracter in enumerate(texto):
+        if caracter not in '{[':
+            continue
+        try:
+            objeto, _ = decodificador.raw_decode(texto, posicion)
+            return objeto
+        except json.JSONDecodeError:
+            continue
+
+    return None
+
+def validarEsquema(datos: Any, esquema: Dict[str, Any], ruta: str = '$') -> List[str]:
+    """
+    Valida datos contra un subconjunto de JSON Schema (type, properties,
+    required, items, enum, minimum, maximum).
+
+    Args:
+        datos (Any): Datos a validar
+        esquema (Dict): Esquema JSON
+        ruta (str): Ruta actual para los mensajes de error
+
+    Returns:
+        List[str]: Errores encontrados (vacía si es válido)
+    """
+    errores = []
+    tipo = esquema.get('type')
+
+    if tipo:
+        # Un tipo puede ser una lista, p. ej. ["number", "null"]
+        tipos = tipo if isinstance(tipo, list) else [tipo]
+        if datos is None and 'null' in tipos:
+            return []
+
+        tipo = next((t for t in tipos if t != 'null' and isinstance(datos, _TIPOS_JSON[t])
+                     and not (t in ('number', 'integer') and isinstance(datos, bool))), None)
+        if tipo is None:
+            return [f"{ruta}: se esperaba {'/'.join(tipos)}"]
+
+    if 'enum' in esquema and datos not in esquema['enum']:
+        errores.append(f"{ruta}: valor {datos!r} fuera de {esquema['enum']}")
+
+    if 'minimum' in esquema and datos < esquema['minimum']:
+        errores.append(f"{ruta}: {datos} menor que {esquema['minimum']}")
+    if 'maximum' in esquema and datos > esquema['maximum']:
+        errores.append(f"{ruta}: {datos} mayor que {esquema['maximum']}")
+
+    if tipo == 'object':
+        for campo in esquema.get('required', []):
+            if campo not in datos:
+                errores.append(f"{ruta}.{campo}: campo requerido")
+        for campo, subesquema in esquema.get('properties', {}).items():
+            if campo in datos:
+                errores.extend(validarEsquema(datos[campo], subesquema, f"{ruta}.{campo}"))
+
+    if tipo == 'array' and 'items' in esquema:
+        for i, elemento in enumerate(datos):
+            errores.extend(validarEsquema(elemento, esquema['items'], f"{ruta}[{i}]"))
+
+    return errores
+
+def _vincularFormato(llm, esquema: Dict[str, Any], nombre: str):
+    """Configura el LLM para que el proveedor restrinja la salida al esquema."""
+    if LLM_SALIDA_ESTRUCTURADA == 'json_schema':
+        return llm.bind(response_format={
+            "type": "json_schema",
+            "json_schema": {"name": nombre, "schema": esquema, "strict": True}
+        })
+    if LLM_SALIDA_ESTRUCTURADA == 'json_object':
+        return llm.bind(response_format={"type": "json_object"})
+    return llm
+
+def invocarLlmJson(llm, prompt: str, esquema: Dict[str, Any], operacion: str) -> Optional[Dict[str, Any]]:
+    """
+    Invoca el LLM esperando un JSON que cumpla el esquema.
+
+    Usa salida estructurada del proveedor, recupera JSON envuelto en prosa o
+    bloques de código y, si aún no es válido, pide una reparación acotada
+    enviando la respuesta previa y los errores (sin repetir el análisis).
+
+    Args:
+        llm: Instancia de ChatOpenAI
+        prompt (str): Prompt de la tarea
+        esquema (Dict): Esquema JSON esperado
+        operacion (str): Nombre de la operación para las métricas
+
+    Returns:
+        Optional[Dict]: JSON validado o None si se debe usar el respaldo
+    """
+    with imputarConsumo(operacion):
+        incrementarContador('llm_json_solicitudes_total', operacion=operacion)
+        from .llmCallbacks import ContadorTokens
+        contador = ContadorTokens()
+        llm_estructurado = _vincularFormato(llm, esquema, operacion)
+        tokens_registrados = 0
+
+        try:
+            contenido = llm_estructurado.invoke(prompt, config={'callbacks': [contador]}).content
+
+            for intento in range(LLM_MAX_REPARACIONES_JSON + 1):
+                datos = extraerJson(contenido)
+                errores = validarEsquema(datos, esquema) if datos is not None else ["la respuesta no contiene JSON"]
+
+                if not errores:
+                    if intento > 0:
+                        incrementarContador('llm_json_reparaciones_total', operacion=operacion, resultado='exito')
+                    return datos
+
+                incrementarContador('llm_json_fallos_parseo_total', operacion=operacion)
+                logger.warning(f"Respuesta JSON inválida en {operacion}: {'; '.join(errores[:3])}")
+
+                if intento == LLM_MAX_REPARACIONES_JSON:
+                    if intento > 0:
+                        incrementarContador('llm_json_reparaciones_total', operacion=operacion, resultado='fallo')
+                    break
+
+                # La respuesta descartada se contabiliza como tokens desperdiciados
+                incrementarContador('llm_json_tokens_desperdiciados_total', contador.total_tokens - tokens_registrados, operacion=operacion)
+                tokens_registrados = contador.total_tokens
+
+                prompt_reparacion = f"""
+                La siguiente respuesta debía ser un JSON válido según el esquema indicado, pero tiene errores.
+
+                ESQUEMA:
+                {json.dumps(esquema)}
+
+                ERRORES:
+                {json.dumps(errores[:10], ensure_ascii=False)}
+
+                RESPUESTA:
+                {contenido}
+
+                Devuelve SOLO el JSON corregido, sin texto adicional.
+                """
+                contenido = llm_estructurado.invoke(prompt_reparacion, config={'callbacks': [contador]}).content
+
+        except Exception:
+            incrementarContador('llm_json_respaldo_total', operacion=operacion)
+            raise
+
+        incrementarContador('llm_json_respaldo_total', operacion=operacion)
+        incrementarContador('llm_json_tokens_desperdiciados_total', contador.total_tokens - tokens_registrados, operacion=operacion)
+        return None
@@ -0,0 +1,185 @@
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+from .config import LLM_PRECIOS, LLM_PRESUPUESTO_SESION_USD
+from .metrics import describirMetrica, incrementarContador
+
+describirMetrica('llm_tokens_total', 'Tokens consumidos por modelo, tipo (entrada/salida/entrada_cacheada), endpoint y operación')
+describirMetrica('llm_costo_usd_total', 'Costo estimado en USD por modelo y endpoint')
+describirMetrica('llm_presupuesto_degradaciones_total', 'Llamadas desviadas al modelo económico por presupuesto de sesión agotado')
+
+class RegistroConsumo:
+    """Acumulador thread-safe de tokens y costo desglosado por modelo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tokens_entrada = 0
+        self.tokens_entrada_cacheados = 0
+        self.tokens_salida = 0
+        self.costo_usd = 0.0
+        self.llamadas = 0
+        self.por_modelo: Dict[str, Dict[str, float]] = {}
+
+    def sumar(self, modelo: str, tokens_entrada: int, tokens_salida: int, costo_usd: float, tokens_cacheados: int = 0):
+        with self._lock:
+            self.tokens_entrada += tokens_entrada
+            self.tokens_entrada_cacheados += tokens_cacheados
+            self.tokens_salida += tokens_salida
+            self.costo_usd += costo_usd
+            self.llamadas += 1
+            detalle = self.por_modelo.setdefault(modelo, {'tokens_entrada': 0, 'tokens_entrada_cacheados': 0, 'tokens_salida': 0,
+                                                          'costo_usd': 0.0, 'llamadas': 0})
+            detalle['tokens_entrada'] += tokens_entrada
+            detalle['tokens_entrada_cacheados'] += tokens_cacheados
+            detalle['tokens_salida'] += tokens_salida
+            detalle['costo_usd'] += costo_usd
+            detalle['llamadas'] += 1
+
+    def resumen(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'tokens_entrada': self.tokens_entrada,
+                'tokens_entrada_cacheados': self.tokens_entrada_cacheados,
+                'tokens_salida': self.tokens_salida,
+                'tokens_total': self.tokens_entrada + self.tokens_salida,
+                'costo_usd': round(self.costo_usd, 6),
+                'llamadas': self.llamadas,
+                'por_modelo': {
+                    modelo: {**detalle, 'costo_usd': round(detalle['costo_usd'], 6)}
+                    for modelo, detalle in self.por_modelo.items()
+                }
+            }
+
+# Contexto de la petición en curso: acumulador, endpoint y sesión
+_consumo_peticion: contextvars.ContextVar = contextvars.ContextVar('consumo_peticion', default=None)
+_endpoint: contextvars.ContextVar = contextvars.ContextVar('endpoint', default='ninguno')
+_sesion: contextvars.ContextVar = contextvars.ContextVar('sesion', default=None)
+_operacion: contextvars.ContextVar = contextvars.ContextVar('operacion', default='general')
+
+# Acumuladores por sesión de chat (en memoria, como sesiones_db)
+_lock_sesiones = threading.Lock()
+_consumo_sesiones: Dict[str, RegistroConsumo] = {}
+
+def iniciarConsumoPeticion(endpoint: str, session_id: Optional[str] = None) -> RegistroConsumo:
+    """
+    Abre el acumulador de consumo de la petición actual.
+
+    Args:
+        endpoint (str): Nombre del endpoint (etiqueta de las métricas)
+        session_id (str): Sesión a la que se imputa el consumo, si existe
+
+    Returns:
+        RegistroConsumo: Acumulador de la petición
+    """
+    registro = RegistroConsumo()
+    _consumo_peticion.set(registro)
+    _endpoint.set(endpoint)
+    _sesion.set(session_id)
+    return registro
+
+def asignarSesion(session_id: Optional[str]):
+    """Imputa el consumo restante de la petición a una sesión."""
+    _sesion.set(session_id)
+
+@contextmanager
+def imputarConsumo(operacion: str):
+    """
+    Imputa las llamadas al LLM del bloque a una operación (scoring, chat, ...).
+
+    Args:
+        operacion (str): Etiqueta de operación para las métricas de tokens
+    """
+    token = _operacion.set(operacion)
+    try:
+        yield
+    finally:
+        _operacion.reset(token)
+
+def obtenerConsumoPeticion() -> Dict[str, Any]:
+    """Retorna el resumen de consumo de la petición actual."""
+    registro = _consumo_peticion.get()
+    return registro.resumen() if registro else RegistroConsumo().resumen()
+
+def obtenerConsumoSesion(session_id: str) -> Optional[Dict[str, Any]]:
+    """Retorna el consumo acumulado de una sesión (None si no tiene consumo)."""
+    with _lock_sesiones:
+        registro = _consumo_sesiones.get(session_id)
+    if registro is None:
+        return None
+    return {
+        **registro.resumen(),
+        'presupuesto_usd': LLM_PRESUPUESTO_SESION_USD or None,
+        'presupuesto_agotado': presupuestoAgotado(session_id)
+    }
+
+def calcularCosto(modelo: str, tokens_entrada: int, tokens_salida: int, tokens_cacheados: int = 0) -> float:
+    """
+    Calcula el costo en USD según la tabla de precios por millón de tokens.
+
+    Los nombres con sufijo de versión (gpt-4o-mini-2024-07-18) usan el precio
+    del modelo base; un modelo desconocido cuesta 0. Los tokens cacheados son
+    parte de los de entrada y se cobran al precio de 'entrada_cacheada'.
+    """
+    precio = LLM_PRECIOS.get(modelo)
+    if precio is None:
+        base = max((m for m in LLM_PRECIOS if modelo.startswith(m)), key=len, default=None)
+        precio = LLM_PRECIOS.get(base, {})
+    tokens_cacheados = min(tokens_cacheados, tokens_entrada)
+    return ((tokens_entrada - tokens_cacheados) * precio.get('entrada', 0)
+            + tokens_cacheados * precio.get('entrada_cacheada', precio.get('entrada', 0))
+            + tokens_salida * precio.get('salida', 0)) / 1_000_000
+
+def registrarConsumo(modelo: str, tokens_entrada: int, tokens_salida: int = 0, operacion: Optional[str] = None,
+                     tokens_cacheados: int = 0):
+    """
+    Registra el consumo de una llamada al LLM o a embeddings.
+
+    Se imputa a la petición y sesión del contexto y se exporta como métricas
+    por modelo, endpoint y operación.
+
+    Args:
+        modelo (str): Modelo que atendió la llamada
+        tokens_entrada (int): Tokens del prompt (o del texto vectorizado)
+        tokens_salida (int): Tokens generados
+        operacion (str): Operación; por defecto la fijada con imputarConsumo
+        tokens_cacheados (int): Tokens del prompt servidos desde el prompt cache del proveedor
+    """
+    operacion = operacion or _operacion.get()
+    costo = calcularCosto(modelo, tokens_entrada, tokens_salida, tokens_cacheados)
+    endpoint = _endpoint.get()
+
+    incrementarContador('llm_tokens_total', tokens_entrada, modelo=modelo, tipo='entrada', endpoint=endpoint, operacion=operacion)
+    if tokens_cacheados:
+        incrementarContador('llm_tokens_total', tokens_cacheados, modelo=modelo, tipo='entrada_cacheada', endpoint=endpoint, operacion=operacion)
+    if tokens_salida:
+        incrementarContador('llm_tokens_total', tokens_salida, modelo=modelo, tipo='salida', endpoint=endpoint, operacion=operacion)
+    incrementarContador('llm_costo_usd_total', costo, modelo=modelo, endpoint=endpoint)
+
+    registro = _consumo_peticion.get()
+    if registro is not None:
+        registro.sumar(modelo, tokens_entrada, tokens_salida, costo, tokens_cacheados)
+
+    session_id = _sesion.get()
+    if session_id:
+        with _lock_sesiones:
+            registro_sesion = _consumo_sesiones.setdefault(session_id, RegistroConsumo())
+        registro_sesion.sumar(modelo, tokens_entrada, tokens_salida, costo, tokens_cacheados)
+
+def presupuestoAgotado(session_id: Optional[str] = None) -> bool:
+    """
+    Indica si la sesión (por defecto, la del contexto) superó su presupuesto.
+
+    Returns:
+        bool: False si no hay presupuesto configurado o no hay sesión
+    """
+    session_id = session_id or _sesion.get()
+    if not LLM_PRESUPUESTO_SESION_USD or not session_id:
+        return False
+    with _lock_sesiones:
+        registro = _consumo_sesiones.get(session_id)
+    return registro is not None and registro.costo_usd >= LLM_PRESUPUESTO_SESION_USD
+
+def estimarTokens(texto: str) -> int:
+    """Aproximación de tokens (4 caracteres por token) para llamadas sin uso reportado."""
+    return max(1, len(texto) // 4)
@@ -1,9 +1,21 @@
 import re
 import json
-import requests
-from bs4 import BeautifulSoup
-from typing import Dict, List, Any
-from .config import obtenerLlm
+from email.utils import formatdate
+from typing import TYPE_CHECKING, Dict, List, Any, Optional
+from .config import obtenerLlm, SCORING_MODO, DOC_LARGO_UMBRAL
+from .scoringLocal import generarScoringLocal
+from .longDocument import resumirDocumentoLargo
+from .structuredOutput import invocarLlmJson, ESQUEMA_SCORING
+from .logs import obtenerLogger
+from .metrics import describirMetrica, incrementarContador, medirEtapa
+
+logger = obtenerLogger('utils')
+
+# requests y BeautifulSoup se importan en el primer scraping
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+describirMetrica('scoring_total', 'Scorings generados por método (reglas, llm, respaldo)')
 
 def scrapingRedSocial(url: str) -> Dict[str, Any]:
     """
@@ -15,6 +27,9 @@ def scrapingRedSocial(url: str) -> Dict[str, Any]:
     Returns:
         Dict[str, Any]: Datos extraídos de la red social
     """
+    import requests
+    from bs4 import BeautifulSoup
+    
     try:
         # Headers para simular un navegador real
         headers = {
@@ -22,11 +37,13 @@ def scrapingRedSocial(url: str) -> Dict[str, Any]:
         }
         
         # Realizar solicitud HTTP
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
+        with medirEtapa('scraping_http'):
+            response = requests.get(url, headers=headers, timeout=10)
+            response.raise_for_status()
         
         # Parsear HTML
-        soup = BeautifulSoup(response.content, 'html.parser')
+        with medirEtapa('scraping_parseo'):
+            soup = BeautifulSoup(response.content, 'html.parser')
         
         # Extraer información básica
         titulo = soup.find('title')
@@ -57,23 +74,23 @@ def scrapingRedSocial(url: str) -> Dict[str, Any]:
             'indicadores_comerciales': indicadores_comercio,
             'sentimiento': sentimiento,
             'reviews_count': reviews_count,
-            'timestamp': requests.utils.formatdate(),
+            'timestamp': formatdate(),
             'longitud_contenido': len(texto_principal),
             'tipo_sitio': determinarTipoSitio(url, soup)
         }
         
-        print(f"Scraping completado para: {url}")
+        logger.info("Scraping completado", extra={'campos': {'url': url}})
         return datos_extraidos
         
     except requests.RequestException as e:
-        print(f"Error de red en scraping: {str(e)}")
+        logger.warning(f"Error de red en scraping: {str(e)}")
         return generarDatosSimulados(url, "Error de conexión")
         
     except Exception as e:
-        print(f"Error general en scraping: {str(e)}")
+        logger.error(f"Error general en scraping: {str(e)}")
         return generarDatosSimulados(url, "Error de procesamiento")
 
-def buscarIndicadoresComerciales(soup: BeautifulSoup) -> List[str]:
+def buscarIndicadoresComerciales(soup: 'BeautifulSoup') -> List[str]:
     """Busca indicadores de actividad comercial en el contenido."""
     indicadores = []
     
@@ -125,7 +142,7 @@ def analizarSentimientoBasico(texto: str) -> Dict[str, Any]:
         'confianza': abs(puntos_positivos - puntos_negativos) / max(len(texto.split()), 1)
     }
 
-def contarReviews(soup: BeautifulSoup) -> int:
+def contarReviews(soup: 'BeautifulSoup') -> int:
     """Intenta contar reviews o comentarios en la página."""
     # Selectores comunes para reviews
     selectores_reviews = [
@@ -140,7 +157,7 @@ def contarReviews(soup: BeautifulSoup) -> int:
     
     return total_reviews
 
-def determinarTipoSitio(url: str, soup: BeautifulSoup) -> str:
+def determinarTipoSitio(url: str, soup: 'BeautifulSoup') -> str:
     """Determina el tipo de sitio web basado en la URL y contenido."""
     url_lower = url.lower()
     
@@ -178,7 +195,7 @@ def generarDatosSimulados(url: str, motivo: str) -> Dict[str, Any]:
             'confianza': 0.5
         },
         'reviews_count': 0,
-        'timestamp': requests.utils.formatdate(),
+        'timestamp': formatdate(),
         'longitud_contenido': 0,
         'tipo_sitio': 'no_disponible',
         'simulado': True,
@@ -216,24 +233,61 @@ def validarRUC(ruc: str) -> bool:
         # Aquí se implementaría el algoritmo de validación del dígito verificador
         # Por simplicidad, asumimos válido si pasa las verificaciones básicas
         
-        print(f"RUC {ruc} validado correctamente")
+        logger.debug(f"RUC {ruc} validado correctamente")
         return True
         
     except Exception as e:
-        print(f"Error al validar RUC: {str(e)}")
+        logger.error(f"Error al validar RUC: {str(e)}")
         return False
 
-def generarScoring(texto_financiero: str, datos_sociales: Dict[str, Any]) -> Dict[str, Any]:
+def generarScoring(texto_financiero: str, datos_sociales: Dict[str, Any],
+                   partidas: Optional[Dict[str, Optional[float]]] = None) -> Dict[str, Any]:
     """
     Genera scoring financiero usando IA basado en datos tradicionales y no tradicionales.
     
+    Primero se calcula un scoring local por ratios; el LLM solo se invoca cuando
+    ese resultado es ambiguo (o siempre, si SCORING_MODO es 'llm').
+    
     Args:
         texto_financiero (str): Texto extraído de estados financieros
         datos_sociales (Dict): Datos de redes sociales y web
+        partidas (Dict): Partidas ya extraídas (p. ej. las del último ejercicio de un expediente);
+            si se omite se extraen del texto
         
     Returns:
         Dict[str, Any]: Scoring completo con análisis
     """
+    with medirEtapa('scoring_local'):
+        scoring_local = generarScoringLocal(texto_financiero, datos_sociales, partidas=partidas)
+    
+    if SCORING_MODO == 'local' or (SCORING_MODO == 'hibrido' and scoring_local['decisivo']):
+        logger.info("Scoring generado localmente a partir de ratios")
+        incrementarContador('scoring_total', metodo='reglas')
+        return scoring_local['resultado']
+    
+    texto_prompt = texto_financiero[:DOC_LARGO_UMBRAL]
+    
+    if partidas is None and len(texto_financiero) > DOC_LARGO_UMBRAL:
+        # Documento largo: el prompt final usa un resumen de tamaño fijo. Con partidas del
+        # llamador (p. ej. un expediente) el texto ya es un resumen y esas cifras se conservan
+        try:
+            with medirEtapa('resumen_documento_largo'):
+                resumen = resumirDocumentoLargo(texto_financiero)
+            texto_prompt = resumen['resumen']
+            scoring_local = generarScoringLocal(texto_financiero, datos_sociales, partidas=resumen['partidas'])
+            
+            if SCORING_MODO == 'hibrido' and scoring_local['decisivo']:
+                logger.info("Scoring generado localmente a partir de las cifras del documento completo")
+                incrementarContador('scoring_total', metodo='reglas')
+                return scoring_local['resultado']
+                
+        except Exception as e:
+            logger.warning(f"Error al resumir documento largo: {str(e)}")
+    
+    # Si el LLM falla, el scoring por ratios es mejor respaldo que el genérico
+    respaldo = scoring_local['resultado'] if scoring_local['ratios'] else generarScoringPorDefecto()
+    respaldo['scoring']['metodo'] = 'respaldo'
+    
     try:
         llm = obtenerLlm()
         
@@ -244,7 +298,10 @@ def generarScoring(texto_financiero: str, datos_sociales: Dict[str, Any]) -> Dic
         Analiza los siguientes datos:
         
         DATOS FINANCIEROS:
-        {texto_financiero[:2000]}  # Limitar tamaño del prompt
+        {texto_prompt}
+        
+        RATIOS CALCULADOS A PARTIR DE LAS CIFRAS:
+        {json.dumps(scoring_local['ratios'])}
         
         DATOS DIGITALES/SOCIALES:
         {json.dumps(datos_sociales, indent=2)}
@@ -297,21 +354,43 @@ def generarScoring(texto_financiero: str, datos_sociales: Dict[str, Any]) -> Dic
         }}
         """
         
-        respuesta = llm.invoke(prompt)
+        with medirEtapa('llm', operacion='scoring'):
+            scoring_data = invocarLlmJson(llm, prompt, ESQUEMA_SCORING, 'scoring')
         
-        try:
-            # Intentar parsear la respuesta como JSON
-            scoring_data = json.loads(respuesta.content)
-            print("Scoring generado exitosamente con IA")
-            return scoring_data
-            
-        except json.JSONDecodeError:
-            print("Error al parsear respuesta de IA, usando scoring por defecto")
-            return generarScoringPorDefecto()
+        if scoring_data is None:
+            logger.warning("Respuesta de IA inválida, usando scoring de respaldo")
+            incrementarContador('scoring_total', metodo='respaldo')
+            return respaldo
+        
+        scoring_data['scoring']['metodo'] = 'llm'
+        logger.info("Scoring generado exitosamente con IA")
+        incrementarContador('scoring_total', metodo='llm')
+        return scoring_data
             
     except Exception as e:
-        print(f"Error al generar scoring: {str(e)}")
-        return generarScoringPorDefecto()
+        logger.error(f"Error al generar scoring: {str(e)}")
+        incrementarContador('scoring_total', metodo='respaldo')
+        return respaldo
+
+def formatearResultadoAnalisis(scoring_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Da al scoring la forma de respuesta que consume el frontend en /analyze.
+    
+    Args:
+        scoring_data (Dict): Resultado de generarScoring
+        
+    Returns:
+        Dict[str, Any]: Secciones, riesgos y scoring
+    """
+    return {
+        'secciones': {
+            'financiera': scoring_data.get('analisis_financiero', []),
+            'digital': scoring_data.get('analisis_digital', []),
+            'referencias': scoring_data.get('analisis_referencias', [])
+        },
+        'riesgos': scoring_data.get('riesgos', []),
+        'scoring': scoring_data.get('scoring', {'nivel': 'medio', 'umbral': 30000})
+    }
 
 def generarScoringPorDefecto() -> Dict[str, Any]:
     """Genera un scoring por defecto cuando falla la IA."""
@@ -1,125 +1,423 @@
 import os
-import chromadb
-from chromadb.config import Settings
-from typing import List, Dict, Any
-from .config import obtenerLlmEmbedding
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import uuid
+from typing import TYPE_CHECKING, Callable, List, Dict, Any, Optional, Tuple
+from .config import (
+    obtenerLlmEmbedding, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, CHROMA_ESPACIO, CHROMA_HNSW_M, CHROMA_HNSW_EF_CONSTRUCCION, CHROMA_HNSW_EF_BUSQUEDA,
+    VECTORES_RETENCION_DIAS, VECTORES_RETENCION_ACTIVA, VECTORES_COMPACTACION_UMBRAL, VECTORES_MANTENIMIENTO_INTERVALO_S,
+    VECTORES_BACKEND, VECTORES_NUMPY_TIPO
+)
 from .pdfProcessor import dividirTextoEnChunks
+from . import documentCatalog as catalogo
+from . import numpyStore
+from .llmScheduler import prioridadLlm
+from .logs import obtenerLogger
+from .metrics import describirMetrica, incrementarContador, medirEtapa, registrarCache
+from .tokenUsage import registrarConsumo, estimarTokens
+
+logger = obtenerLogger('vectorStore')
+
+describirMetrica('chunks_embebidos_total', 'Chunks vectorizados durante la ingesta')
+describirMetrica('embedding_errores_total', 'Chunks cuyo embedding falló y no se cargaron')
+describirMetrica('documentos_eliminados_total', 'Documentos eliminados de la base vectorial por motivo (solicitud, retencion)')
+describirMetrica('compactaciones_total', 'Colecciones reconstruidas sin los chunks eliminados')
+describirMetrica('migraciones_embedding_total', 'Colecciones migradas a otro modelo o dimensión de embeddings por modo')
+describirMetrica('snapshots_total', 'Snapshots de colecciones exportados e importados por operación y tipo (completo, delta)')
+
+# Lote de lectura/escritura al copiar y borrar chunks
+TAMANO_LOTE_CHROMA = 1000
+
+# Colecciones creadas antes de registrar el embedding en sus metadatos
+MODELO_LEGADO = "text-embedding-3-small"
+DIMENSIONES_LEGADO = 1536
+
+# chromadb se importa al abrir el primer cliente
+if TYPE_CHECKING:
+    import chromadb
+    import numpy as np
+    from langchain_openai import OpenAIEmbeddings
 
 # Configuración de ChromaDB
-CHROMA_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'chromadb')
+CHROMA_DB_PATH = os.getenv('CHROMA_DB_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'chromadb'))
+
+# Colecciones del backend NumPy, junto a los datos de ChromaDB
+NUMPY_DB_PATH = os.getenv('NUMPY_DB_PATH', os.path.join(CHROMA_DB_PATH, 'numpy'))
+
+_lock_cliente = threading.Lock()
+_clientes = {}
+
+def obtenerClienteChroma() -> 'chromadb.ClientAPI':
+    """
+    Retorna el cliente persistente de ChromaDB del proceso, creándolo una sola vez.
+
+    El cliente se comparte entre hilos y se recrea en procesos hijos (fork),
+    que no deben heredar la conexión SQLite del padre.
+
+    Returns:
+        chromadb.ClientAPI: Cliente de ChromaDB
+    """
+    clave = (os.getpid(), CHROMA_DB_PATH)
+    cliente = _clientes.get(clave)
+    if cliente is not None:
+        return cliente
+
+    with _lock_cliente:
+        if clave not in _clientes:
+            import chromadb
+            from chromadb.config import Settings
+
+            with medirEtapa('chroma_cliente'):
+                _clientes[clave] = chromadb.PersistentClient(
+                    path=CHROMA_DB_PATH,
+                    settings=Settings(
+                        anonymized_telemetry=False,
+                        allow_reset=True
+                    )
+                )
+        return _clientes[clave]
+
+def parametrosIndice(espacio: str = CHROMA_ESPACIO, hnsw_m: int = CHROMA_HNSW_M,
+                     ef_construccion: int = CHROMA_HNSW_EF_CONSTRUCCION, ef_busqueda: int = CHROMA_HNSW_EF_BUSQUEDA) -> Dict[str, Any]:
+    """
+    Metadatos 'hnsw:*' de ChromaDB para crear una colección.
+    
+    Args:
+        espacio (str): Distancia del índice: 'cosine', 'l2' (cuadrática) o 'ip'
+        hnsw_m (int): Vecinos por nodo del grafo (más = mejor recall, más memoria)
+        ef_construccion (int): Candidatos evaluados al insertar
+        ef_busqueda (int): Candidatos evaluados por consulta (recall contra latencia)
+        
+    Returns:
+        Dict[str, Any]: Metadatos de la colección
+    """
+    if espacio not in ('cosine', 'l2', 'ip'):
+        raise ValueError(f"Espacio de distancia no soportado: {espacio}")
+    return {
+        'hnsw:space': espacio,
+        'hnsw:M': hnsw_m,
+        'hnsw:construction_ef': ef_construccion,
+        'hnsw:search_ef': ef_busqueda
+    }
+
+def espacioDeColeccion(coleccion: 'chromadb.Collection') -> str:
+    """Espacio de distancia de una colección (las de ChromaDB creadas sin parámetros usan 'l2')."""
+    metadata = coleccion.metadata or {}
+    return metadata.get('hnsw:space') or metadata.get('espacio', 'l2')
+
+def modeloDeColeccion(coleccion: 'chromadb.Collection') -> str:
+    """Modelo de embeddings con que se vectorizó la colección."""
+    return (coleccion.metadata or {}).get('embedding_modelo', MODELO_LEGADO)
 
-def crearBaseDeConocimiento(nombre_coleccion: str = "pyme_financial_docs") -> chromadb.Collection:
+def dimensionesDeColeccion(coleccion: 'chromadb.Collection') -> int:
+    """Dimensión de los embeddings de la colección."""
+    return int((coleccion.metadata or {}).get('embedding_dimensiones', DIMENSIONES_LEGADO))
+
+def embeddingDeColeccion(coleccion: 'chromadb.Collection') -> 'OpenAIEmbeddings':
+    """Función de embeddings compatible con los vectores de la colección."""
+    return obtenerLlmEmbedding(modeloDeColeccion(coleccion), dimensionesDeColeccion(coleccion))
+
+def backendDeColeccion(coleccion: 'chromadb.Collection') -> str:
+    """'numpy' o 'chroma'."""
+    return 'numpy' if isinstance(coleccion, numpyStore.ColeccionNumpy) else 'chroma'
+
+def _abrirColeccion(fisica: str) -> 'chromadb.Collection':
+    """Abre una colección física existente del backend que la contenga."""
+    if numpyStore.existeColeccion(NUMPY_DB_PATH, fisica):
+        return numpyStore.ColeccionNumpy(os.path.join(NUMPY_DB_PATH, fisica))
+    if not os.path.exists(os.path.join(CHROMA_DB_PATH, 'chroma.sqlite3')):
+        # Sin datos de ChromaDB no hace falta cargarlo para saber que no existe
+        raise ValueError(f"Collection {fisica} does not exist.")
+    return obtenerClienteChroma().get_collection(name=fisica)
+
+def _crearColeccionFisica(fisica: str, metadata: Dict[str, Any], backend: str) -> 'chromadb.Collection':
+    """Crea una colección física vacía en el backend indicado."""
+    if backend == 'numpy':
+        metadata = {clave: valor for clave, valor in metadata.items() if not clave.startswith('hnsw:')}
+        return numpyStore.crearColeccion(NUMPY_DB_PATH, fisica, metadata, metadata.pop('tipo_vector', VECTORES_NUMPY_TIPO))
+    if backend != 'chroma':
+        raise ValueError(f"Backend de vectores no soportado: {backend}")
+    return obtenerClienteChroma().create_collection(name=fisica, metadata=metadata)
+
+def _eliminarColeccionFisica(fisica: str):
+    """Elimina una colección física, sea cual sea su backend."""
+    if numpyStore.existeColeccion(NUMPY_DB_PATH, fisica):
+        numpyStore.eliminarColeccion(NUMPY_DB_PATH, fisica)
+    else:
+        obtenerClienteChroma().delete_collection(name=fisica)
+
+def distanciaARelevancia(distancia: float, espacio: str) -> float:
     """
-    Crea o recupera una base de conocimiento usando ChromaDB.
+    Convierte la distancia de ChromaDB en similitud coseno.
+    
+    Los embeddings están normalizados, así que los tres espacios dan la misma
+    escala y el umbral de relevancia no depende de cómo se creó la colección.
+    
+    Args:
+        distancia (float): Distancia devuelta por la consulta
+        espacio (str): Espacio de distancia de la colección
+        
+    Returns:
+        float: Similitud coseno (1 = idéntico)
+    """
+    if espacio == 'l2':
+        # ChromaDB devuelve la distancia euclídea al cuadrado: 2 - 2·cos
+        return 1 - distancia / 2
+    # 'cosine' (1 - cos) e 'ip' (1 - producto interno)
+    return 1 - distancia
+
+def nombreLogico(coleccion: 'chromadb.Collection') -> str:
+    """Nombre lógico (el del catálogo) de una colección física de ChromaDB."""
+    return (coleccion.metadata or {}).get('coleccion_logica', coleccion.name)
+
+def coleccionVigente(coleccion: 'chromadb.Collection') -> 'chromadb.Collection':
+    """
+    Retorna la colección física vigente si una compactación reemplazó a la recibida
+    (p. ej. la que guarda una sesión de chat o un lote en curso).
+    """
+    nombre = nombreLogico(coleccion)
+    fisica = catalogo.coleccionFisica(nombre)
+    if fisica == coleccion.name:
+        return coleccion
+    return _abrirColeccion(fisica)
+
+def crearBaseDeConocimiento(nombre_coleccion: str = "pyme_financial_docs", backend: Optional[str] = None,
+                            dimensiones: Optional[int] = None, **parametros_indice) -> 'chromadb.Collection':
+    """
+    Crea o recupera una base de conocimiento usando ChromaDB (o el backend NumPy).
+    
+    El nombre es lógico: el catálogo indica qué colección física lo respalda
+    (cambia tras cada compactación).
     
     Args:
         nombre_coleccion (str): Nombre de la colección en ChromaDB
+        backend (str): 'chroma' o 'numpy' para una colección nueva; por defecto VECTORES_BACKEND.
+            Una colección existente se abre con el backend con que se creó
+        dimensiones (int): Dimensión de los embeddings de una colección nueva; por defecto
+            EMBEDDING_DIMENSIONS. Una colección existente conserva la suya (ver migrarEmbeddings)
+        **parametros_indice: espacio, hnsw_m, ef_construccion y ef_busqueda
+            (ver parametrosIndice); por defecto los de la configuración
         
     Returns:
-        chromadb.Collection: Instancia de la colección de ChromaDB
+        chromadb.Collection: Instancia de la colección (ColeccionNumpy en el backend NumPy)
     """
     try:
-        # Crear cliente de ChromaDB
-        client = chromadb.PersistentClient(
-            path=CHROMA_DB_PATH,
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
-        )
+        backend = backend or VECTORES_BACKEND
+        indice = parametrosIndice(**parametros_indice)
+        fisica = catalogo.coleccionFisica(nombre_coleccion)
         
         # Crear o recuperar colección
         try:
-            coleccion = client.get_collection(name=nombre_coleccion)
-            print(f"Colección '{nombre_coleccion}' recuperada exitosamente")
+            coleccion = _abrirColeccion(fisica)
+            registrarCache('coleccion', True)
+            logger.debug("Colección recuperada", extra={'campos': {'coleccion': nombre_coleccion}})
+            
+            # Los parámetros del índice no se pueden cambiar en una colección existente
+            if backendDeColeccion(coleccion) == 'numpy':
+                return coleccion
+            actuales = {clave: (coleccion.metadata or {}).get(clave) for clave in indice}
+            actuales['hnsw:space'] = espacioDeColeccion(coleccion)
+            if any(actuales[clave] is not None and actuales[clave] != valor for clave, valor in indice.items()):
+                logger.warning("La colección usa otros parámetros de índice; recréala para aplicar los configurados",
+                               extra={'campos': {'coleccion': nombre_coleccion, 'actuales': actuales, 'configurados': indice}})
         except:
-            coleccion = client.create_collection(
-                name=nombre_coleccion,
-                metadata={"description": "Documentos financieros de PYMEs para análisis de riesgo"}
+            registrarCache('coleccion', False)
+            coleccion = _crearColeccionFisica(
+                fisica,
+                {
+                    "description": "Documentos financieros de PYMEs para análisis de riesgo",
+                    "coleccion_logica": nombre_coleccion,
+                    "embedding_modelo": EMBEDDING_MODEL,
+                    "embedding_dimensiones": dimensiones or EMBEDDING_DIMENSIONS,
+                    **indice
+                },
+                backend
             )
-            print(f"Colección '{nombre_coleccion}' creada exitosamente")
+            logger.info("Colección creada", extra={'campos': {'coleccion': nombre_coleccion, 'backend': backend,
+                                                              'dimensiones': dimensiones or EMBEDDING_DIMENSIONS, **indice}})
         
         return coleccion
         
     except Exception as e:
-        print(f"Error al crear base de conocimiento: {str(e)}")
+        logger.error(f"Error al crear base de conocimiento: {str(e)}")
         raise e
 
-def cargarDocumentosEnBaseDeConocimiento(coleccion: chromadb.Collection, documentos: List[Dict[str, Any]]) -> bool:
+def idDeDocumento(contenido: str, metadatos: Dict[str, Any]) -> str:
+    """
+    ID estable de un documento: el mismo contenido de la misma empresa y tipo
+    siempre produce los mismos IDs de chunk, así que reingestarlo no duplica.
+    
+    Args:
+        contenido (str): Texto del documento
+        metadatos (Dict): Metadatos con 'empresa_id' y 'tipo', si existen
+        
+    Returns:
+        str: Hash del documento (32 caracteres)
+    """
+    base = json.dumps([metadatos.get('empresa_id'), metadatos.get('tipo'), contenido], ensure_ascii=False)
+    return hashlib.sha256(base.encode('utf-8')).hexdigest()[:32]
+
+def diasDeRetencion(tipo: Optional[str]) -> float:
+    """Días de retención para un tipo de documento (0 = sin vencimiento)."""
+    return VECTORES_RETENCION_DIAS.get(tipo, VECTORES_RETENCION_DIAS.get('*', 0))
+
+def cargarDocumentosEnBaseDeConocimiento(coleccion: 'chromadb.Collection', documentos: List[Dict[str, Any]]) -> bool:
     """
     Carga documentos en la base de conocimiento vectorial.
     
+    Cada documento se registra en el catálogo con sus IDs de chunk. Un
+    documento que ya está en la colección no se vuelve a vectorizar: solo se
+    renueva su retención.
+    
     Args:
         coleccion (chromadb.Collection): Colección de ChromaDB
-        documentos (List[Dict]): Lista de documentos con 'contenido' y 'metadatos'
+        documentos (List[Dict]): Lista de documentos con 'contenido', 'metadatos' y,
+            opcionalmente, 'chunks' ya calculados
         
     Returns:
         bool: True si la carga fue exitosa
     """
     try:
-        # Obtener función de embedding
-        embedding_function = obtenerLlmEmbedding()
+        coleccion = coleccionVigente(coleccion)
+        nombre = nombreLogico(coleccion)
         
         textos_para_vectorizar = []
         metadatos_documentos = []
         ids_documentos = []
+        registros = []
+        sobrantes = []
+        renovados = 0
+        ingestado_en = time.time()
         
-        for i, doc in enumerate(documentos):
+        for doc in documentos:
             contenido = doc.get('contenido', '')
             metadatos = doc.get('metadatos', {})
             
             if not contenido:
                 continue
             
-            # Dividir texto en chunks
-            chunks = dividirTextoEnChunks(contenido)
+            # Dividir texto en chunks (o reutilizar los del almacén de artefactos)
+            chunks = doc.get('chunks')
+            if chunks is None:
+                with medirEtapa('chunking'):
+                    chunks = dividirTextoEnChunks(contenido)
+            
+            documento_id = idDeDocumento(contenido, metadatos)
+            chunk_ids = [f"{documento_id}_{j}" for j in range(len(chunks))]
+            registro = {
+                'documento_id': documento_id,
+                'chunk_ids': chunk_ids,
+                'empresa_id': metadatos.get('empresa_id'),
+                'tipo': metadatos.get('tipo'),
+                'archivo': metadatos.get('archivo'),
+                'ttl_dias': diasDeRetencion(metadatos.get('tipo'))
+            }
+            
+            existente = catalogo.obtenerDocumento(nombre, documento_id)
+            if existente and existente['chunk_ids'] == chunk_ids:
+                # Ya está en la colección: solo se renueva la retención
+                registrarCache('documento', True)
+                catalogo.registrarDocumento(nombre, **registro)
+                renovados += 1
+                continue
+            registrarCache('documento', False)
+            
+            if existente:
+                # Mismo documento con otro chunking: los chunks que ya no existen se quitan al escribir
+                sobrantes.extend(chunk_id for chunk_id in existente['chunk_ids'] if chunk_id not in set(chunk_ids))
             
             for j, chunk in enumerate(chunks):
-                chunk_id = f"doc_{i}_chunk_{j}"
-                
                 textos_para_vectorizar.append(chunk)
                 metadatos_documentos.append({
-                    **metadatos,
+                    **{clave: valor for clave, valor in metadatos.items() if valor is not None},
                     'chunk_index': j,
                     'total_chunks': len(chunks),
-                    'documento_id': i,
+                    'documento_id': documento_id,
+                    'ingestado_en': ingestado_en,
                     'texto_length': len(chunk)
                 })
-                ids_documentos.append(chunk_id)
+            ids_documentos.extend(chunk_ids)
+            registros.append(registro)
         
         if not textos_para_vectorizar:
-            print("No hay contenido para vectorizar")
+            if renovados:
+                logger.info("Documentos ya cargados, retención renovada", extra={'campos': {'documentos': renovados, 'coleccion': nombre}})
+                return True
+            logger.warning("No hay contenido para vectorizar")
             return False
         
+        # Obtener función de embedding (el modelo y la dimensión son los de la colección)
+        embedding_function = embeddingDeColeccion(coleccion)
+        
         # Generar embeddings
-        print(f"Generando embeddings para {len(textos_para_vectorizar)} chunks...")
+        logger.info("Generando embeddings", extra={'campos': {'chunks': len(textos_para_vectorizar)}})
         embeddings = []
+        fallidos = set()
         
-        for texto in textos_para_vectorizar:
-            try:
-                embedding = embedding_function.embed_query(texto)
-                embeddings.append(embedding)
-            except Exception as e:
-                print(f"Error al generar embedding: {str(e)}")
-                # Usar embedding vacío como fallback
-                embeddings.append([0.0] * 1536)  # Tamaño típico de OpenAI embeddings
-        
-        # Cargar en ChromaDB
-        coleccion.add(
-            documents=textos_para_vectorizar,
-            metadatas=metadatos_documentos,
-            ids=ids_documentos,
-            embeddings=embeddings
-        )
+        with medirEtapa('embedding_ingesta'):
+            for chunk_id, texto in zip(ids_documentos, textos_para_vectorizar):
+                try:
+                    embedding = embedding_function.embed_query(texto)
+                    embeddings.append(embedding)
+                except Exception as e:
+                    logger.warning(f"Error al generar embedding: {str(e)}")
+                    incrementarContador('embedding_errores_total')
+                    # El chunk no se carga; el catálogo no lo registra y la próxima ingesta lo reintenta
+                    fallidos.add(chunk_id)
+        incrementarContador('chunks_embebidos_total', len(embeddings))
+        # langchain no expone el uso de la API de embeddings: se estima por longitud
+        registrarConsumo(modeloDeColeccion(coleccion), sum(estimarTokens(t) for t in textos_para_vectorizar), operacion='embedding_ingesta')
+        
+        if fallidos:
+            conservar = [i for i, chunk_id in enumerate(ids_documentos) if chunk_id not in fallidos]
+            textos_para_vectorizar = [textos_para_vectorizar[i] for i in conservar]
+            metadatos_documentos = [metadatos_documentos[i] for i in conservar]
+            ids_documentos = [ids_documentos[i] for i in conservar]
+            for registro in registros:
+                registro['chunk_ids'] = [chunk_id for chunk_id in registro['chunk_ids'] if chunk_id not in fallidos]
+        if not embeddings:
+            logger.error("No se pudo generar ningún embedding")
+            return False
+        
+        # Escribir en la colección vigente y registrar en el catálogo sin que una
+        # reconstrucción cambie de colección física en medio
+        with catalogo.bloqueoDeEscritura(nombre):
+            vigente = coleccionVigente(coleccion)
+            if vigente.name != coleccion.name and \
+                    (modeloDeColeccion(vigente), dimensionesDeColeccion(vigente)) != (modeloDeColeccion(coleccion), dimensionesDeColeccion(coleccion)):
+                # Una migración cambió el modelo de embeddings mientras se vectorizaba
+                with medirEtapa('embedding_ingesta'):
+                    embeddings = embeddingDeColeccion(vigente).embed_documents(textos_para_vectorizar)
+            coleccion = vigente
+            
+            if sobrantes:
+                coleccion.delete(ids=sobrantes)
+                catalogo.sumarChunksEliminados(nombre, len(sobrantes))
+            
+            # Cargar en ChromaDB (upsert: los IDs son estables por documento)
+            with medirEtapa('chroma_insercion'):
+                coleccion.upsert(
+                    documents=textos_para_vectorizar,
+                    metadatas=metadatos_documentos,
+                    ids=ids_documentos,
+                    embeddings=embeddings
+                )
+            
+            for registro in registros:
+                if registro['chunk_ids']:
+                    catalogo.registrarDocumento(nombre, **registro)
         
-        print(f"Cargados {len(textos_para_vectorizar)} chunks en la base de conocimiento")
+        logger.info("Chunks cargados en la base de conocimiento", extra={'campos': {'chunks': len(textos_para_vectorizar), 'documentos': len(registros), 'coleccion': nombre}})
         return True
         
     except Exception as e:
-        print(f"Error al cargar documentos: {str(e)}")
+        logger.error(f"Error al cargar documentos: {str(e)}")
         return False
 
-def obtenerBaseDeConocimiento(nombre_coleccion: str = "pyme_financial_docs") -> chromadb.Collection:
+def obtenerBaseDeConocimiento(nombre_coleccion: str = "pyme_financial_docs") -> 'chromadb.Collection':
     """
     Recupera una base de conocimiento existente.
     
@@ -130,23 +428,35 @@ def obtenerBaseDeConocimiento(nombre_coleccion: str = "pyme_financial_docs") ->
         chromadb.Collection: Instancia de la colección
     """
     try:
-        client = chromadb.PersistentClient(
-            path=CHROMA_DB_PATH,
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
-        )
-        
-        coleccion = client.get_collection(name=nombre_coleccion)
+        coleccion = _abrirColeccion(catalogo.coleccionFisica(nombre_coleccion))
         return coleccion
         
     except Exception as e:
-        print(f"Error al obtener base de conocimiento: {str(e)}")
+        logger.warning(f"Error al obtener base de conocimiento: {str(e)}")
         # Si no existe, crear una nueva
         return crearBaseDeConocimiento(nombre_coleccion)
 
-def buscarEnBaseDeConocimiento(coleccion: chromadb.Collection, consulta: str, n_resultados: int = 5) -> List[Dict[str, Any]]:
+def embeberConsulta(coleccion: 'chromadb.Collection', consulta: str) -> List[float]:
+    """
+    Embedding de una consulta con el modelo y la dimensión de la colección vigente.
+    
+    Args:
+        coleccion (chromadb.Collection): Colección de ChromaDB
+        consulta (str): Consulta de búsqueda
+        
+    Returns:
+        List[float]: Embedding de la consulta
+    """
+    # La colección vigente decide el modelo y la dimensión de la consulta (cambian al migrar)
+    coleccion = coleccionVigente(coleccion)
+    embedding_function = embeddingDeColeccion(coleccion)
+    with medirEtapa('embedding_consulta'):
+        query_embedding = embedding_function.embed_query(consulta)
+    registrarConsumo(modeloDeColeccion(coleccion), estimarTokens(consulta), operacion='embedding_consulta')
+    return query_embedding
+
+def buscarEnBaseDeConocimiento(coleccion: 'chromadb.Collection', consulta: str, n_resultados: int = 5,
+                               embedding_consulta: Optional[List[float]] = None) -> List[Dict[str, Any]]:
     """
     Busca documentos relevantes en la base de conocimiento.
     
@@ -154,30 +464,39 @@ def buscarEnBaseDeConocimiento(coleccion: chromadb.Collection, consulta: str, n_
         coleccion (chromadb.Collection): Colección de ChromaDB
         consulta (str): Consulta de búsqueda
         n_resultados (int): Número máximo de resultados
+        embedding_consulta (List[float]): Embedding ya calculado de la consulta (ver embeberConsulta)
         
     Returns:
         List[Dict]: Lista de documentos relevantes con scores
     """
     try:
-        # Generar embedding para la consulta
-        embedding_function = obtenerLlmEmbedding()
-        query_embedding = embedding_function.embed_query(consulta)
+        coleccion = coleccionVigente(coleccion)
+        query_embedding = embedding_consulta or embeberConsulta(coleccion, consulta)
+        
+        if len(query_embedding) != dimensionesDeColeccion(coleccion):
+            logger.error("La dimensión del embedding de la consulta no coincide con la colección",
+                         extra={'campos': {'coleccion': nombreLogico(coleccion), 'consulta': len(query_embedding),
+                                           'coleccion_dimensiones': dimensionesDeColeccion(coleccion)}})
+            return []
         
         # Buscar documentos similares
-        resultados = coleccion.query(
-            query_embeddings=[query_embedding],
-            n_results=n_resultados,
-            include=['documents', 'metadatas', 'distances']
-        )
+        with medirEtapa('chroma_consulta'):
+            resultados = coleccion.query(
+                query_embeddings=[query_embedding],
+                n_results=n_resultados,
+                include=['documents', 'metadatas', 'distances']
+            )
         
         documentos_relevantes = []
+        espacio = espacioDeColeccion(coleccion)
         
         for i in range(len(resultados['documents'][0])):
             documento = {
+                'id': resultados['ids'][0][i],
                 'contenido': resultados['documents'][0][i],
                 'metadatos': resultados['metadatas'][0][i],
                 'distancia': resultados['distances'][0][i],
-                'relevancia': 1 - resultados['distances'][0][i]  # Convertir distancia a score de relevancia
+                'relevancia': distanciaARelevancia(resultados['distances'][0][i], espacio)
             }
             documentos_relevantes.append(documento)
         
@@ -187,7 +506,7 @@ def buscarEnBaseDeConocimiento(coleccion: chromadb.Collection, consulta: str, n_
         return documentos_relevantes
         
     except Exception as e:
-        print(f"Error en búsqueda: {str(e)}")
+        logger.error(f"Error en búsqueda: {str(e)}")
         return []
 
 def limpiarBaseDeConocimiento(nombre_coleccion: str = "pyme_financial_docs") -> bool:
@@ -201,23 +520,666 @@ def limpiarBaseDeConocimiento(nombre_coleccion: str = "pyme_financial_docs") ->
         bool: True si la limpieza fue exitosa
     """
     try:
-        client = chromadb.PersistentClient(
-            path=CHROMA_DB_PATH,
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
-        )
-        
-        # Eliminar colección existente
+        # Eliminar colección existente (la física vigente) y sus entradas del catálogo
         try:
-            client.delete_collection(name=nombre_coleccion)
-            print(f"Colección '{nombre_coleccion}' eliminada")
+            _eliminarColeccionFisica(catalogo.coleccionFisica(nombre_coleccion))
+            logger.info("Colección eliminada", extra={'campos': {'coleccion': nombre_coleccion}})
         except:
-            print(f"Colección '{nombre_coleccion}' no existía")
+            logger.info("Colección no existía", extra={'campos': {'coleccion': nombre_coleccion}})
+        catalogo.olvidarColeccion(nombre_coleccion)
         
         return True
         
     except Exception as e:
-        print(f"Error al limpiar base de conocimiento: {str(e)}")
-        return False
\ No newline at end of file
+        logger.error(f"Error al limpiar base de conocimiento: {str(e)}")
+        return False
+
+def eliminarDocumentos(documento_ids: List[str], nombre_coleccion: str = "pyme_financial_docs", motivo: str = 'solicitud') -> Dict[str, int]:
+    """
+    Elimina documentos (todos sus chunks) de la base de conocimiento y del catálogo.
+    
+    ChromaDB solo marca los vectores como borrados; el espacio se recupera
+    al compactar la colección.
+    
+    Args:
+        documento_ids (List[str]): IDs de documento del catálogo
+        nombre_coleccion (str): Nombre de la colección
+        motivo (str): Etiqueta de la métrica ('solicitud' o 'retencion')
+        
+    Returns:
+        Dict[str, int]: Documentos y chunks eliminados
+    """
+    chunk_ids = []
+    encontrados = []
+    for documento_id in documento_ids:
+        documento = catalogo.obtenerDocumento(nombre_coleccion, documento_id)
+        if documento:
+            encontrados.append(documento_id)
+            chunk_ids.extend(documento['chunk_ids'])
+    
+    if not encontrados:
+        return {'documentos': 0, 'chunks': 0}
+    
+    with catalogo.bloqueoDeEscritura(nombre_coleccion):
+        coleccion = obtenerBaseDeConocimiento(nombre_coleccion)
+        for inicio in range(0, len(chunk_ids), TAMANO_LOTE_CHROMA):
+            coleccion.delete(ids=chunk_ids[inicio:inicio + TAMANO_LOTE_CHROMA])
+        chunks = catalogo.quitarDocumentos(nombre_coleccion, encontrados)
+    
+    incrementarContador('documentos_eliminados_total', len(encontrados), motivo=motivo)
+    logger.info("Documentos eliminados", extra={'campos': {'documentos': len(encontrados), 'chunks': chunks, 'motivo': motivo, 'coleccion': nombre_coleccion}})
+    return {'documentos': len(encontrados), 'chunks': chunks}
+
+def eliminarDocumentosDeEmpresa(empresa_id: str, nombre_coleccion: str = "pyme_financial_docs") -> Dict[str, int]:
+    """
+    Elimina todos los documentos de una empresa.
+    
+    Args:
+        empresa_id (str): ID de la empresa
+        nombre_coleccion (str): Nombre de la colección
+        
+    Returns:
+        Dict[str, int]: Documentos y chunks eliminados
+    """
+    documentos = catalogo.listarDocumentos(nombre_coleccion, empresa_id=empresa_id, limite=-1)
+    return eliminarDocumentos([d['documento_id'] for d in documentos], nombre_coleccion)
+
+def aplicarRetencion(nombre_coleccion: str = "pyme_financial_docs") -> Dict[str, int]:
+    """
+    Elimina los documentos cuya retención venció (ver VECTORES_RETENCION_DIAS).
+    
+    Returns:
+        Dict[str, int]: Documentos y chunks eliminados
+    """
+    expirados = catalogo.documentosExpirados(nombre_coleccion)
+    return eliminarDocumentos([d['documento_id'] for d in expirados], nombre_coleccion, motivo='retencion')
+
+def _copiarChunks(origen: 'chromadb.Collection', destino: 'chromadb.Collection', ids: List[str],
+                  transformar: Optional[Callable[[List[List[float]], List[str]], List[List[float]]]] = None) -> int:
+    """
+    Copia un lote de chunks por ID con sus embeddings; retorna cuántos copió
+    (los borrados entretanto simplemente no están).
+    
+    transformar(embeddings, documentos), si se indica, produce los embeddings del destino.
+    """
+    lote = origen.get(ids=ids, include=['embeddings', 'documents', 'metadatas'])
+    if lote['ids']:
+        embeddings = transformar(lote['embeddings'], lote['documents']) if transformar else lote['embeddings']
+        destino.upsert(ids=lote['ids'], embeddings=embeddings, documents=lote['documents'], metadatas=lote['metadatas'])
+    return len(lote['ids'])
+
+def _vacuumChroma():
+    """Devuelve al sistema de archivos las páginas libres del SQLite de ChromaDB."""
+    try:
+        conexion = sqlite3.connect(os.path.join(CHROMA_DB_PATH, 'chroma.sqlite3'), timeout=5)
+        try:
+            conexion.execute('VACUUM')
+        finally:
+            conexion.close()
+    except Exception as e:
+        logger.warning(f"No se pudo compactar el SQLite de ChromaDB: {str(e)}")
+
+def compactarBaseDeConocimiento(nombre_coleccion: str = "pyme_financial_docs", forzar: bool = False,
+                                umbral: float = VECTORES_COMPACTACION_UMBRAL) -> Optional[Dict[str, Any]]:
+    """
+    Reconstruye la colección sin los chunks eliminados para recuperar espacio.
+    
+    Los vectores borrados siguen ocupando el índice HNSW de ChromaDB, así que
+    cuando superan la fracción umbral se copian los chunks vigentes a una
+    colección física nueva, el catálogo pasa a apuntar a ella y la anterior
+    se elimina. Las ingestas y borrados que ocurren durante la copia se
+    concilian antes del cambio.
+    
+    Args:
+        nombre_coleccion (str): Nombre de la colección
+        forzar (bool): Compactar aunque no se alcance el umbral
+        umbral (float): Fracción de chunks eliminados que dispara la compactación
+        
+    Returns:
+        Optional[Dict[str, Any]]: Resumen, o None si no hizo falta o otro proceso está compactando
+    """
+    estado = catalogo.estadoColeccion(nombre_coleccion)
+    anterior = obtenerBaseDeConocimiento(nombre_coleccion)
+    vigentes = anterior.count()
+    eliminados = estado['chunks_eliminados']
+    
+    if not forzar and (eliminados == 0 or eliminados / (vigentes + eliminados) < umbral):
+        return None
+    if not catalogo.reservarReconstruccion(nombre_coleccion, duracion_s=3600):
+        logger.info("Reconstrucción en curso en otro proceso", extra={'campos': {'coleccion': nombre_coleccion}})
+        return None
+    
+    resumen = _reconstruirColeccion(nombre_coleccion, anterior, estado['generacion'] + 1, chunks_descontados=eliminados)
+    if resumen is None:
+        return None
+    resumen['chunks_descartados'] = eliminados
+    incrementarContador('compactaciones_total')
+    logger.info("Base de conocimiento compactada", extra={'campos': resumen})
+    return resumen
+
+def _conciliarReconstruccion(nombre_coleccion: str, anterior: 'chromadb.Collection', nueva: 'chromadb.Collection',
+                             transformar: Optional[Callable] = None):
+    """
+    Iguala la colección nueva a la anterior (copia lo ingestado y quita lo borrado
+    durante la copia) y verifica que contenga todos los chunks del catálogo.
+    
+    Se llama con el bloqueo exclusivo de escritura tomado.
+    
+    Raises:
+        RuntimeError: Si faltan chunks del catálogo en la colección nueva
+    """
+    en_anterior = set(anterior.get(include=[])['ids'])
+    en_nueva = set(nueva.get(include=[])['ids'])
+    
+    faltantes = sorted(en_anterior - en_nueva)
+    for desde in range(0, len(faltantes), TAMANO_LOTE_CHROMA):
+        _copiarChunks(anterior, nueva, ids=faltantes[desde:desde + TAMANO_LOTE_CHROMA], transformar=transformar)
+    borrados = sorted(en_nueva - en_anterior)
+    for desde in range(0, len(borrados), TAMANO_LOTE_CHROMA):
+        nueva.delete(ids=borrados[desde:desde + TAMANO_LOTE_CHROMA])
+    
+    en_nueva = set(nueva.get(include=[])['ids'])
+    esperados = [chunk_id for documento in catalogo.listarDocumentos(nombre_coleccion, limite=-1) for chunk_id in documento['chunk_ids']]
+    perdidos = [chunk_id for chunk_id in esperados if chunk_id not in en_nueva and chunk_id in en_anterior]
+    if perdidos:
+        raise RuntimeError(f"{len(perdidos)} chunks del catálogo no llegaron a la colección nueva")
+    huerfanos = sum(1 for chunk_id in esperados if chunk_id not in en_anterior)
+    if huerfanos:
+        logger.warning("Chunks del catálogo ausentes ya en la colección anterior",
+                       extra={'campos': {'coleccion': nombre_coleccion, 'chunks': huerfanos}})
+
+def _reconstruirColeccion(nombre_coleccion: str, anterior: 'chromadb.Collection', generacion: int,
+                          metadata: Optional[Dict[str, Any]] = None, transformar: Optional[Callable] = None, chunks_descontados: int = 0,
+                          etapa: str = 'compactacion') -> Optional[Dict[str, Any]]:
+    """
+    Copia los chunks vigentes a una colección física nueva y cambia el catálogo a ella.
+    
+    Requiere la reserva de reconstrucción del catálogo y siempre la libera.
+    Las ingestas y borrados que ocurren durante la copia se concilian antes
+    del cambio, con las escrituras detenidas por el bloqueo del catálogo;
+    luego la colección anterior se elimina.
+    
+    Args:
+        nombre_coleccion (str): Colección lógica
+        anterior (chromadb.Collection): Colección física actual
+        generacion (int): Generación de la colección nueva
+        metadata (Dict): Cambios a los metadatos de la colección anterior
+        transformar (Callable): Produce los embeddings nuevos a partir de (embeddings, documentos)
+        chunks_descontados (int): Chunks eliminados que la colección nueva ya no contiene
+        etapa (str): Etapa en que se mide la copia
+        
+    Returns:
+        Optional[Dict[str, Any]]: Resumen, o None si la reconstrucción falló
+    """
+    backend = backendDeColeccion(anterior)
+    fisica = f"{nombre_coleccion}_g{generacion}"
+    inicio = time.time()
+    
+    try:
+        with medirEtapa(etapa):
+            # Restos de un intento anterior interrumpido
+            try:
+                _eliminarColeccionFisica(fisica)
+            except Exception:
+                pass
+            nueva = _crearColeccionFisica(
+                fisica, {**(anterior.metadata or {}), **(metadata or {}), 'coleccion_logica': nombre_coleccion}, backend
+            )
+            
+            # Copia por IDs de una foto de la colección: paginar por posición una colección que
+            # recibe borrados desplaza las filas y saltaría chunks vigentes
+            ids = anterior.get(include=[])['ids']
+            for desde in range(0, len(ids), TAMANO_LOTE_CHROMA):
+                _copiarChunks(anterior, nueva, ids=ids[desde:desde + TAMANO_LOTE_CHROMA], transformar=transformar)
+            
+            # Con las escrituras detenidas: conciliar las ingestas y borrados de la copia y cambiar
+            with catalogo.bloqueoDeEscritura(nombre_coleccion, exclusivo=True):
+                _conciliarReconstruccion(nombre_coleccion, anterior, nueva, transformar)
+                catalogo.finalizarReconstruccion(nombre_coleccion, fisica, chunks_descontados=chunks_descontados)
+    except Exception as e:
+        catalogo.finalizarReconstruccion(nombre_coleccion)
+        logger.error(f"Error al reconstruir la base de conocimiento: {str(e)}", extra={'campos': {'coleccion': nombre_coleccion, 'etapa': etapa}})
+        try:
+            _eliminarColeccionFisica(fisica)
+        except Exception:
+            pass
+        return None
+    
+    _eliminarColeccionFisica(anterior.name)
+    if backend == 'chroma':
+        _vacuumChroma()
+    
+    return {
+        'coleccion': nombre_coleccion,
+        'fisica_anterior': anterior.name,
+        'fisica': fisica,
+        'chunks': nueva.count(),
+        'duracion_s': round(time.time() - inicio, 3)
+    }
+
+def _truncarEmbeddings(embeddings: List[List[float]], dimensiones: int) -> List[List[float]]:
+    """Acorta embeddings a sus primeras dimensiones y los renormaliza (válido para text-embedding-3)."""
+    import numpy as np
+    
+    matriz = np.asarray(embeddings, dtype=np.float32)[:, :dimensiones]
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return (matriz / normas).tolist()
+
+def migrarEmbeddings(dimensiones: int, nombre_coleccion: str = "pyme_financial_docs", modo: str = 'truncar',
+                     modelo: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Migra la colección a otra dimensión (o modelo) de embeddings sin cortar el servicio.
+    
+    Los chunks se copian a una colección física nueva con los embeddings
+    convertidos y el catálogo cambia a ella de forma atómica, igual que en la
+    compactación: las búsquedas siguen usando la colección anterior (y su
+    dimensión) hasta el cambio, y las siguientes usan la nueva.
+    
+    Args:
+        dimensiones (int): Dimensión de destino
+        nombre_coleccion (str): Nombre de la colección
+        modo (str): 'truncar' acorta y renormaliza los vectores guardados (sin llamar a la API;
+            solo para el mismo modelo y una dimensión menor) o 'reembeber' vuelve a vectorizar los textos
+        modelo (str): Modelo de destino en modo 'reembeber'; por defecto el de la colección
+        
+    Returns:
+        Optional[Dict[str, Any]]: Resumen, o None si otro proceso está reconstruyendo la colección o la migración falló
+    """
+    if modo not in ('truncar', 'reembeber'):
+        raise ValueError(f"Modo de migración no soportado: {modo}")
+    
+    anterior = obtenerBaseDeConocimiento(nombre_coleccion)
+    modelo_anterior = modeloDeColeccion(anterior)
+    dimensiones_anteriores = dimensionesDeColeccion(anterior)
+    modelo = modelo or modelo_anterior
+    if modo == 'truncar' and (modelo != modelo_anterior or dimensiones > dimensiones_anteriores):
+        raise ValueError("Truncar solo sirve para reducir la dimensión con el mismo modelo; usa modo='reembeber'")
+    
+    if modo == 'truncar':
+        def transformar(embeddings, documentos):
+            return _truncarEmbeddings(embeddings, dimensiones)
+    else:
+        embedding_function = obtenerLlmEmbedding(modelo, dimensiones)
+        
+        def transformar(embeddings, documentos):
+            vectores = embedding_function.embed_documents(documentos)
+            registrarConsumo(modelo, sum(estimarTokens(t) for t in documentos), operacion='embedding_migracion')
+            return vectores
+    
+    if not catalogo.reservarReconstruccion(nombre_coleccion, duracion_s=6 * 3600):
+        logger.info("Reconstrucción en curso en otro proceso", extra={'campos': {'coleccion': nombre_coleccion}})
+        return None
+    
+    # Una compactación pudo reemplazar la colección antes de la reserva
+    anterior = coleccionVigente(anterior)
+    estado = catalogo.estadoColeccion(nombre_coleccion)
+    # Los reembebidos compiten con el tráfico en línea como trabajo de fondo
+    with prioridadLlm('lote'):
+        resumen = _reconstruirColeccion(
+            nombre_coleccion, anterior, estado['generacion'] + 1,
+            metadata={'embedding_modelo': modelo, 'embedding_dimensiones': dimensiones},
+            transformar=transformar, chunks_descontados=estado['chunks_eliminados'], etapa='migracion_embeddings'
+        )
+    if resumen is None:
+        return None
+    resumen.update({'modo': modo, 'modelo_anterior': modelo_anterior, 'dimensiones_anteriores': dimensiones_anteriores,
+                    'modelo': modelo, 'dimensiones': dimensiones})
+    incrementarContador('migraciones_embedding_total', modo=modo)
+    logger.info("Embeddings de la base de conocimiento migrados", extra={'campos': resumen})
+    return resumen
+
+# Chunks por archivo de un snapshot (acota la memoria al exportar e importar)
+CHUNKS_POR_PARTE = 20000
+VERSION_SNAPSHOT = 1
+
+def _empaquetarTextos(textos: List[Optional[str]]) -> Tuple['np.ndarray', 'np.ndarray']:
+    """Textos como columna: bytes UTF-8 concatenados y offsets (sin pickle)."""
+    import numpy as np
+    
+    codificados = [(texto or '').encode('utf-8') for texto in textos]
+    offsets = np.zeros(len(codificados) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(c) for c in codificados])
+    return np.frombuffer(b''.join(codificados), dtype=np.uint8), offsets
+
+def _desempaquetarTextos(datos: 'np.ndarray', offsets: 'np.ndarray') -> List[str]:
+    contenido = datos.tobytes()
+    return [contenido[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+def _sha256Archivo(ruta: str) -> str:
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+def _escribirArchivoSnapshot(destino: str, nombre: str, escribir: Callable[[str], None], chunks: Optional[int] = None) -> Dict[str, Any]:
+    ruta = os.path.join(destino, nombre)
+    escribir(ruta)
+    return {'nombre': nombre, 'sha256': _sha256Archivo(ruta), 'bytes': os.path.getsize(ruta), 'chunks': chunks}
+
+def exportarSnapshot(destino: str, nombre_coleccion: str = "pyme_financial_docs", base: Optional[str] = None,
+                     tipo_vector: str = 'float32') -> Dict[str, Any]:
+    """
+    Exporta la colección a un snapshot en columnas para replicarla en otro nodo.
+    
+    El snapshot es una carpeta con partes NumPy (.npz: IDs, embeddings y
+    documentos y metadatos como bytes con offsets), el catálogo de documentos
+    y un manifiesto con el SHA-256 de cada archivo. Con `base` se exporta un
+    delta: solo los documentos ingestados o renovados desde ese snapshot, más
+    la lista de documentos vigentes para que la réplica borre los demás.
+    
+    Args:
+        destino (str): Carpeta nueva del snapshot
+        nombre_coleccion (str): Nombre de la colección
+        base (str): Carpeta del snapshot anterior para exportar un delta
+        tipo_vector (str): 'float32' o 'float16' (la mitad de tamaño, pierde precisión)
+        
+    Returns:
+        Dict[str, Any]: Manifiesto del snapshot
+    """
+    import numpy as np
+    
+    if tipo_vector not in ('float32', 'float16'):
+        raise ValueError(f"Tipo de vector no soportado: {tipo_vector}")
+    if os.path.exists(os.path.join(destino, 'manifiesto.json')):
+        raise ValueError(f"Ya existe un snapshot en {destino}")
+    
+    coleccion = obtenerBaseDeConocimiento(nombre_coleccion)
+    manifiesto_base = _leerManifiesto(base) if base else None
+    if manifiesto_base and (manifiesto_base['embedding_modelo'] != modeloDeColeccion(coleccion)
+                            or manifiesto_base['embedding_dimensiones'] != dimensionesDeColeccion(coleccion)):
+        raise ValueError("La colección cambió de embeddings desde el snapshot base; exporta un snapshot completo")
+    
+    # El catálogo se lee primero: sus documentos ya tienen los chunks cargados
+    hasta = time.time()
+    desde = manifiesto_base['hasta'] if manifiesto_base else None
+    documentos = catalogo.listarDocumentos(nombre_coleccion, ingestados_desde=desde, limite=-1)
+    vigentes = [d['documento_id'] for d in catalogo.listarDocumentos(nombre_coleccion, limite=-1)] if manifiesto_base else None
+    
+    os.makedirs(destino, exist_ok=True)
+    archivos = []
+    pendientes = {'ids': [], 'embeddings': [], 'documentos': [], 'metadatos': []}
+    exportados = set()
+    
+    def volcar():
+        if not pendientes['ids']:
+            return
+        textos, offsets_textos = _empaquetarTextos(pendientes['documentos'])
+        metadatos, offsets_metadatos = _empaquetarTextos([json.dumps(m, ensure_ascii=False) for m in pendientes['metadatos']])
+        columnas = {
+            'ids': np.array(pendientes['ids'], dtype=str),
+            'embeddings': np.asarray(pendientes['embeddings'], dtype=tipo_vector),
+            'documentos': textos, 'documentos_offsets': offsets_textos,
+            'metadatos': metadatos, 'metadatos_offsets': offsets_metadatos
+        }
+        archivos.append(_escribirArchivoSnapshot(
+            destino, f"parte_{len(archivos):05d}.npz", lambda ruta: np.savez_compressed(ruta, **columnas), len(pendientes['ids'])
+        ))
+        for lista in pendientes.values():
+            lista.clear()
+    
+    def agregar(lote):
+        for chunk_id, embedding, documento, metadatos in zip(lote['ids'], lote['embeddings'], lote['documents'], lote['metadatas']):
+            if chunk_id in exportados:
+                continue
+            exportados.add(chunk_id)
+            pendientes['ids'].append(chunk_id)
+            pendientes['embeddings'].append(embedding)
+            pendientes['documentos'].append(documento)
+            pendientes['metadatos'].append(metadatos)
+        if len(pendientes['ids']) >= CHUNKS_POR_PARTE:
+            volcar()
+    
+    incluir = ['embeddings', 'documents', 'metadatas']
+    with medirEtapa('snapshot_exportacion'):
+        if manifiesto_base is None:
+            # Completo: todos los chunks, también los anteriores al catálogo
+            offset = 0
+            while True:
+                lote = coleccion.get(limit=TAMANO_LOTE_CHROMA, offset=offset, include=incluir)
+                agregar(lote)
+                offset += len(lote['ids'])
+                if len(lote['ids']) < TAMANO_LOTE_CHROMA:
+                    break
+        # Chunks de los documentos del catálogo (en un completo, los que un borrado concurrente desplazó del recorrido)
+        faltantes = [chunk_id for documento in documentos for chunk_id in documento['chunk_ids'] if chunk_id not in exportados]
+        for inicio in range(0, len(faltantes), TAMANO_LOTE_CHROMA):
+            agregar(coleccion.get(ids=faltantes[inicio:inicio + TAMANO_LOTE_CHROMA], include=incluir))
+        volcar()
+        
+        entradas = [{clave: d[clave] for clave in ('documento_id', 'empresa_id', 'tipo', 'archivo', 'chunk_ids', 'ingestado_en', 'expira_en')}
+                    for d in documentos]
+        
+        def escribirCatalogo(ruta):
+            with open(ruta, 'w', encoding='utf-8') as f:
+                json.dump({'documentos': entradas, 'vigentes': vigentes}, f, ensure_ascii=False)
+        archivos.append(_escribirArchivoSnapshot(destino, 'catalogo.json', escribirCatalogo))
+    
+    manifiesto = {
+        'version': VERSION_SNAPSHOT,
+        'snapshot_id': uuid.uuid4().hex,
+        'tipo': 'delta' if manifiesto_base else 'completo',
+        'base': manifiesto_base['snapshot_id'] if manifiesto_base else None,
+        'coleccion': nombre_coleccion,
+        'backend': backendDeColeccion(coleccion),
+        'metadata': coleccion.metadata or {},
+        'embedding_modelo': modeloDeColeccion(coleccion),
+        'embedding_dimensiones': dimensionesDeColeccion(coleccion),
+        'tipo_vector': tipo_vector,
+        'desde': desde,
+        'hasta': hasta,
+        'creado_en': time.time(),
+        'chunks': len(exportados),
+        'documentos': len(entradas),
+        'archivos': archivos
+    }
+    # El manifiesto va al final: sin él la carpeta no es un snapshot
+    ruta_parcial = os.path.join(destino, 'manifiesto.json.parcial')
+    with open(ruta_parcial, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=2, ensure_ascii=False)
+    os.replace(ruta_parcial, os.path.join(destino, 'manifiesto.json'))
+    
+    incrementarContador('snapshots_total', operacion='exportacion', tipo=manifiesto['tipo'])
+    logger.info("Snapshot exportado", extra={'campos': {
+        'coleccion': nombre_coleccion, 'destino': destino, 'tipo': manifiesto['tipo'], 'chunks': manifiesto['chunks'],
+        'documentos': manifiesto['documentos'], 'bytes': sum(a['bytes'] for a in archivos), 'duracion_s': round(time.time() - hasta, 3)}})
+    return manifiesto
+
+def _leerManifiesto(origen: str) -> Dict[str, Any]:
+    with open(os.path.join(origen, 'manifiesto.json'), 'r', encoding='utf-8') as f:
+        manifiesto = json.load(f)
+    if manifiesto.get('version') != VERSION_SNAPSHOT:
+        raise ValueError(f"Versión de snapshot no soportada: {manifiesto.get('version')}")
+    return manifiesto
+
+def verificarSnapshot(origen: str) -> Dict[str, Any]:
+    """
+    Comprueba el SHA-256 y el tamaño de cada archivo del snapshot.
+    
+    Returns:
+        Dict[str, Any]: Manifiesto del snapshot
+        
+    Raises:
+        ValueError: Si falta un archivo o no coincide con el manifiesto
+    """
+    manifiesto = _leerManifiesto(origen)
+    for archivo in manifiesto['archivos']:
+        ruta = os.path.join(origen, archivo['nombre'])
+        if not os.path.exists(ruta) or os.path.getsize(ruta) != archivo['bytes'] or _sha256Archivo(ruta) != archivo['sha256']:
+            raise ValueError(f"Snapshot corrupto o incompleto: {archivo['nombre']}")
+    return manifiesto
+
+def _cargarPartes(origen: str, manifiesto: Dict[str, Any], coleccion: 'chromadb.Collection') -> int:
+    """Carga los chunks de las partes del snapshot con sus embeddings (sin llamar a la API); retorna cuántos cargó."""
+    import numpy as np
+    
+    cargados = 0
+    for archivo in manifiesto['archivos']:
+        if not archivo['nombre'].endswith('.npz'):
+            continue
+        with np.load(os.path.join(origen, archivo['nombre']), allow_pickle=False) as parte:
+            ids = parte['ids'].tolist()
+            embeddings = parte['embeddings'].astype(np.float32)
+            documentos = _desempaquetarTextos(parte['documentos'], parte['documentos_offsets'])
+            metadatos = [json.loads(m) for m in _desempaquetarTextos(parte['metadatos'], parte['metadatos_offsets'])]
+        for inicio in range(0, len(ids), TAMANO_LOTE_CHROMA):
+            fin = inicio + TAMANO_LOTE_CHROMA
+            coleccion.upsert(ids=ids[inicio:fin], embeddings=embeddings[inicio:fin].tolist(),
+                             documents=documentos[inicio:fin], metadatas=metadatos[inicio:fin])
+        cargados += len(ids)
+    return cargados
+
+def importarSnapshot(origen: str, nombre_coleccion: Optional[str] = None, backend: Optional[str] = None,
+                     forzar: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Importa un snapshot de exportarSnapshot sin vectorizar nada.
+    
+    Un snapshot completo se carga en una colección física nueva y el catálogo
+    cambia a ella al terminar, como en la compactación: la réplica sigue
+    respondiendo con sus datos anteriores mientras tanto. Un delta se aplica
+    sobre la colección vigente y solo si su base es el último snapshot
+    importado; la colección queda igual a la de origen (los documentos que
+    el origen ya no tiene se eliminan).
+    
+    Args:
+        origen (str): Carpeta del snapshot
+        nombre_coleccion (str): Colección de destino; por defecto la del snapshot
+        backend (str): 'chroma' o 'numpy' para un snapshot completo; por defecto el de origen
+        forzar (bool): Aplicar un delta aunque su base no sea el último snapshot importado
+        
+    Returns:
+        Optional[Dict[str, Any]]: Resumen, o None si otro proceso está reconstruyendo la colección o la importación falló
+        
+    Raises:
+        ValueError: Si el snapshot está corrupto o el delta no corresponde a la colección
+    """
+    inicio = time.time()
+    manifiesto = verificarSnapshot(origen)
+    nombre_coleccion = nombre_coleccion or manifiesto['coleccion']
+    with open(os.path.join(origen, 'catalogo.json'), 'r', encoding='utf-8') as f:
+        datos_catalogo = json.load(f)
+    documentos = datos_catalogo['documentos']
+    
+    if manifiesto['tipo'] == 'delta' and not forzar:
+        ultimo = catalogo.ultimoSnapshot(nombre_coleccion)
+        if ultimo is None or ultimo['snapshot_id'] != manifiesto['base']:
+            raise ValueError("El delta no parte del último snapshot importado; importa antes su base o un snapshot completo")
+    
+    # Mientras se importa no corre una compactación ni una migración de la colección
+    if not catalogo.reservarReconstruccion(nombre_coleccion, duracion_s=3600):
+        logger.info("Reconstrucción en curso en otro proceso", extra={'campos': {'coleccion': nombre_coleccion}})
+        return None
+    
+    estado = catalogo.estadoColeccion(nombre_coleccion)
+    eliminados = {'documentos': 0, 'chunks': 0}
+    if manifiesto['tipo'] == 'completo':
+        fisica = f"{nombre_coleccion}_g{estado['generacion'] + 1}"
+        try:
+            with medirEtapa('snapshot_importacion'):
+                try:
+                    _eliminarColeccionFisica(fisica)
+                except Exception:
+                    pass
+                nueva = _crearColeccionFisica(fisica, {**manifiesto['metadata'], 'coleccion_logica': nombre_coleccion},
+                                              backend or manifiesto['backend'])
+                chunks = _cargarPartes(origen, manifiesto, nueva)
+                catalogo.importarDocumentos(nombre_coleccion, documentos, reemplazar=True)
+                catalogo.finalizarReconstruccion(nombre_coleccion, fisica, chunks_descontados=estado['chunks_eliminados'])
+        except Exception as e:
+            catalogo.finalizarReconstruccion(nombre_coleccion)
+            logger.error(f"Error al importar el snapshot: {str(e)}", extra={'campos': {'coleccion': nombre_coleccion, 'origen': origen}})
+            try:
+                _eliminarColeccionFisica(fisica)
+            except Exception:
+                pass
+            return None
+        
+        try:
+            _eliminarColeccionFisica(estado['fisica'])
+            if backendDeColeccion(nueva) == 'chroma':
+                _vacuumChroma()
+        except Exception:
+            # La réplica aún no tenía la colección
+            pass
+    else:
+        try:
+            with medirEtapa('snapshot_importacion'):
+                coleccion = obtenerBaseDeConocimiento(nombre_coleccion)
+                if dimensionesDeColeccion(coleccion) != manifiesto['embedding_dimensiones']:
+                    raise ValueError("El delta usa otra dimensión de embeddings que la colección")
+                
+                # Documentos reemplazados con otro chunking: quitar los chunks que ya no existen
+                for documento in documentos:
+                    existente = catalogo.obtenerDocumento(nombre_coleccion, documento['documento_id'])
+                    if existente:
+                        sobrantes = [chunk_id for chunk_id in existente['chunk_ids'] if chunk_id not in set(documento['chunk_ids'])]
+                        if sobrantes:
+                            coleccion.delete(ids=sobrantes)
+                            catalogo.sumarChunksEliminados(nombre_coleccion, len(sobrantes))
+                chunks = _cargarPartes(origen, manifiesto, coleccion)
+                catalogo.importarDocumentos(nombre_coleccion, documentos)
+                
+                # Documentos que el origen eliminó desde la base
+                vigentes = set(datos_catalogo['vigentes'])
+                retirados = [d['documento_id'] for d in catalogo.listarDocumentos(nombre_coleccion, limite=-1)
+                             if d['documento_id'] not in vigentes]
+                eliminados = eliminarDocumentos(retirados, nombre_coleccion, motivo='snapshot')
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Error al importar el snapshot: {str(e)}", extra={'campos': {'coleccion': nombre_coleccion, 'origen': origen}})
+            return None
+        finally:
+            catalogo.finalizarReconstruccion(nombre_coleccion)
+    
+    catalogo.registrarSnapshot(nombre_coleccion, manifiesto['snapshot_id'], manifiesto['hasta'])
+    resumen = {
+        'coleccion': nombre_coleccion,
+        'snapshot_id': manifiesto['snapshot_id'],
+        'tipo': manifiesto['tipo'],
+        'chunks': chunks,
+        'documentos': len(documentos),
+        'documentos_eliminados': eliminados['documentos'],
+        'fisica': catalogo.coleccionFisica(nombre_coleccion),
+        'duracion_s': round(time.time() - inicio, 3)
+    }
+    incrementarContador('snapshots_total', operacion='importacion', tipo=manifiesto['tipo'])
+    logger.info("Snapshot importado", extra={'campos': resumen})
+    return resumen
+
+def mantenerBaseDeConocimiento(nombre_coleccion: str = "pyme_financial_docs") -> Dict[str, Any]:
+    """Aplica la retención (solo si hay una política configurada) y compacta la colección si hace falta."""
+    retencion = aplicarRetencion(nombre_coleccion) if VECTORES_RETENCION_ACTIVA else None
+    compactacion = compactarBaseDeConocimiento(nombre_coleccion)
+    return {'retencion': retencion, 'compactacion': compactacion}
+
+_lock_mantenimiento = threading.Lock()
+_mantenimiento_iniciado = set()
+
+def iniciarMantenimiento(intervalo_s: float = VECTORES_MANTENIMIENTO_INTERVALO_S, nombre_coleccion: str = "pyme_financial_docs") -> bool:
+    """
+    Inicia (una vez por proceso) el hilo que compacta (y aplica la retención configurada) cada intervalo_s.
+    
+    Returns:
+        bool: True si se inició el hilo en esta llamada
+    """
+    if intervalo_s <= 0:
+        return False
+    
+    with _lock_mantenimiento:
+        clave = (os.getpid(), nombre_coleccion)
+        if clave in _mantenimiento_iniciado:
+            return False
+        _mantenimiento_iniciado.add(clave)
+    
+    def ciclo():
+        while True:
+            time.sleep(intervalo_s)
+            try:
+                mantenerBaseDeConocimiento(nombre_coleccion)
+            except Exception as e:
+                logger.error(f"Error en el mantenimiento de la base de conocimiento: {str(e)}")
+    
+    threading.Thread(target=ciclo, name='mantenimiento-vectores', daemon=True).start()
+    return True
\ No newline at end of file
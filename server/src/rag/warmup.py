@@ -0,0 +1,50 @@
+import time
+from typing import Dict
+from .logs import obtenerLogger
+
+logger = obtenerLogger('warmup')
+
+def precalentar() -> Dict[str, float]:
+    """
+    Precarga las dependencias pesadas y los clientes antes de recibir tráfico.
+
+    Pensado para ejecutarse una vez por worker (PRECALENTAR_AL_INICIAR=true en
+    create_app, o desde el hook post_fork del servidor). Sin él, cada
+    dependencia se importa en la primera petición que la necesita.
+
+    Returns:
+        Dict[str, float]: Milisegundos empleados en cada paso
+    """
+    tiempos = {}
+
+    def paso(nombre: str, funcion):
+        inicio = time.perf_counter()
+        try:
+            funcion()
+        except Exception as e:
+            logger.warning(f"Error al precalentar {nombre}: {str(e)}")
+        tiempos[nombre] = round((time.perf_counter() - inicio) * 1000, 3)
+
+    def importarExtraccion():
+        import fitz  # noqa: F401
+
+    def importarScraping():
+        import requests  # noqa: F401
+        import bs4  # noqa: F401
+
+    def abrirChroma():
+        from .vectorStore import obtenerBaseDeConocimiento
+        obtenerBaseDeConocimiento()
+
+    def crearClientesLlm():
+        from .config import obtenerLlm, obtenerLlmEmbedding
+        obtenerLlm()
+        obtenerLlmEmbedding()
+
+    paso('pdf', importarExtraccion)
+    paso('scraping', importarScraping)
+    paso('chromadb', abrirChroma)
+    paso('llm', crearClientesLlm)
+
+    logger.info("Worker precalentado", extra={'campos': {'tiempos_ms': tiempos}})
+    return tiempos
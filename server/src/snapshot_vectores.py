@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+import argparse
+from dotenv import load_dotenv
+
+# Agregar el directorio src al path para imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Cargar variables de entorno
+load_dotenv()
+
+from rag.config import LOG_NIVEL, LOG_FORMATO
+from rag.logs import configurarLogs
+from rag.vectorStore import exportarSnapshot, importarSnapshot
+
+def main():
+    parser = argparse.ArgumentParser(description='Exporta o importa snapshots de la base de conocimiento para levantar réplicas sin reembeber')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    
+    exportar = subparsers.add_parser('exportar', help='Escribe un snapshot completo o, con --base, un delta')
+    exportar.add_argument('destino', help='Carpeta nueva del snapshot')
+    exportar.add_argument('--base', help='Snapshot anterior: exporta solo los cambios desde él')
+    exportar.add_argument('--tipo-vector', choices=['float32', 'float16'], default='float32')
+    exportar.add_argument('--coleccion', default='pyme_financial_docs')
+    
+    importar = subparsers.add_parser('importar', help='Carga uno o más snapshots en orden (un completo y sus deltas)')
+    importar.add_argument('origenes', nargs='+', help='Carpetas de los snapshots')
+    importar.add_argument('--coleccion', help='Colección de destino (por defecto la del snapshot)')
+    importar.add_argument('--backend', choices=['chroma', 'numpy'], help='Backend para un snapshot completo (por defecto el de origen)')
+    importar.add_argument('--forzar', action='store_true', help='Aplicar un delta aunque su base no sea el último snapshot importado')
+    args = parser.parse_args()
+    configurarLogs(LOG_NIVEL, LOG_FORMATO)
+    
+    try:
+        if args.comando == 'exportar':
+            manifiesto = exportarSnapshot(args.destino, args.coleccion, base=args.base, tipo_vector=args.tipo_vector)
+            print(json.dumps({clave: manifiesto[clave] for clave in ('snapshot_id', 'tipo', 'base', 'chunks', 'documentos')}, indent=2, ensure_ascii=False))
+            return
+        
+        resumenes = []
+        for origen in args.origenes:
+            resumen = importarSnapshot(origen, args.coleccion, backend=args.backend, forzar=args.forzar)
+            if resumen is None:
+                print(json.dumps({'error': f'No se importó {origen}; revisa los logs', 'importados': resumenes}, ensure_ascii=False))
+                sys.exit(1)
+            resumenes.append(resumen)
+        print(json.dumps(resumenes, indent=2, ensure_ascii=False))
+    except ValueError as e:
+        print(json.dumps({'error': str(e)}, ensure_ascii=False))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
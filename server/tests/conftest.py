@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos del servidor se importan como en la aplicación (python src/main.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
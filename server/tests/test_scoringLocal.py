@@ -0,0 +1,157 @@
+import pytest
+
+from rag import scoringLocal
+from rag.scoringLocal import (
+    _parsearMonto, extraerPartidasFinancieras, calcularRatios, generarScoringLocal,
+    LIMITE_RIESGO_BAJO, LIMITE_RIESGO_MEDIO, MARGEN_AMBIGUEDAD
+)
+
+BALANCE_SINGULAR = """
+ESTADO DE SITUACIÓN FINANCIERA
+                                   2023          2022
+Total activo corriente        150.000,00    120.000,00
+Total activo no corriente     350.000,00    300.000,00
+Total activo                  500.000,00    420.000,00
+Total pasivo corriente         80.000,00     90.000,00
+Total pasivo                  200.000,00    210.000,00
+Total patrimonio              300.000,00    210.000,00
+Total pasivo y patrimonio     500.000,00    420.000,00
+ESTADO DE RESULTADOS
+Ventas netas                  900.000,00    800.000,00
+Utilidad neta del ejercicio    45.000,00     30.000,00
+"""
+
+BALANCE_PLURAL = """
+Total activos corrientes        1,250,000.50
+Total activos no corrientes     2,000,000.00
+Total activos                   3,250,000.50
+Total pasivos corrientes          750,000.00
+Total pasivos no corrientes       500,000.00
+Total pasivos                   1,250,000.00
+Total pasivos y patrimonio      3,250,000.50
+Patrimonio neto                 2,000,000.50
+Ingresos operacionales          4,100,000.00
+Pérdida neta del ejercicio        (85,000.00)
+"""
+
+def test_extrae_partidas_con_etiquetas_en_singular():
+    partidas = extraerPartidasFinancieras(BALANCE_SINGULAR)
+
+    assert partidas == {
+        'activo_corriente': 150000.0,
+        'pasivo_corriente': 80000.0,
+        'activo_total': 500000.0,
+        'pasivo_total': 200000.0,
+        'patrimonio': 300000.0,
+        'ventas': 900000.0,
+        'utilidad_neta': 45000.0
+    }
+
+def test_extrae_partidas_con_etiquetas_en_plural():
+    partidas = extraerPartidasFinancieras(BALANCE_PLURAL)
+
+    # 'Total activos no corrientes' y 'Total pasivos y patrimonio' no son los totales
+    assert partidas['activo_corriente'] == 1250000.50
+    assert partidas['pasivo_corriente'] == 750000.0
+    assert partidas['activo_total'] == 3250000.50
+    assert partidas['pasivo_total'] == 1250000.0
+    assert partidas['patrimonio'] == 2000000.50
+    assert partidas['ventas'] == 4100000.0
+    assert partidas['utilidad_neta'] == -85000.0
+
+def test_partidas_ausentes_quedan_en_none():
+    partidas = extraerPartidasFinancieras("Ventas netas 2023 150.000\nSin más información")
+
+    assert partidas['ventas'] == 150000.0  # el año de la columna se omite
+    assert all(valor is None for clave, valor in partidas.items() if clave != 'ventas')
+
+@pytest.mark.parametrize('texto, esperado', [
+    ('1.234.567,89', 1234567.89),
+    ('1,234,567.89', 1234567.89),
+    ('1.234', 1234.0),
+    ('1,234', 1234.0),
+    ('12,5', 12.5),
+    ('12.50', 12.5),
+    ('$ 5.000', 5000.0),
+    ('987654', 987654.0),
+])
+def test_parsea_separadores_de_miles_y_decimales(texto, esperado):
+    assert _parsearMonto(texto) == pytest.approx(esperado)
+
+@pytest.mark.parametrize('texto, esperado', [
+    ('(1.234)', -1234.0),
+    ('(25.000,50)', -25000.5),
+    ('-5.000', -5000.0),
+    ('-$ 750', -750.0),
+])
+def test_parsea_montos_negativos(texto, esperado):
+    assert _parsearMonto(texto) == pytest.approx(esperado)
+
+def test_parsea_texto_sin_digitos_como_none():
+    assert _parsearMonto('$') is None
+
+def test_calcula_pasivo_desde_la_ecuacion_contable():
+    ratios = calcularRatios({'activo_total': 500.0, 'patrimonio': 200.0, 'pasivo_total': None})
+
+    assert ratios['endeudamiento'] == pytest.approx(1.5)
+
+def test_patrimonio_negativo_es_endeudamiento_maximo():
+    ratios = calcularRatios({'pasivo_total': 100.0, 'patrimonio': -10.0, 'utilidad_neta': 5.0})
+
+    assert ratios['endeudamiento'] == float('inf')
+    assert 'roe' not in ratios
+
+def _partidasCompletas():
+    return {
+        'activo_corriente': 150.0, 'pasivo_corriente': 100.0, 'activo_total': 2600.0, 'pasivo_total': 1600.0,
+        'patrimonio': 1000.0, 'ventas': 1000.0, 'utilidad_neta': 50.0
+    }
+
+@pytest.mark.parametrize('puntaje', [
+    LIMITE_RIESGO_BAJO + MARGEN_AMBIGUEDAD,
+    LIMITE_RIESGO_BAJO - MARGEN_AMBIGUEDAD,
+    LIMITE_RIESGO_MEDIO + MARGEN_AMBIGUEDAD,
+    LIMITE_RIESGO_MEDIO - MARGEN_AMBIGUEDAD,
+    100,
+    0,
+])
+def test_es_decisivo_a_partir_del_margen(monkeypatch, puntaje):
+    monkeypatch.setattr(scoringLocal, 'puntuarRatio', lambda nombre, valor: puntaje)
+
+    scoring = generarScoringLocal('', {}, partidas=_partidasCompletas())
+
+    assert scoring['resultado']['scoring']['puntuacion'] == puntaje
+    assert scoring['decisivo'] is True
+
+@pytest.mark.parametrize('puntaje', [
+    LIMITE_RIESGO_BAJO + MARGEN_AMBIGUEDAD - 1,
+    LIMITE_RIESGO_BAJO,
+    LIMITE_RIESGO_BAJO - MARGEN_AMBIGUEDAD + 1,
+    LIMITE_RIESGO_MEDIO + MARGEN_AMBIGUEDAD - 1,
+    LIMITE_RIESGO_MEDIO,
+    LIMITE_RIESGO_MEDIO - MARGEN_AMBIGUEDAD + 1,
+])
+def test_no_es_decisivo_cerca_de_un_limite(monkeypatch, puntaje):
+    monkeypatch.setattr(scoringLocal, 'puntuarRatio', lambda nombre, valor: puntaje)
+
+    scoring = generarScoringLocal('', {}, partidas=_partidasCompletas())
+
+    assert scoring['decisivo'] is False
+
+def test_no_es_decisivo_con_pocos_ratios(monkeypatch):
+    monkeypatch.setattr(scoringLocal, 'puntuarRatio', lambda nombre, valor: 100)
+    partidas = {partida: None for partida in _partidasCompletas()}
+    partidas.update({'activo_corriente': 300.0, 'pasivo_corriente': 100.0, 'ventas': 1000.0, 'utilidad_neta': 200.0})
+
+    scoring = generarScoringLocal('', {}, partidas=partidas)
+
+    assert set(scoring['ratios']) == {'liquidez_corriente', 'margen_neto'}
+    assert scoring['decisivo'] is False
+
+def test_scoring_desde_el_texto_del_balance():
+    scoring = generarScoringLocal(BALANCE_SINGULAR, {})
+
+    assert scoring['partidas']['activo_total'] == 500000.0
+    assert set(scoring['ratios']) == {'liquidez_corriente', 'endeudamiento', 'margen_neto', 'roe'}
+    assert scoring['resultado']['scoring']['metodo'] == 'reglas'
+    assert scoring['resultado']['scoring']['nivel'] in ('bajo', 'medio', 'alto')